@@ -0,0 +1,302 @@
+"""
+High-entropy token detector for plaintext pastes.
+
+WHY THIS EXISTS:
+- The named rules in secret_scanner only catch credentials with a known shape (AKIA..., eyJ...).
+  Random-looking API keys, webhook secrets and passwords from generators have no prefix at all.
+- This detector flags tokens whose character distribution looks like random base64/base64url,
+  i.e. Shannon entropy close to what a uniformly random string of the same length would have.
+
+PERFORMANCE:
+- With NumPy available, the paste is treated as a byte array: token boundaries, character-class
+  checks and per-token histograms (one bincount over all candidate tokens) are vectorized.
+  No Python code runs per character, and only flagged tokens are touched from Python.
+- Without NumPy (it is not in the default Lambda runtime; ship it in a layer), we fall back to
+  a regex tokenizer + collections.Counter per candidate token. Slower, same answers.
+- The NumPy path needs ~6 bytes of working arrays per input byte, so it walks the input in
+  BLOCK_BYTES blocks (zero-copy views, cut between tokens): working memory stays under ~100KB
+  no matter how large the paste is (it was ~6MB at 1MB), for ~15% more time at 1MB.
+
+BLOBS:
+- Wrapped base64 (PEM bodies, MIME parts, `base64` output) is cut into 64/76-char lines, each
+  of which would pass as a token on its own. Runs of WRAP_MIN_LINES+ consecutive lines of the
+  same width (plus a shorter last line), and everything inside -----BEGIN/END----- blocks,
+  count as one blob; blobs longer than MAX_TOKEN_LENGTH are skipped like any long run
+  (_blob_spans()). The scan then walks the text between blobs (zero-copy views again).
+
+SECURITY NOTE:
+- Same contract as secret_scanner: a UX hint, never a security boundary. Token values are
+  never returned or logged, only whether one was found.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+from math import exp, lgamma, log, log2
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the Lambda layer
+    np = None
+
+LABEL = "High-entropy token"
+
+# Token alphabet: base64 + base64url. '=' padding is left out on purpose so "key=value" does not
+# glue the key name onto the value.
+TOKEN_CHARS = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/-_"
+ALPHABET_SIZE = 64
+
+# Shorter tokens do not have enough characters for entropy to mean anything.
+# Longer runs are blobs (embedded files, certificates, images), not keys; PEM private keys
+# already have a named rule.
+MIN_TOKEN_LENGTH = 20
+MAX_TOKEN_LENGTH = 256
+
+# A token is "random-looking" if its entropy is within this many bits of the expected entropy
+# of a uniformly random string of the same length (~2.2 standard deviations for 20-40 chars).
+ENTROPY_MARGIN_BITS = 0.3
+
+# Random keys mix character classes; long identifiers and hex digests (git SHAs, UUIDs) usually
+# do not have all three, and hex key IDs are covered by named rules.
+REQUIRE_UPPER_LOWER_DIGIT = True
+
+# Tokens starting with these already get a named category in secret_scanner.
+NAMED_PREFIXES = (b"AKIA", b"eyJ", b"AIza", b"ghp_", b"gho_", b"ghu_", b"ghs_", b"ghr_", b"github_pat_")
+
+# Subresource Integrity values (integrity="sha384-..."): public digests, random-looking by design.
+DIGEST_PREFIXES = (b"sha256-", b"sha384-", b"sha512-")
+
+# Wrapped base64 (see BLOBS above): at least this many consecutive lines of one width, each at
+# least this wide. Real wrapping is 64 (PEM) or 76 (MIME) wide; lists of short keys, one per
+# line, stay individual tokens.
+WRAP_MIN_LINES = 2
+WRAP_MIN_WIDTH = 60
+
+PLACEHOLDERS = (b"changeme", b"password", b"secret", b"dummy", b"example")
+
+# Tokens per bincount batch; bounds the histogram matrix to ~BATCH * 64 * 8 bytes (~4MB).
+BATCH_TOKENS = 8192
+
+# Input bytes per NumPy pass (see PERFORMANCE above).
+BLOCK_BYTES = 16 * 1024
+
+_TOKEN_RX = re.compile(rb"[A-Za-z0-9+/_-]{%d,%d}" % (MIN_TOKEN_LENGTH, MAX_TOKEN_LENGTH))
+_TOKEN_CHAR_RX = re.compile(rb"[A-Za-z0-9+/_-]")
+_NON_TOKEN_CHAR_RX = re.compile(rb"[^A-Za-z0-9+/_-]")
+_UPPER_RX = re.compile(rb"[A-Z]")
+# Runs of lines made only of token chars (plus '=' padding), and PEM armor blocks.
+_TOKEN_LINES_RX = re.compile(rb"(?m)(?:^[A-Za-z0-9+/_-]+={0,2}\r?(?:\n|\Z)){%d,}" % WRAP_MIN_LINES)
+_PEM_RX = re.compile(rb"(?ms)^[^\n]*?-----BEGIN [A-Z0-9 ]+-----.*?-----END [A-Z0-9 ]+-----[^\n]*")
+_LOWER_RX = re.compile(rb"[a-z]")
+_DIGIT_RX = re.compile(rb"[0-9]")
+
+
+@lru_cache(maxsize=None)
+def expected_random_entropy(length: int, alphabet: int = ALPHABET_SIZE) -> float:
+    """
+    Expected Shannon entropy (bits/char) of a uniformly random string.
+
+    H = log2(L) - (1/L) * sum_a c_a*log2(c_a), and each count c_a ~ Binomial(L, 1/A), so by
+    linearity E[H] = log2(L) - (A/L) * E[c*log2(c)]. Exact, no sampling.
+    """
+    p = 1.0 / alphabet
+    log_p, log_q = log(p), log(1.0 - p)
+    total = 0.0
+    for k in range(2, length + 1):
+        pmf = exp(lgamma(length + 1) - lgamma(k + 1) - lgamma(length - k + 1)
+                  + k * log_p + (length - k) * log_q)
+        term = pmf * k * log2(k)
+        total += term
+        # Past the mean, terms only shrink; stop once they no longer matter.
+        if term < 1e-12 and k > length * p:
+            break
+    return log2(length) - (alphabet / length) * total
+
+
+def entropy_threshold(length: int) -> float:
+    return expected_random_entropy(length) - ENTROPY_MARGIN_BITS
+
+
+def _is_candidate(token: bytes) -> bool:
+    """Final per-token filters, applied only to the few tokens that passed the entropy test."""
+    if token.startswith(NAMED_PREFIXES) or token.startswith(DIGEST_PREFIXES):
+        return False
+    low = token.lower()
+    return not any(p in low for p in PLACEHOLDERS)
+
+
+if np is not None:
+    # Byte -> symbol index lookup (0..63 for token chars, -1 otherwise), built once per container.
+    _SYMBOL = np.full(256, -1, dtype=np.int8)
+    _SYMBOL[np.frombuffer(TOKEN_CHARS, dtype=np.uint8)] = np.arange(len(TOKEN_CHARS), dtype=np.int8)
+    _NSYM = len(TOKEN_CHARS)
+
+    # Byte -> char-class bit flags, so one reduceat gives "which classes does each token use".
+    _UPPER, _LOWER, _DIGIT = 1, 2, 4
+    _CLASS = np.zeros(256, dtype=np.uint8)
+    _CLASS[np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ", dtype=np.uint8)] = _UPPER
+    _CLASS[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz", dtype=np.uint8)] = _LOWER
+    _CLASS[np.frombuffer(b"0123456789", dtype=np.uint8)] = _DIGIT
+
+    # c * log2(c) for every possible per-token symbol count (0 * log2(0) taken as 0).
+    _C = np.arange(MAX_TOKEN_LENGTH + 1, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        _CLOG2C = np.where(_C > 0, _C * np.log2(_C), 0.0)
+    _THRESHOLDS = None
+
+
+def _thresholds():
+    """Entropy threshold indexed by token length (NumPy path)."""
+    global _THRESHOLDS
+    if _THRESHOLDS is None:
+        table = np.full(MAX_TOKEN_LENGTH + 1, np.inf)
+        for length in range(MIN_TOKEN_LENGTH, MAX_TOKEN_LENGTH + 1):
+            table[length] = entropy_threshold(length)
+        _THRESHOLDS = table
+    return _THRESHOLDS
+
+
+def _token_classes(buf, starts, ends):
+    """Bitwise OR of the class flags of every char in each token, in one reduceat."""
+    flags = np.append(_CLASS[buf], np.uint8(0))
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2], bounds[1::2] = starts, ends
+    return np.bitwise_or.reduceat(flags, bounds)[0::2]
+
+
+def _detect_numpy(data) -> bool:
+    """Scan `data` block by block; blocks end on a non-token byte so no token is split."""
+    view = memoryview(data)
+    lo = 0
+    while lo < len(view):
+        cut = _NON_TOKEN_CHAR_RX.search(data, min(lo + BLOCK_BYTES, len(view)))
+        hi = cut.start() + 1 if cut else len(view)
+        if _detect_numpy_block(view[lo:hi]):
+            return True
+        lo = hi
+    return False
+
+
+def _detect_numpy_block(data: memoryview) -> bool:
+    buf = np.frombuffer(data, dtype=np.uint8)
+    sym = _SYMBOL[buf]
+
+    # Token runs = maximal stretches of token chars. Edges come from one diff over the mask.
+    mask = np.concatenate(([False], sym >= 0, [False]))
+    edges = np.flatnonzero(mask[1:] != mask[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+    lengths = ends - starts
+    keep = (lengths >= MIN_TOKEN_LENGTH) & (lengths <= MAX_TOKEN_LENGTH)
+    starts, ends, lengths = starts[keep], ends[keep], lengths[keep]
+    if not len(starts):
+        return False
+
+    if REQUIRE_UPPER_LOWER_DIGIT:
+        mixed = _token_classes(buf, starts, ends) == (_UPPER | _LOWER | _DIGIT)
+        starts, ends, lengths = starts[mixed], ends[mixed], lengths[mixed]
+        if not len(starts):
+            return False
+
+    thresholds = _thresholds()
+    for b in range(0, len(starts), BATCH_TOKENS):
+        b_starts, b_ends, b_lengths = starts[b:b + BATCH_TOKENS], ends[b:b + BATCH_TOKENS], lengths[b:b + BATCH_TOKENS]
+        n = len(b_starts)
+
+        # Gather every char of every token in the batch, tagged with its token index, and build
+        # all histograms with a single bincount: counts[t, s] = occurrences of symbol s in token t.
+        token_ids = np.repeat(np.arange(n), b_lengths)
+        offsets = np.arange(token_ids.size) - np.repeat(np.cumsum(b_lengths) - b_lengths, b_lengths)
+        chars = sym[np.repeat(b_starts, b_lengths) + offsets]
+        counts = np.bincount(token_ids * _NSYM + chars, minlength=n * _NSYM).reshape(n, _NSYM)
+
+        # H = log2(L) - sum(c * log2(c)) / L, using the precomputed c*log2(c) table.
+        entropy = np.log2(b_lengths) - _CLOG2C[counts].sum(axis=1) / b_lengths
+
+        for i in np.flatnonzero(entropy >= thresholds[b_lengths]):
+            if _is_candidate(bytes(data[b_starts[i]:b_ends[i]])):
+                return True
+    return False
+
+
+def _token_entropy(token: bytes) -> float:
+    length = len(token)
+    e = 0.0
+    for count in Counter(token).values():
+        p = count / length
+        e -= p * log2(p)
+    return e
+
+
+def _detect_python(data: bytes) -> bool:
+    for m in _TOKEN_RX.finditer(data):
+        start, end = m.span()
+        # The regex caps length at MAX_TOKEN_LENGTH; skip slices of longer runs (blobs).
+        if (start > 0 and _TOKEN_CHAR_RX.match(data, start - 1)) or _TOKEN_CHAR_RX.match(data, end):
+            continue
+        token = m.group(0)
+        if REQUIRE_UPPER_LOWER_DIGIT and not (
+            _UPPER_RX.search(token) and _LOWER_RX.search(token) and _DIGIT_RX.search(token)
+        ):
+            continue
+        if _token_entropy(token) >= entropy_threshold(len(token)) and _is_candidate(token):
+            return True
+    return False
+
+
+def _blob_token_chars(chunk: bytes) -> int:
+    return len(_NON_TOKEN_CHAR_RX.sub(b"", chunk))
+
+
+def _wrapped_spans(data):
+    """(start, end) of wrapped base64 blobs inside runs of token-only lines, longer than MAX_TOKEN_LENGTH."""
+    for run in _TOKEN_LINES_RX.finditer(data):
+        lines, pos = [], run.start()
+        for line in run.group(0).splitlines(keepends=True):
+            lines.append((pos, pos + len(line.rstrip(b"\r\n")), len(line.rstrip(b"\r\n="))))
+            pos += len(line)
+        i = 0
+        while i < len(lines):
+            width = lines[i][2]
+            j = i + 1
+            while j < len(lines) and lines[j][2] == width:
+                j += 1
+            if width >= WRAP_MIN_WIDTH and j - i >= WRAP_MIN_LINES:
+                if j < len(lines) and lines[j][2] < width:
+                    j += 1   # the shorter last line of the blob
+                if sum(line[2] for line in lines[i:j]) > MAX_TOKEN_LENGTH:
+                    yield lines[i][0], lines[j - 1][1]
+                i = j
+            else:
+                i += 1
+
+
+def _blob_spans(data) -> list:
+    """Sorted, merged (start, end) spans of blobs to skip; both ends sit on line boundaries."""
+    spans = [m.span() for m in _PEM_RX.finditer(data) if _blob_token_chars(m.group(0)) > MAX_TOKEN_LENGTH]
+    spans += _wrapped_spans(data)
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def has_high_entropy_token(data) -> bool:
+    """
+    True if `data` (str or UTF-8 bytes/bytearray) contains a random-looking token no named rule covers.
+
+    Pass the already-encoded bytes when you have them; a str is encoded here (one extra copy).
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if not data:
+        return False
+    detect = _detect_numpy if np is not None else _detect_python
+    view = memoryview(data)
+    lo = 0
+    for start, end in _blob_spans(data):
+        if detect(view[lo:start]):
+            return True
+        lo = end
+    return detect(view[lo:])
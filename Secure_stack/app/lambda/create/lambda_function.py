@@ -1,206 +1,902 @@
 import json
 import os
 import time
-import boto3
 import uuid
-import base64
+import binascii
 import re
+import traceback
+import zlib
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+import admission
+import aws_clients
+import instrumentation
+import key_layout
+import profiling
+import entropy_detector
+import secret_scanner
+import storage_policy
 
 # AWS clients are created at import time to benefit from Lambda container reuse.
 # This reduces cold-start overhead compared to creating clients inside the handler.
-dynamodb = boto3.client('dynamodb')
-s3 = boto3.client('s3')
+# Timeouts, retries and pooling are tuned in aws_clients.py.
+dynamodb = aws_clients.dynamodb()
+s3 = aws_clients.s3()
 
 # Configuration is provided via environment variables in AWS. Defaults are "missing" to fail loudly.
 table_name = os.environ.get('TABLE_NAME', 'missing')
 bucket_name = os.environ.get('BUCKET_NAME', 'missing')
 
-# DynamoDB has a 400KB item size limit, but we also want to keep responses and storage efficient.
-# Pastes larger than this are stored in S3 instead of DynamoDB.
-MAX_INLINE_SIZE = 4096  # bytes
+# Opens the DynamoDB/S3 connections during init when WARMUP_CONNECTIONS is set (no-op otherwise).
+aws_clients.warmup(dynamodb, s3, table_name, bucket_name)
+
+# Enforce retention bounds server-side so a malicious client cannot set "forever".
+MIN_EXPIRY = 300       # 5 minutes
+MAX_EXPIRY = 604800    # 7 days
+
+# Protect Lambda + downstream services from huge payloads (content sent through the API).
+MAX_CONTENT_SIZE = 1024 * 1024  # 1MB
+
+# Admission (admission.py): raw body limits per route, checked before the body is parsed.
+# - JSON creates get room for JSON escaping (\n, quotes, \uXXXX from ensure_ascii clients) and
+#   the other fields; the exact MAX_CONTENT_SIZE rule is applied after decoding (prepare_paste),
+#   through the same admission path.
+# - Binary creates: the body is the content, so MAX_CONTENT_SIZE applies exactly, pre-parse.
+JSON_ESCAPE_ALLOWANCE = 2
+JSON_ENVELOPE_BYTES = 16 * 1024
+BATCH_MAX_BODY_BYTES = int(os.environ.get('BATCH_MAX_BODY_BYTES', 4 * 1024 * 1024))
+FINALIZE_MAX_BODY_BYTES = 4 * 1024
+
+# Two-phase create (see register_upload / finalize_upload): the client uploads straight to S3
+# with a presigned POST, so the bytes never pass through API Gateway or this Lambda.
+# - Uploads over CHUNK_SIZE are chunked instead: one S3 multipart upload with fixed-size parts,
+#   one presigned PUT per part, uploaded in parallel by the client. The manifest (chunk_size,
+#   chunk_count) lives in the DynamoDB item so readers can fetch the parts with concurrent
+#   ranged GETs. Still a single object, so reads, deletes and lifecycle are unchanged.
+# - The read path hands large S3-backed pastes out as a presigned GET (see the get Lambda's
+#   presigned_download), so the cap is no longer bounded by the 6MB Lambda response limit.
+# - A pending row's expiry (the table's TTL attribute) is the upload deadline,
+#   UPLOAD_WINDOW_SECONDS; finalize sets the real expiry. Abandoned rows are reaped by TTL and
+#   orphaned objects by the bucket lifecycle rule.
+MAX_DIRECT_UPLOAD_SIZE = int(os.environ.get('MAX_DIRECT_UPLOAD_SIZE', 1024 * 1024 * 1024))
+# S3 multipart limits: every part but the last is >= 5MB, at most 10,000 parts.
+CHUNK_SIZE = max(5 * 1024 * 1024, int(os.environ.get('CHUNK_SIZE', 8 * 1024 * 1024)))
+MAX_CHUNKS = 10000
+UPLOAD_URL_EXPIRES = int(os.environ.get('UPLOAD_URL_EXPIRES', 900))  # seconds
+UPLOAD_WINDOW_SECONDS = UPLOAD_URL_EXPIRES + 600
+
+PASTE_ID_RE = re.compile(r"^[a-zA-Z0-9_-]{10,50}$")
+
+# Inline (DynamoDB) vs S3 is decided by a policy configured per environment through env vars
+# (STORAGE_POLICY, INLINE_MAX_BYTES, ...). The default reproduces the old fixed 4096-byte cut-over,
+# measured on decoded bytes for ciphertext too.
+# See storage_policy.py; bench/replay_storage_policy.py projects other settings offline.
+storage = storage_policy.from_env()
+
+# Plaintext is compressed before the inline-vs-S3 decision, so logs/configs (5-10x) stay on the
+# single-request DynamoDB path far more often. Ciphertext is never touched: it does not compress
+# and the server must treat it as opaque.
+# - CONTENT_COMPRESSION: "zlib" or "none". zstd would be faster but is not in the Lambda runtime.
+# - Level 3 is ~6x on log-like text at ~15ms/MB; level 6 (zlib's default) is ~7x at ~30ms/MB.
+# - Below COMPRESSION_MIN_SIZE the saving is not worth the CPU; results that save less than
+#   COMPRESSION_MIN_SAVING are discarded and the paste is stored as-is.
+CONTENT_COMPRESSION = os.environ.get('CONTENT_COMPRESSION', 'zlib')
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 3))
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+COMPRESSION_MIN_SAVING = 0.10
+
+# Plaintext above this size is scanned in overlapping windows across worker processes.
+# Lambda allocates more vCPUs at higher memory sizes; SCAN_WORKERS=0 means "use all of them".
+# The time budget keeps a pathological paste from pushing the create Lambda toward its timeout.
+SCAN_CHUNK_THRESHOLD = int(os.environ.get('SCAN_CHUNK_THRESHOLD', 256 * 1024))  # chars
+SCAN_WINDOW_SIZE = int(os.environ.get('SCAN_WINDOW_SIZE', secret_scanner.DEFAULT_WINDOW_SIZE))
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', 0))
+SCAN_TIME_BUDGET_MS = int(os.environ.get('SCAN_TIME_BUDGET_MS', 3000))
+
+# Large pastes write to S3 and DynamoDB at the same time, and batch creates upload their S3 bodies
+# in parallel. botocore clients are thread-safe, and the pool lives for the container's lifetime so
+# warm invocations do not pay for thread startup.
+IO_CONCURRENCY = int(os.environ.get('IO_CONCURRENCY', 8))
+_io_pool = ThreadPoolExecutor(max_workers=IO_CONCURRENCY, thread_name_prefix="create-io")
+
+# Batch create (POST /create/batch): up to BATCH_MAX_PASTES specs per request.
+# Inline items go through BatchWriteItem (25 items per call, DynamoDB's limit); unprocessed items
+# are retried with exponential backoff up to BATCH_WRITE_MAX_ATTEMPTS times.
+BATCH_MAX_PASTES = int(os.environ.get('BATCH_MAX_PASTES', 50))
+BATCH_WRITE_CHUNK = 25
+BATCH_GET_CHUNK = 100        # BatchGetItem limit
+BATCH_WRITE_MAX_ATTEMPTS = 5
+BATCH_WRITE_BACKOFF_S = 0.05
+
+
+def _server_error(message: str, error: Exception) -> dict:
+    return {
+        "statusCode": 500,
+        "headers": {"Access-Control-Allow-Origin": "*"},
+        "body": json.dumps({
+            "message": message,
+            "error": str(error)
+        })
+    }
+
+
+# Creates never overwrite: S3 keys derive from the paste_id, and IDs can be client-chosen, so an
+# unconditional write would replace another paste (and bring a viewed/expired ID back to life
+# behind the get Lambda's cached 410s, see negative_cache.py).
+ID_IN_USE_CODES = ("ConditionalCheckFailedException", "PreconditionFailed")
+
+
+def _id_in_use(error) -> bool:
+    """True if error is a conditional create refused because the ID's row or object exists."""
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in ID_IN_USE_CODES
+
+
+def _id_in_use_response(paste_id: str) -> dict:
+    return _json_response(409, {"message": f"paste_id {paste_id} is already in use"})
 
 
-def detect_secrets(content: str) -> list:
+def _put_s3_object(s3_key: str, content_bytes: bytes, content_type: str):
+    with instrumentation.phase("s3_put"):
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=s3_key,
+            Body=content_bytes,
+            ContentType=content_type,
+            ServerSideEncryption="AES256",
+            IfNoneMatch="*",
+        )
+
+
+def _put_item(item: dict):
+    with instrumentation.phase("dynamodb_put"):
+        dynamodb.put_item(TableName=table_name, Item=item, ConditionExpression="attribute_not_exists(paste_id)")
+
+
+def _rollback(what: str, fn, **kwargs):
+    """Best-effort compensating delete. Failures are logged, never raised (we are already failing)."""
+    try:
+        fn(**kwargs)
+    except Exception:
+        print(f"Rollback of {what} failed; left for TTL/lifecycle cleanup")
+        traceback.print_exc()
+
+
+def store_paste(item: dict, s3_key: str, content_bytes: bytes, content_type: str = "text/plain"):
     """
-    Best-effort secrets detection for *unencrypted* content.
+    Persist the paste. Returns None on success, a 409 if the paste_id is taken, or a 500.
 
-    SECURITY NOTE:
-    - This is *not* a security boundary. It's a UX warning mechanism.
-    - False positives/negatives are expected. We only use this to nudge users toward encryption.
+    PERFORMANCE NOTE:
+    - Inline pastes are a single DynamoDB write.
+    - S3-backed pastes issue put_object and put_item concurrently, so latency is
+      max(S3, DynamoDB) instead of their sum.
+
+    CONSISTENCY:
+    - Both writes are conditional on nothing existing yet (ID_IN_USE_CODES), so whatever
+      succeeded was created by this request.
+    - If exactly one write fails, the other is rolled back (delete_item / delete_object) so we
+      never leave a metadata row pointing at a missing object, or an unreferenced object.
+    - If the rollback itself fails, the leftover is bounded anyway: the item carries the
+      DynamoDB TTL attribute, and the bucket lifecycle rule expires objects after 2 days.
+    - The metadata row can become visible a few ms before the S3 object. A reader racing the
+      creator gets a 500 and the get Lambda releases its claim, so the paste is not burned.
+    """
+    if not s3_key:
+        try:
+            _put_item(item)
+        except Exception as e:
+            if _id_in_use(e):
+                return _id_in_use_response(item["paste_id"]["S"])
+            return _server_error("Internal server error", e)
+        return None
+
+    upload = _io_pool.submit(_put_s3_object, s3_key, content_bytes, content_type)
+    # The DynamoDB write runs on the request thread; no need to hand it to the pool.
+    item_error = None
+    try:
+        _put_item(item)
+    except Exception as e:
+        item_error = e
+    upload_error = upload.exception()
+
+    if upload_error is None and item_error is None:
+        return None
+
+    if upload_error is not None and item_error is None:
+        _rollback("DynamoDB item", dynamodb.delete_item,
+                  TableName=table_name, Key={"paste_id": item["paste_id"]})
+    elif item_error is not None and upload_error is None:
+        _rollback("S3 object", s3.delete_object, Bucket=bucket_name, Key=s3_key)
+
+    if _id_in_use(item_error) or _id_in_use(upload_error):
+        return _id_in_use_response(item["paste_id"]["S"])
+    if upload_error is not None:
+        return _server_error("Failed to upload to S3", upload_error)
+    return _server_error("Internal server error", item_error)
+
+
+def is_batch_request(event: dict) -> bool:
+    """True for POST /create/batch (HTTP API payload v2.0: routeKey, or rawPath as a fallback)."""
+    route = event.get("routeKey") or ""
+    path = (event.get("rawPath") or "").rstrip("/")
+    return route.endswith(" /create/batch") or path.endswith("/create/batch")
+
+
+def batch_write_items(items: list) -> dict:
+    """
+    Put items with BatchWriteItem, BATCH_WRITE_CHUNK per call.
+
+    UnprocessedItems (throttling, partition pressure) are retried with exponential backoff;
+    whatever is still unprocessed after BATCH_WRITE_MAX_ATTEMPTS is reported as failed.
 
     RETURNS:
-    - Sorted list of detected secret categories (strings).
+    - {paste_id: error message} for items that were not written (empty on full success).
     """
-    detected = set()
-
-    # Regex patterns for common credential/token formats.
-    # Add patterns carefully: high false-positive patterns will annoy users and reduce trust.
-    patterns = {
-        "AWS Access Key": r"\bAKIA[0-9A-Z]{16}\b",
-        "Private Key": r"-----BEGIN (?:RSA|EC|DSA)? PRIVATE KEY-----",
-        "Password Pattern": r"(?i)\bpassword\s*[:=]\s*['\"][^'\"]+['\"]",
-        "Secret Pattern": r"(?i)\bsecret\s*[:=]\s*['\"][^'\"]+['\"]",
-        "JWT Token": r"\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\b",
-        "GitHub PAT": r"\b(?:gh[pousr]_[A-Za-z0-9_]{36}|github_pat_[A-Za-z0-9_]{22,255})\b",
-        "Azure GUID": r"\b[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[1-5][a-fA-F0-9]{3}-[89abAB][a-fA-F0-9]{3}-[a-fA-F0-9]{12}\b",
-        "Docker Auth Base64": r'"auth"\s*:\s*"([A-Za-z0-9+/=]{20,})"',
-        "GCP Service Account Email": r"\b[0-9a-zA-Z._%+-]+@[0-9a-zA-Z.-]+\.iam\.gserviceaccount\.com\b",
-        "Google API Key": r"\bAIza[0-9A-Za-z\-_]{35}\b",
-        "GCP Refresh Token": r"\b1\/[0-9a-zA-Z\-_]{35,}\b",
-        "GCP Client Secret": r"\b[A-Z0-9]{24}\b",
-        "GCP Client ID": r"\b[0-9]{12}-[a-z0-9]{32}\.apps\.googleusercontent\.com\b",
-        "GCP Private Key ID": r"\b[0-9a-f]{40}\b"
-    }
+    failed = {}
+    for i in range(0, len(items), BATCH_WRITE_CHUNK):
+        pending = [{"PutRequest": {"Item": item}} for item in items[i:i + BATCH_WRITE_CHUNK]]
+        error = "Write throttled; retries exhausted"
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(BATCH_WRITE_BACKOFF_S * 2 ** (attempt - 1))
+            try:
+                with instrumentation.phase("dynamodb_put"):
+                    response = dynamodb.batch_write_item(RequestItems={table_name: pending})
+            except Exception as e:
+                # botocore already retried transient errors; give up on this chunk.
+                traceback.print_exc()
+                error = str(e)
+                break
+            pending = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not pending:
+                break
+        for request in pending:
+            failed[request["PutRequest"]["Item"]["paste_id"]["S"]] = error
+    return failed
 
-    # Trivial placeholders we ignore to reduce noise.
-    placeholders = {"changeme", "password", "secret", "dummy", "example"}
-
-    def entropy(s: str) -> float:
-        """
-        Lightweight entropy estimate to filter obvious low-entropy junk (esp. base64-ish strings).
-        Not crypto-grade. Just a heuristic.
-        """
-        from math import log2
-        if not s:
-            return 0.0
-        freq = {}
-        for c in s:
-            freq[c] = freq.get(c, 0) + 1
-        e = 0.0
-        length = len(s)
-        for count in freq.values():
-            p = count / length
-            e -= p * log2(p)
-        return e
-
-    def azure_guid_in_context(match_obj):
-        """
-        Reduce false positives: GUIDs are everywhere.
-        Only flag if nearby text suggests Azure identity context.
-        """
-        window = content[max(0, match_obj.start() - 40): match_obj.end() + 40].lower()
-        keywords = ["client_id", "tenant_id", "subscription_id", "applicationid", "app_id"]
-        return any(k in window for k in keywords)
-
-    for label, pattern in patterns.items():
-        for m in re.finditer(pattern, content):
-            raw = m.group(0)
-            low = raw.lower()
-
-            # Skip obvious dummy/test values.
-            if any(p in low for p in placeholders):
-                continue
-
-            # GUIDs require contextual keywords or we ignore them.
-            if label == "Azure GUID" and not azure_guid_in_context(m):
-                continue
-
-            # For docker auth, we check the captured "auth" field only.
-            if label == "Docker Auth Base64":
-                inner = m.group(1)
-                if any(p in inner.lower() for p in placeholders):
-                    continue
-                if entropy(inner) < 3.5:
-                    continue
-                detected.add(label)
-                continue
-
-            detected.add(label)
-
-    # Heuristic for embedded service account JSON.
-    if '"type"' in content and 'service_account' in content and '"private_key"' in content:
-        detected.add("GCP Service Account JSON")
-
-    return sorted(detected)
 
+def ids_in_use(paste_ids: list) -> set:
+    """
+    The paste_ids that already have a row (consistent BatchGetItem, unprocessed keys retried).
 
-def lambda_handler(event, context):
+    BatchWriteItem cannot be conditional, so batch creates refuse taken IDs with this instead.
+    Raises if keys are still unprocessed after BATCH_WRITE_MAX_ATTEMPTS.
     """
-    Create Paste (Write Path)
+    taken = set()
+    for i in range(0, len(paste_ids), BATCH_GET_CHUNK):
+        keys = [{"paste_id": {"S": paste_id}} for paste_id in paste_ids[i:i + BATCH_GET_CHUNK]]
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(BATCH_WRITE_BACKOFF_S * 2 ** (attempt - 1))
+            with instrumentation.phase("dynamodb_get"):
+                response = dynamodb.batch_get_item(RequestItems={
+                    table_name: {"Keys": keys, "ProjectionExpression": "paste_id", "ConsistentRead": True}
+                })
+            taken.update(item["paste_id"]["S"] for item in response.get("Responses", {}).get(table_name, []))
+            keys = response.get("UnprocessedKeys", {}).get(table_name, {}).get("Keys", [])
+            if not keys:
+                break
+        if keys:
+            raise RuntimeError(f"{len(keys)} paste_id checks still unprocessed after retries")
+    return taken
 
-    SECURITY INVARIANTS:
-    - If content_encrypted == True, the server MUST treat content as opaque ciphertext.
-      That means: no plaintext parsing, no "smart" transformations, no logging of content.
-    - Avoid logging sensitive material (plaintext or ciphertext). Logs are a common leak path.
-      (Right now the code prints sizes/types; keep it that way.)
 
-    STORAGE POLICY:
-    - Small payloads (<= MAX_INLINE_SIZE) are stored inline in DynamoDB.
-    - Large payloads are stored in S3; DynamoDB stores only metadata + s3_key.
-    - TTL is recorded for eventual deletion; actual deletion is best-effort (Dynamo TTL is not instant).
+def _batch_result(status: int, paste_id: str = None, **fields) -> dict:
+    result = {"statusCode": status}
+    if paste_id:
+        result["paste_id"] = paste_id
+    result.update(fields)
+    return result
+
+
+def create_batch(body) -> dict:
     """
+    Batch create: {"pastes": [spec, ...]} with the same spec format as a single create.
 
-    # Handle CORS preflight for API Gateway HTTP API.
-    # Note: event formats differ between REST API vs HTTP API; hence defensive lookups.
-    if "requestContext" in event and event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
+    - Every spec goes through prepare_paste(): same validation, limits and secret detection.
+    - IDs that already have a row are refused (409) before anything is written (ids_in_use()),
+      and S3 uploads are conditional like a single create's. BatchWriteItem itself cannot be,
+      so two creates racing for the same new ID between that check and the write can still
+      overwrite each other.
+    - S3 bodies upload concurrently on _io_pool while inline items are written with
+      BatchWriteItem. Metadata for S3-backed pastes is batch-written only after its upload
+      succeeded, and the object is deleted again if that write fails, so no item ever points
+      at a missing object.
+    - One bad entry never fails the batch: the response is 200 with a per-entry result
+      (statusCode + the single-create response fields or an error message), in request order.
+    """
+    specs = body.get("pastes") if isinstance(body, dict) else None
+    if not isinstance(specs, list) or not specs or len(specs) > BATCH_MAX_PASTES:
         return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Allow-Credentials": "true"
-            },
-            "body": json.dumps({"message": "CORS preflight OK"})
+            "statusCode": 400,
+            "headers": {"Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({
+                "message": f"Batch body must be {{\"pastes\": [...]}} with 1-{BATCH_MAX_PASTES} paste specs"
+            })
         }
 
-    # Parse and validate request body early to fail fast (cheaper and safer).
+    results = [None] * len(specs)
+    prepared = {}
+    seen_ids = set()
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            results[index] = _batch_result(400, message="Invalid input: expected a JSON object")
+            continue
+        try:
+            entry, failure = prepare_paste(spec, route="POST /create/batch")
+        except Exception as e:
+            # Contain anything prepare_paste did not anticipate to this entry.
+            print(f"Batch entry {index} failed: {e}")
+            results[index] = _batch_result(500, spec.get("paste_id"), message="Internal server error")
+            continue
+        if failure is not None:
+            results[index] = _batch_result(failure["statusCode"], spec.get("paste_id"), **json.loads(failure["body"]))
+            continue
+        # BatchWriteItem rejects the whole call if a key appears twice.
+        if entry["paste_id"] in seen_ids:
+            results[index] = _batch_result(409, entry["paste_id"], message="Duplicate paste_id in batch")
+            continue
+        seen_ids.add(entry["paste_id"])
+        prepared[index] = entry
+
     try:
-        body = json.loads(event.get("body", "{}"))
+        taken = ids_in_use(sorted(seen_ids))
+    except Exception as e:
+        traceback.print_exc()
+        for i, entry in prepared.items():
+            results[i] = _batch_result(500, entry["paste_id"], message="Internal server error", error=str(e))
+        prepared = {}
+    else:
+        for i in [i for i, entry in prepared.items() if entry["paste_id"] in taken]:
+            entry = prepared.pop(i)
+            results[i] = _batch_result(409, entry["paste_id"], message=f"paste_id {entry['paste_id']} is already in use")
+
+    backed = {i: e for i, e in prepared.items() if e["s3_key"]}
+    uploads = {
+        i: _io_pool.submit(_put_s3_object, e["s3_key"], e["stored_bytes"], e["content_type"])
+        for i, e in backed.items()
+    }
+    failed = batch_write_items([e["item"] for e in prepared.values() if not e["s3_key"]])
+
+    uploaded = {}
+    for i, upload in uploads.items():
+        error = upload.exception()
+        if _id_in_use(error):
+            results[i] = _batch_result(409, backed[i]["paste_id"], message=f"paste_id {backed[i]['paste_id']} is already in use")
+        elif error is not None:
+            results[i] = _batch_result(500, backed[i]["paste_id"], message="Failed to upload to S3", error=str(error))
+        else:
+            uploaded[i] = backed[i]
+    failed.update(batch_write_items([e["item"] for e in uploaded.values()]))
+    for e in uploaded.values():
+        if e["paste_id"] in failed:
+            _rollback("S3 object", s3.delete_object, Bucket=bucket_name, Key=e["s3_key"])
+
+    for i, e in prepared.items():
+        if results[i] is not None:
+            continue
+        if e["paste_id"] in failed:
+            results[i] = _batch_result(500, e["paste_id"], message="Internal server error", error=failed[e["paste_id"]])
+        else:
+            results[i] = _batch_result(201, **e["response_data"])
+
+    created = sum(1 for r in results if r["statusCode"] == 201)
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Content-Type": "application/json"
+        },
+        "body": json.dumps({
+            "message": f"{created} of {len(results)} pastes created.",
+            "created": created,
+            "results": results
+        })
+    }
+
+
+def is_finalize_request(event: dict) -> bool:
+    """True for POST /create/finalize (second phase of a presigned upload)."""
+    route = event.get("routeKey") or ""
+    path = (event.get("rawPath") or "").rstrip("/")
+    return route.endswith(" /create/finalize") or path.endswith("/create/finalize")
+
+
+# Binary create: POST /create with Content-Type: application/octet-stream carries the raw
+# ciphertext as the body and the metadata in headers, instead of base64 inside JSON.
+BINARY_CONTENT_TYPE = "application/octet-stream"
+BINARY_HEADERS = (
+    ("x-paste-id", "paste_id"),
+    ("x-expiry-seconds", "expiry_seconds"),
+    ("x-paste-salt", "salt"),
+    ("x-paste-iv", "iv"),
+)
+
+
+def _header(event: dict, name: str) -> str:
+    """Case-insensitive header lookup (payload v2.0 lowercases names, other sources may not)."""
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return ""
+
+
+def is_binary_request(event: dict) -> bool:
+    return _header(event, "content-type").split(";")[0].strip().lower() == BINARY_CONTENT_TYPE
+
+
+def parse_binary_create(event: dict) -> tuple:
+    """
+    Turn a binary create into (spec, ciphertext bytes) for prepare_paste().
+
+    PERFORMANCE NOTE:
+    - HTTP APIs hand non-text bodies to Lambda base64-encoded (isBase64Encoded); that one decode
+      is the only transcode left on the write path: no base64 in the browser, no JSON string
+      of the ciphertext, 25% less on the wire. No binary media type setup is needed for HTTP APIs.
+
+    SECURITY NOTE:
+    - Binary bodies are always treated as ciphertext (content_encrypted = true).
+    """
+    raw = event.get("body") or ""
+    content = binascii.a2b_base64(raw) if event.get("isBase64Encoded") else raw.encode("utf-8")
+    spec = {"content_encrypted": True}
+    for header, field in BINARY_HEADERS:
+        value = _header(event, header)
+        if value:
+            spec[field] = value
+    return spec, content
+
+
+def request_body_limit(event: dict) -> int:
+    """Admission limit for this request's raw body (see the constants at the top)."""
+    if is_batch_request(event):
+        return BATCH_MAX_BODY_BYTES
+    if is_finalize_request(event):
+        return FINALIZE_MAX_BODY_BYTES
+    if is_binary_request(event):
+        return MAX_CONTENT_SIZE
+    return MAX_CONTENT_SIZE * JSON_ESCAPE_ALLOWANCE + JSON_ENVELOPE_BYTES
+
+
+def _json_response(status: int, payload: dict) -> dict:
+    with instrumentation.phase("serialize"):
+        body = json.dumps(payload)
+    return {
+        "statusCode": status,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Content-Type": "application/json"
+        },
+        "body": body
+    }
+
 
-        # paste_id is client-provided or server-generated. Client-provided supports "bring your own ID".
-        # SECURITY NOTE: IDs should be non-enumerable (random). If allowing client-provided IDs,
-        # validate strictly to avoid injection/path issues.
+def register_upload(body: dict) -> dict:
+    """
+    Phase 1 of a direct-to-S3 create: {"upload": "presigned", "content_length": N, ...}.
+
+    Writes a pending metadata row (upload_pending = true, expiring at the upload deadline) and
+    returns a presigned POST
+    whose policy pins the exact key, the exact declared size and SSE-S3, so the client cannot
+    put anything else, anywhere else. The get Lambda refuses pending rows.
+
+    CHUNKED UPLOADS:
+    - Above CHUNK_SIZE the response is {"method": "PUT", "part_size", "parts": [{"part_number", "url"}]}
+      instead: a multipart upload created here with SSE-S3, one presigned UploadPart URL per part.
+      Part URLs cannot pin sizes, so finalize checks every part against the manifest.
+
+    SECURITY NOTE:
+    - Same rules as a single create for paste_id, expiry and salt/iv.
+    - Plaintext is allowed but is only secret-scanned at finalize if it is within
+      MAX_CONTENT_SIZE (larger uploads report secret_scan_complete = false).
+    """
+    try:
         paste_id = body.get("paste_id", str(uuid.uuid4()))
-        content = body.get("content", "")
+        content_length = int(body.get("content_length"))
         expiry_seconds = int(body.get("expiry_seconds", 3600))
-
-        # content_encrypted indicates whether content is ciphertext (base64 string) from the client.
-        # In a true zero-trust design, this should be True by default in the frontend.
         content_encrypted = body.get("content_encrypted", False)
-
-        # Enforce retention bounds server-side so a malicious client cannot set "forever".
-        MIN_EXPIRY = 300       # 5 minutes
-        MAX_EXPIRY = 604800    # 7 days
+        if not isinstance(paste_id, str) or not PASTE_ID_RE.match(paste_id):
+            raise ValueError("Invalid paste_id format. Use only letters, numbers, dashes, and underscores (10-50 chars).")
+        # Same type checks as prepare_paste(): "false" must not register ciphertext, and a
+        # non-string salt/iv must not reach DynamoDB (a 500 instead of a 400).
+        if not isinstance(content_encrypted, bool):
+            raise ValueError("content_encrypted must be true or false")
+        for field in ("salt", "iv"):
+            if body.get(field) is not None and not isinstance(body[field], str):
+                raise ValueError(f"{field} must be a string")
         if expiry_seconds < MIN_EXPIRY or expiry_seconds > MAX_EXPIRY:
-            return {
-                "statusCode": 400,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({
-                    "message": f"Expiry must be between {MIN_EXPIRY} and {MAX_EXPIRY} seconds"
-                })
-            }
+            raise ValueError(f"Expiry must be between {MIN_EXPIRY} and {MAX_EXPIRY} seconds")
+        if content_length < 1 or content_length > MAX_DIRECT_UPLOAD_SIZE:
+            raise ValueError(f"content_length must be between 1 and {MAX_DIRECT_UPLOAD_SIZE} bytes")
+        chunk_count = (content_length + CHUNK_SIZE - 1) // CHUNK_SIZE
+        if chunk_count > MAX_CHUNKS:
+            raise ValueError(f"content_length needs more than {MAX_CHUNKS} parts of {CHUNK_SIZE} bytes")
+    except Exception as e:
+        return _json_response(400, {"message": f"Invalid input: {e}"})
 
-        # Protect Lambda + downstream services from huge payloads.
-        MAX_CONTENT_SIZE = 1024 * 1024  # 1MB
-        content_size = len(content.encode('utf-8'))
-        if content_size > MAX_CONTENT_SIZE:
-            return {
-                "statusCode": 413,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({
-                    "message": f"Content too large. Maximum size is 1MB ({MAX_CONTENT_SIZE} bytes). Your content is {content_size} bytes."
-                })
-            }
+    now = int(time.time())
+    s3_key = key_layout.object_key(paste_id, ".enc" if content_encrypted else ".txt")
+    item = {
+        "paste_id": {"S": paste_id},
+        # Until finalized, the row only lives for the upload window; the paste's own lifetime
+        # (expiry_seconds) starts at finalize, once the content exists.
+        "expiry": {"N": str(now + UPLOAD_WINDOW_SECONDS)},
+        "ttl": {"N": str(now + UPLOAD_WINDOW_SECONDS)},
+        "expiry_seconds": {"N": str(expiry_seconds)},
+        "used": {"BOOL": False},
+        "encrypted": {"BOOL": content_encrypted},
+        "content_length": {"N": str(content_length)},
+        "s3_key": {"S": s3_key},
+        "key_layout": {"N": str(key_layout.CURRENT)},
+        "upload_pending": {"BOOL": True},
+    }
+    if content_encrypted:
+        if body.get("salt"):
+            item["salt"] = {"S": body["salt"]}
+        if body.get("iv"):
+            item["iv"] = {"S": body["iv"]}
 
+    content_type = "application/octet-stream" if content_encrypted else "text/plain"
+    instrumentation.set_dimensions(tier="s3", encrypted=content_encrypted)
+    try:
+        if chunk_count > 1:
+            upload = _register_chunked_upload(item, s3_key, content_type, chunk_count)
+        else:
+            _put_item(item)
+            with instrumentation.phase("presign"):
+                post = s3.generate_presigned_post(
+                    Bucket=bucket_name,
+                    Key=s3_key,
+                    Fields={"Content-Type": content_type, "x-amz-server-side-encryption": "AES256"},
+                    Conditions=[
+                        {"Content-Type": content_type},
+                        {"x-amz-server-side-encryption": "AES256"},
+                        ["content-length-range", content_length, content_length],
+                    ],
+                    ExpiresIn=UPLOAD_URL_EXPIRES,
+                )
+            upload = {"method": "POST", "url": post["url"], "fields": post["fields"]}
     except Exception as e:
-        # Do not echo raw exception details in production if you can avoid it.
-        # It can leak parsing behavior. For now we keep it for dev visibility.
-        return {
-            "statusCode": 400,
-            "headers": {"Access-Control-Allow-Origin": "*"},
-            "body": json.dumps({"message": f"Invalid input: {e}"})
-        }
+        if _id_in_use(e):
+            return _id_in_use_response(paste_id)
+        return _server_error("Internal server error", e)
 
-    # Strict ID validation reduces attack surface (S3 key construction, DynamoDB keys, etc).
-    # NOTE: error message says (3-50 chars) but regex enforces (10-50). Keep those consistent.
-    if not re.match(r"^[a-zA-Z0-9_-]{10,50}$", paste_id):
-        return {
-            "statusCode": 400,
-            "body": json.dumps({
-                "message": "Invalid paste_id format. Use only letters, numbers, dashes, and underscores (10-50 chars)."
-            })
+    return _json_response(201, {
+        "message": f"Paste {paste_id} registered. Upload the content, then call /create/finalize.",
+        "paste_id": paste_id,
+        "expiry_seconds": expiry_seconds,
+        "content_length": content_length,
+        "upload": dict(upload, expires_in=UPLOAD_URL_EXPIRES),
+    })
+
+
+def _register_chunked_upload(item: dict, s3_key: str, content_type: str, chunk_count: int) -> dict:
+    """
+    Start the multipart upload, record it and its manifest in the pending row, presign the parts.
+
+    The multipart upload is created first because the row has to carry its UploadId; if the row
+    write fails the upload is aborted (the lifecycle rule aborts it after a day otherwise).
+    """
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket_name,
+        Key=s3_key,
+        ContentType=content_type,
+        ServerSideEncryption="AES256",
+    )["UploadId"]
+    item["upload_id"] = {"S": upload_id}
+    item["chunk_size"] = {"N": str(CHUNK_SIZE)}
+    item["chunk_count"] = {"N": str(chunk_count)}
+    try:
+        _put_item(item)
+    except Exception:
+        _rollback("multipart upload", s3.abort_multipart_upload,
+                  Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+        raise
+    # Presigning is local (no request per part).
+    with instrumentation.phase("presign"):
+        parts = [
+            {
+                "part_number": n,
+                "url": s3.generate_presigned_url(
+                    "upload_part",
+                    Params={"Bucket": bucket_name, "Key": s3_key, "UploadId": upload_id, "PartNumber": n},
+                    ExpiresIn=UPLOAD_URL_EXPIRES,
+                ),
+            }
+            for n in range(1, chunk_count + 1)
+        ]
+    return {"method": "PUT", "part_size": CHUNK_SIZE, "parts": parts}
+
+
+def _complete_chunked_upload(item: dict):
+    """
+    Check every uploaded part against the manifest and complete the multipart upload.
+
+    RETURNS:
+    - None when the object is complete (or was completed by an earlier finalize; the caller's
+      HEAD check decides), otherwise an error response.
+    """
+    s3_key = item["s3_key"]["S"]
+    upload_id = item["upload_id"]["S"]
+    declared = int(item["content_length"]["N"])
+    chunk_size = int(item["chunk_size"]["N"])
+    chunk_count = int(item["chunk_count"]["N"])
+
+    parts, kwargs = {}, {}
+    try:
+        while True:
+            page = s3.list_parts(Bucket=bucket_name, Key=s3_key, UploadId=upload_id, **kwargs)
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part
+            if not page.get("IsTruncated"):
+                break
+            kwargs["PartNumberMarker"] = page["NextPartNumberMarker"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "NoSuchUpload":
+            return None
+        raise
+
+    missing = [n for n in range(1, chunk_count + 1) if n not in parts]
+    if missing:
+        return _json_response(409, {
+            "message": f"Content not uploaded yet ({len(missing)} of {chunk_count} parts missing)"
+        })
+    last_size = declared - chunk_size * (chunk_count - 1)
+    if len(parts) != chunk_count or any(
+        parts[n]["Size"] != (chunk_size if n < chunk_count else last_size)
+        for n in range(1, chunk_count + 1)
+    ):
+        _rollback("multipart upload", s3.abort_multipart_upload,
+                  Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+        return _json_response(400, {"message": "Uploaded parts do not match the registration"})
+
+    s3.complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=s3_key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": [
+            {"PartNumber": n, "ETag": parts[n]["ETag"]} for n in range(1, chunk_count + 1)
+        ]},
+    )
+    return None
+
+
+def finalize_upload(body) -> dict:
+    """
+    Phase 2 of a direct-to-S3 create: {"paste_id": "..."}.
+
+    Completes chunked (multipart) uploads after checking their parts, checks the uploaded
+    object (HEAD: exact declared size, SSE), secret-scans plaintext, then
+    clears upload_pending and sets the paste's real expiry in one conditional update.
+    Idempotent failures: finalizing twice, or an unknown/expired registration, returns 404/409.
+    """
+    paste_id = body.get("paste_id") if isinstance(body, dict) else None
+    if not isinstance(paste_id, str) or not PASTE_ID_RE.match(paste_id):
+        return _json_response(400, {"message": "Invalid or missing paste_id"})
+
+    try:
+        with instrumentation.phase("dynamodb_get"):
+            item = dynamodb.get_item(
+                TableName=table_name,
+                Key={"paste_id": {"S": paste_id}},
+                ConsistentRead=True,
+            ).get("Item")
+        if (not item or not item.get("upload_pending", {}).get("BOOL", False)
+                or int(item["expiry"]["N"]) < int(time.time())):
+            return _json_response(404, {"message": "No pending upload for this paste_id"})
+
+        s3_key = item["s3_key"]["S"]
+        declared = int(item["content_length"]["N"])
+        instrumentation.set_dimensions(tier="s3", encrypted=item.get("encrypted", {}).get("BOOL", False))
+        if "upload_id" in item:
+            failure = _complete_chunked_upload(item)
+            if failure is not None:
+                return failure
+        try:
+            with instrumentation.phase("s3_head"):
+                head = s3.head_object(Bucket=bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return _json_response(409, {"message": "Content not uploaded yet"})
+            raise
+        if head.get("ContentLength") != declared or head.get("ServerSideEncryption") != "AES256":
+            _rollback("S3 object", s3.delete_object, Bucket=bucket_name, Key=s3_key)
+            return _json_response(400, {"message": "Uploaded object does not match the registration"})
+
+        encrypted = item.get("encrypted", {}).get("BOOL", False)
+        secrets_found, secret_scan_complete = [], True
+        if not encrypted:
+            if declared <= MAX_CONTENT_SIZE:
+                with instrumentation.phase("s3_get"):
+                    content_bytes = s3.get_object(Bucket=bucket_name, Key=s3_key)["Body"].read()
+                content_str = content_bytes.decode("utf-8", errors="replace")
+                with instrumentation.phase("secret_scan"):
+                    secrets_found, secret_scan_complete = detect_secrets(content_str, content_bytes)
+            else:
+                secret_scan_complete = False
+
+        now = int(time.time())
+        expiry_seconds = int(item["expiry_seconds"]["N"])
+        update = "SET expiry = :expiry, #ttl = :expiry"
+        values = {
+            ":expiry": {"N": str(now + expiry_seconds)},
+            ":pending": {"BOOL": True},
+            ":now": {"N": str(now)},
         }
+        if secrets_found:
+            update += ", has_secrets = :has, secret_types = :types"
+            values[":has"] = {"BOOL": True}
+            values[":types"] = {"S": ", ".join(secrets_found)}
+        try:
+            with instrumentation.phase("dynamodb_update"):
+                dynamodb.update_item(
+                    TableName=table_name,
+                    Key={"paste_id": {"S": paste_id}},
+                    UpdateExpression=update + " REMOVE upload_pending, expiry_seconds, upload_id",
+                    ConditionExpression="upload_pending = :pending AND expiry >= :now",
+                    ExpressionAttributeNames={"#ttl": "ttl"},
+                    ExpressionAttributeValues=values,
+                )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return _json_response(409, {"message": "Upload already finalized"})
+            raise
+    except Exception as e:
+        traceback.print_exc()
+        return _server_error("Internal server error", e)
+
+    response_data = {
+        "message": f"Paste {paste_id} created.",
+        "paste_id": paste_id,
+        "expiry_seconds": expiry_seconds,
+        "content_length": declared,
+        "secrets_detected": len(secrets_found) > 0,
+        "secret_types": secrets_found
+    }
+    if not secret_scan_complete:
+        response_data["secret_scan_complete"] = False
+    if secrets_found:
+        response_data["warning"] = "⚠️ Potential secrets detected! Consider using encryption for sensitive data."
+    return _json_response(201, response_data)
+
+
+def compress_for_storage(content_bytes: bytes) -> tuple:
+    """
+    Compress plaintext for storage if it is worth it.
+
+    RETURNS:
+    - (bytes to store, content_encoding), where content_encoding is "zlib" or None (stored as-is).
+      The get Lambda reverses this based on the item's content_encoding attribute.
+    """
+    if CONTENT_COMPRESSION != "zlib" or len(content_bytes) < COMPRESSION_MIN_SIZE:
+        return content_bytes, None
+    # A window larger than the input cannot find more matches, so size the window (and the hash
+    # table with it) to the input: same output, a fraction of zlib's working memory for small
+    # pastes (~70KB instead of ~300KB at 4KB). The window size is recorded in the zlib header,
+    # so readers need no extra parameters.
+    wbits = min(15, max(9, (len(content_bytes) - 1).bit_length()))
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, wbits, max(1, wbits - 7))
+    compressed = compressor.compress(content_bytes) + compressor.flush()
+    if len(compressed) > len(content_bytes) * (1 - COMPRESSION_MIN_SAVING):
+        return content_bytes, None
+    return compressed, "zlib"
+
+
+def detect_secrets(content: str, content_bytes: bytes = None) -> tuple:
+    """
+    Best-effort secrets detection for *unencrypted* content.
+
+    SECURITY NOTE:
+    - This is *not* a security boundary. It's a UX warning mechanism.
+    - False positives/negatives are expected. We only use this to nudge users toward encryption.
+
+    PERFORMANCE NOTE:
+    - Rules are compiled once per container in secret_scanner (not per request), and
+      literal-anchored rules only run near candidate offsets. See secret_scanner.py.
+    - Content over SCAN_CHUNK_THRESHOLD is split into overlapping windows scanned in parallel,
+      under a wall-clock budget of SCAN_TIME_BUDGET_MS.
+    - The "High-entropy token" check works on the UTF-8 bytes; pass content_bytes if you
+      already have them so the content is not encoded twice.
+
+    RETURNS:
+    - (sorted list of detected secret categories, complete flag).
+      complete is False only if the time budget ran out; the list is then best-effort.
+    """
+    if len(content) <= SCAN_CHUNK_THRESHOLD:
+        found, complete = secret_scanner.scan(content), True
+    else:
+        found, complete = secret_scanner.scan_chunked(
+            content,
+            window_size=SCAN_WINDOW_SIZE,
+            workers=SCAN_WORKERS or None,
+            budget_s=SCAN_TIME_BUDGET_MS / 1000,
+        )
+
+    # Catches random-looking keys that none of the named rules above describe.
+    if entropy_detector.has_high_entropy_token(content_bytes if content_bytes is not None else content):
+        found.add(entropy_detector.LABEL)
+
+    return sorted(found), complete
+
+
+def prepare_paste(body: dict, ciphertext: bytes = None, route: str = "POST /create") -> tuple:
+    """
+    Validate one paste spec, run secret detection and build its DynamoDB item.
+
+    Shared by single and batch creates so every entry gets exactly the same treatment.
+    Binary creates pass the raw ciphertext separately (see parse_binary_create); it is stored
+    as bytes (B) when inline, never re-encoded.
+
+    RETURNS:
+    - (prepared, None): prepared holds paste_id, item, s3_key, stored_bytes, content_type and
+      the response_data to return once the paste is stored.
+    - (None, error_response) if the spec is invalid.
+    """
+    # Validate early to fail fast (cheaper and safer).
+    with instrumentation.phase("validate"):
+        try:
+            # paste_id is client-provided or server-generated. Client-provided supports "bring your own ID".
+            # SECURITY NOTE: IDs should be non-enumerable (random). If allowing client-provided IDs,
+            # validate strictly to avoid injection/path issues.
+            paste_id = body.get("paste_id", str(uuid.uuid4()))
+            content = body.get("content", "")
+            expiry_seconds = int(body.get("expiry_seconds", 3600))
+
+            # content_encrypted indicates whether content is ciphertext (base64 string) from the client.
+            # In a true zero-trust design, this should be True by default in the frontend.
+            content_encrypted = body.get("content_encrypted", False)
+
+            # Wrong JSON types would otherwise surface later as TypeErrors (regex match, isascii)
+            # or as DynamoDB rejecting the item, which in a batch fails every entry's write.
+            # Strict ID validation reduces attack surface (S3 key construction, DynamoDB keys, etc).
+            if not isinstance(paste_id, str) or not PASTE_ID_RE.match(paste_id):
+                raise ValueError("Invalid paste_id format. Use only letters, numbers, dashes, and underscores (10-50 chars).")
+            if not isinstance(content, str):
+                raise ValueError("content must be a string")
+            if not isinstance(content_encrypted, bool):
+                raise ValueError("content_encrypted must be true or false")
+            for field in ("salt", "iv"):
+                if body.get(field) is not None and not isinstance(body[field], str):
+                    raise ValueError(f"{field} must be a string")
+
+            # Enforce retention bounds server-side so a malicious client cannot set "forever".
+            if expiry_seconds < MIN_EXPIRY or expiry_seconds > MAX_EXPIRY:
+                return None, {
+                    "statusCode": 400,
+                    "headers": {"Access-Control-Allow-Origin": "*"},
+                    "body": json.dumps({
+                        "message": f"Expiry must be between {MIN_EXPIRY} and {MAX_EXPIRY} seconds"
+                    })
+                }
+
+            # Protect Lambda + downstream services from huge payloads.
+            # PERFORMANCE NOTE: plaintext is UTF-8 encoded exactly once, here. The size check, secret
+            # detection, compression and the upload all read this one buffer. Base64 ciphertext is
+            # ASCII, so its length already is its encoded size (no copy needed to measure it).
+            content_bytes = None
+            if ciphertext is not None:
+                content_size = len(ciphertext)
+            elif content_encrypted and content.isascii():
+                content_size = len(content)
+            else:
+                content_bytes = content.encode('utf-8')
+                content_size = len(content_bytes)
+            too_large = admission.reject_oversized(
+                content_size, MAX_CONTENT_SIZE, route, "content_too_large",
+                f"Content too large. Maximum size is 1MB ({MAX_CONTENT_SIZE} bytes). Your content is {content_size} bytes. "
+                f"Use a presigned upload (\"upload\": \"presigned\") for up to {MAX_DIRECT_UPLOAD_SIZE} bytes."
+            )
+            if too_large is not None:
+                return None, too_large
+
+        except Exception as e:
+            # Do not echo raw exception details in production if you can avoid it.
+            # It can leak parsing behavior. For now we keep it for dev visibility.
+            return None, {
+                "statusCode": 400,
+                "headers": {"Access-Control-Allow-Origin": "*"},
+                "body": json.dumps({"message": f"Invalid input: {e}"})
+            }
 
     # Expiry timestamp is stored for:
     # - API checks (return 410 when expired)
@@ -208,20 +904,24 @@ def lambda_handler(event, context):
     expiry_ts = int(time.time()) + expiry_seconds
 
     s3_key = None
-    content_bytes = b""
     content_str = ""
 
     # Avoid printing content itself. Sizes/types are okay; content is not.
-    print("Type of content:", type(content))
-    print("Content size in bytes (pre-encoding):", len(content.encode("utf-8")))
+    instrumentation.debug("Type of content:", type(content))
+    instrumentation.debug("Content size in bytes (pre-encoding):", content_size)
 
     # If encrypted: content is expected to be a base64 string of ciphertext bytes.
     # We decode to bytes for storage (S3) or keep base64 string for inline DynamoDB storage.
-    if content_encrypted:
+    # a2b_base64 reads the ASCII str in place (b64decode would encode it to bytes first);
+    # same lenient decoding as b64decode without validate=True.
+    if ciphertext is not None:
+        content_bytes = ciphertext
+    elif content_encrypted:
         try:
-            content_bytes = base64.b64decode(content.encode())
+            with instrumentation.phase("decode"):
+                content_bytes = binascii.a2b_base64(content)
         except Exception as e:
-            return {
+            return None, {
                 "statusCode": 400,
                 "body": json.dumps({
                     "message": "Invalid base64 content",
@@ -229,44 +929,49 @@ def lambda_handler(event, context):
                 })
             }
     else:
-        # Plaintext path: store as utf-8 bytes; also keep string for secret detection and inline storage.
-        content_bytes = content.encode("utf-8")
+        # Plaintext path: utf-8 bytes (encoded above) are stored; the string itself is used for
+        # secret detection and inline storage.
         content_str = content
 
     # Secrets detection is only meaningful for plaintext.
     # We do this *before* storage so we can store metadata flags.
     secrets_found = []
+    secret_scan_complete = True
     if not content_encrypted and content_str:
-        secrets_found = detect_secrets(content_str)
+        with instrumentation.phase("secret_scan"):
+            secrets_found, secret_scan_complete = detect_secrets(content_str, content_bytes)
+        if not secret_scan_complete:
+            print("Secret scan hit its time budget; results are partial")
+
+    # Compression tier: plaintext only. Secret detection above ran on the original text.
+    stored_bytes, content_encoding = content_bytes, None
+    if not content_encrypted:
+        with instrumentation.phase("compress"):
+            stored_bytes, content_encoding = compress_for_storage(content_bytes)
 
-    # Storage decision:
+    # Storage decision (on the stored size), delegated to the configured policy:
     # - If payload is large: store in S3.
     # - Otherwise: store directly in DynamoDB.
     #
     # SECURITY NOTE:
     # - S3 uses ServerSideEncryption="AES256" (SSE-S3). Consider SSE-KMS if you want KMS-backed auditing/key control.
     # - In "zero trust" framing, SSE is defense-in-depth; the real confidentiality should come from client-side encryption.
-    if len(content_bytes) > MAX_INLINE_SIZE:
+    # The policy sees the size the item would actually hold: JSON ciphertext stays inline as the
+    # base64 string it arrived as (~4/3 of the decoded bytes, see below), and that string is
+    # what counts against DynamoDB's 400KB item limit.
+    if content_encrypted and ciphertext is None:
+        stored_size = len(content)
+    else:
+        stored_size = len(stored_bytes)
+    inline = storage.choose(stored_size, content_encrypted) == storage_policy.INLINE
+    instrumentation.set_dimensions(tier=storage_policy.INLINE if inline else storage_policy.S3,
+                                   encrypted=content_encrypted)
+    if not inline:
         ext = ".enc" if content_encrypted else ".txt"
-        s3_key = f"pastes/{paste_id}{ext}"
-
-        try:
-            s3.put_object(
-                Bucket=bucket_name,
-                Key=s3_key,
-                Body=content_bytes,
-                ContentType="text/plain",
-                ServerSideEncryption="AES256"
-            )
-        except Exception as e:
-            return {
-                "statusCode": 500,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({
-                    "message": "Failed to upload to S3",
-                    "error": str(e)
-                })
-            }
+        if content_encoding:
+            ext += ".zlib"
+        # Hash-prefixed by default, so burst writes spread over many S3 partitions (key_layout.py).
+        s3_key = key_layout.object_key(paste_id, ext)
 
     # DynamoDB item contains metadata required for retrieval + deletion.
     item = {
@@ -274,17 +979,26 @@ def lambda_handler(event, context):
         "expiry": {"N": str(expiry_ts)},
         "ttl": {"N": str(expiry_ts)},     # DynamoDB TTL attribute (eventual deletion)
         "used": {"BOOL": False},          # One-time-read semantics
-        "encrypted": {"BOOL": content_encrypted}
+        "encrypted": {"BOOL": content_encrypted},
+        "content_length": {"N": str(len(content_bytes))}  # original size, for /status
     }
 
     # If stored in S3, we keep only the key in DynamoDB.
     if s3_key:
         item["s3_key"] = {"S": s3_key}
+        item["key_layout"] = {"N": str(key_layout.CURRENT)}
+
+    # Readers must undo content_encoding before returning content.
+    if content_encoding:
+        item["content_encoding"] = {"S": content_encoding}
 
     # If small enough, store inline in DynamoDB.
     # NOTE: For encrypted content we store the *base64 string* so retrieval can return it as-is.
-    if len(content_bytes) <= MAX_INLINE_SIZE:
-        if content_encrypted:
+    # Compressed plaintext is stored as a binary (B) attribute.
+    if inline:
+        if content_encoding or ciphertext is not None:
+            item["content"] = {"B": stored_bytes}
+        elif content_encrypted:
             item["content"] = {"S": content}  # already base64 string from frontend
         else:
             item["content"] = {"S": content_str}
@@ -306,23 +1020,10 @@ def lambda_handler(event, context):
         if iv:
             item["iv"] = {"S": iv}
 
-    # Debug logging: keep it minimal. Avoid dumping full item if it can contain plaintext.
-    # Right now item["content"] may contain plaintext for small, unencrypted pastes.
-    # TODO (recommended): remove/guard this in production.
-    print("Secrets found:", secrets_found)
-    print("DynamoDB Item keys:", list(item.keys()))
-
-    try:
-        dynamodb.put_item(TableName=table_name, Item=item)
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "headers": {"Access-Control-Allow-Origin": "*"},
-            "body": json.dumps({
-                "message": "Internal server error",
-                "error": str(e)
-            })
-        }
+    # Debug logging (DEBUG_LOGS only): keep it minimal. Never dump the item itself, its content
+    # may be plaintext.
+    instrumentation.debug("Secrets found:", secrets_found)
+    instrumentation.debug("DynamoDB Item keys:", list(item.keys()))
 
     # Response includes warnings for plaintext secrets, but does not expose the content.
     response_data = {
@@ -334,14 +1035,126 @@ def lambda_handler(event, context):
         "secret_types": secrets_found
     }
 
+    # Tell the client when the warning is based on a partial scan (time budget exhausted).
+    if not secret_scan_complete:
+        response_data["secret_scan_complete"] = False
+
     if secrets_found and not content_encrypted:
         response_data["warning"] = "⚠️ Potential secrets detected! Consider using encryption for sensitive data."
 
     return {
-        "statusCode": 201,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Content-Type": "application/json"
-        },
-        "body": json.dumps(response_data)
-    }
+        "paste_id": paste_id,
+        "item": item,
+        "s3_key": s3_key,
+        "stored_bytes": stored_bytes,
+        "content_type": "application/zlib" if content_encoding else "text/plain",
+        "response_data": response_data,
+    }, None
+
+
+@profiling.profiled(store=_put_s3_object)
+@instrumentation.instrumented
+def lambda_handler(event, context):
+    """
+    Create Paste (Write Path)
+
+    SECURITY INVARIANTS:
+    - If content_encrypted == True, the server MUST treat content as opaque ciphertext.
+      That means: no plaintext parsing, no "smart" transformations, no logging of content.
+    - Avoid logging sensitive material (plaintext or ciphertext). Logs are a common leak path.
+      (Right now the code prints sizes/types; keep it that way.)
+
+    STORAGE POLICY:
+    - Plaintext may be zlib-compressed first (see compress_for_storage); the size checks below
+      apply to the stored (possibly compressed) bytes.
+    - storage.choose() (storage_policy.py) puts small payloads inline in DynamoDB.
+    - Large payloads are stored in S3; DynamoDB stores only metadata + s3_key.
+    - TTL is recorded for eventual deletion; actual deletion is best-effort (Dynamo TTL is not instant).
+
+    BATCH:
+    - POST /create/batch takes {"pastes": [spec, ...]}; see create_batch().
+
+    ADMISSION:
+    - Oversized bodies are rejected with 413 before parsing (admission.py, request_body_limit()).
+
+    BINARY:
+    - POST /create with Content-Type: application/octet-stream: raw ciphertext body, metadata in
+      X-Paste-Id / X-Expiry-Seconds / X-Paste-Salt / X-Paste-Iv (see parse_binary_create()).
+
+    DIRECT UPLOAD (content over the inline threshold, up to MAX_DIRECT_UPLOAD_SIZE):
+    - POST /create with {"upload": "presigned", "content_length": N, ...} returns a presigned
+      POST (register_upload); after uploading, POST /create/finalize (finalize_upload).
+    """
+
+    # Handle CORS preflight for API Gateway HTTP API.
+    # Note: event formats differ between REST API vs HTTP API; hence defensive lookups.
+    if "requestContext" in event and event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
+        return {
+            "statusCode": 200,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                "Access-Control-Allow-Headers": "*",
+                "Access-Control-Allow-Credentials": "true"
+            },
+            "body": json.dumps({"message": "CORS preflight OK"})
+        }
+
+    # Shed oversized bodies before parsing them (cheap: only len() of the raw body).
+    rejected = admission.admit(event, request_body_limit(event))
+    if rejected is not None:
+        return rejected
+
+    if is_binary_request(event):
+        if is_batch_request(event) or is_finalize_request(event):
+            return _json_response(415, {"message": "Binary bodies are only accepted by POST /create"})
+        try:
+            with instrumentation.phase("parse"):
+                body, ciphertext = parse_binary_create(event)
+        except Exception as e:
+            return _json_response(400, {"message": f"Invalid input: {e}"})
+        prepared, failure = prepare_paste(body, ciphertext)
+        if failure is not None:
+            return failure
+        failure = store_paste(prepared["item"], prepared["s3_key"], prepared["stored_bytes"], prepared["content_type"])
+        if failure is not None:
+            return failure
+        return _json_response(201, prepared["response_data"])
+
+    # Parse the request body early to fail fast (cheaper and safer).
+    try:
+        with instrumentation.phase("parse"):
+            body = json.loads(event.get("body", "{}"))
+    except Exception as e:
+        # Do not echo raw exception details in production if you can avoid it.
+        return {
+            "statusCode": 400,
+            "headers": {"Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": f"Invalid input: {e}"})
+        }
+
+    if is_batch_request(event):
+        return create_batch(body)
+
+    if is_finalize_request(event):
+        return finalize_upload(body)
+
+    if isinstance(body, dict) and body.get("upload") == "presigned":
+        return register_upload(body)
+
+    if not isinstance(body, dict):
+        return {
+            "statusCode": 400,
+            "headers": {"Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": "Invalid input: expected a JSON object"})
+        }
+
+    prepared, failure = prepare_paste(body)
+    if failure is not None:
+        return failure
+
+    failure = store_paste(prepared["item"], prepared["s3_key"], prepared["stored_bytes"], prepared["content_type"])
+    if failure is not None:
+        return failure
+
+    return _json_response(201, prepared["response_data"])
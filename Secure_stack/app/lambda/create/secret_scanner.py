@@ -0,0 +1,503 @@
+"""
+Secret scanning engine for the create Lambda.
+
+WHY THIS EXISTS:
+- detect_secrets() used to rebuild its pattern table and run one full re.finditer pass
+  per pattern on every request. On 1MB plaintext pastes that is 14+ passes over the text.
+- Here every rule is compiled once at import time (Lambda container init), and rules that
+  start or end with a fixed literal are only evaluated at offsets where that literal occurs.
+  str.find() is a C-level scan, so most rules cost a handful of very cheap passes.
+- scan_chunked() splits very large pastes into overlapping windows and scans them on
+  several cores (forked workers), under a wall-clock budget.
+
+SECURITY NOTE:
+- Same contract as before: this is a UX warning mechanism, not a security boundary.
+- Only category labels leave this module. Matched values are never returned or logged.
+"""
+import heapq
+import os
+import re
+import time
+from collections import Counter
+from math import log2
+
+# Trivial placeholders we ignore to reduce noise.
+PLACEHOLDERS = ("changeme", "password", "secret", "dummy", "example")
+
+# GUIDs are everywhere; we only flag them when one of these appears nearby.
+AZURE_CONTEXT_KEYWORDS = ("client_id", "tenant_id", "subscription_id", "applicationid", "app_id")
+AZURE_CONTEXT_RADIUS = 40
+AZURE_GUID_LENGTH = 36
+
+# Docker auth captures below this entropy are almost always junk/test values.
+DOCKER_AUTH_MIN_ENTROPY = 3.5
+
+# Rule table: (label, pattern, prefilter literals, literal offset inside the match).
+#
+# Literal offset semantics:
+# - 0     -> the match starts exactly at the literal (we can anchor with rx.match).
+# - N > 0 -> the literal always sits N chars after the match start (fixed-width prefix).
+# - None  -> the literal ends the match but the prefix is variable width ("run" rules).
+#
+# Keep the patterns byte-for-byte identical to what detect_secrets() historically used.
+# The literals are a *necessary* condition for a match; if you edit a pattern, re-check that.
+LITERAL_RULES = (
+    ("AWS Access Key", r"\bAKIA[0-9A-Z]{16}\b", ("AKIA",), 0),
+    ("Private Key", r"-----BEGIN (?:RSA|EC|DSA)? PRIVATE KEY-----", ("-----BEGIN ",), 0),
+    ("JWT Token", r"\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\b", ("eyJ",), 0),
+    ("GitHub PAT", r"\b(?:gh[pousr]_[A-Za-z0-9_]{36}|github_pat_[A-Za-z0-9_]{22,255})\b",
+     ("ghp_", "gho_", "ghu_", "ghs_", "ghr_", "github_pat_"), 0),
+    ("Docker Auth Base64", r'"auth"\s*:\s*"([A-Za-z0-9+/=]{20,})"', ('"auth"',), 0),
+    ("Google API Key", r"\bAIza[0-9A-Za-z\-_]{35}\b", ("AIza",), 0),
+    ("GCP Refresh Token", r"\b1\/[0-9a-zA-Z\-_]{35,}\b", ("1/",), 0),
+    ("GCP Client ID", r"\b[0-9]{12}-[a-z0-9]{32}\.apps\.googleusercontent\.com\b",
+     (".apps.googleusercontent.com",), 45),
+    ("GCP Service Account Email", r"\b[0-9a-zA-Z._%+-]+@[0-9a-zA-Z.-]+\.iam\.gserviceaccount\.com\b",
+     (".iam.gserviceaccount.com",), None),
+)
+
+# Case-insensitive rules. Candidates come from str.find() on a lowercased copy of the text,
+# then the original (?i) pattern is matched at that offset.
+CASELESS_RULES = (
+    ("Password Pattern", r"(?i)\bpassword\s*[:=]\s*['\"][^'\"]+['\"]", "password"),
+    ("Secret Pattern", r"(?i)\bsecret\s*[:=]\s*['\"][^'\"]+['\"]", "secret"),
+)
+
+# "GCP Client Secret" (\b[A-Z0-9]{24}\b) and "GCP Private Key ID" (\b[0-9a-f]{40}\b) can only
+# match an entire word run. Every such run is a maximal run of the union class, so one cheap
+# pass over union-class runs of >= 24 chars finds every candidate for both rules.
+TOKEN_RULES = (
+    ("GCP Client Secret", 24, frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")),
+    ("GCP Private Key ID", 40, frozenset("0123456789abcdef")),
+)
+
+AZURE_GUID_PATTERN = (
+    r"\b[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[1-5][a-fA-F0-9]{3}-[89abAB][a-fA-F0-9]{3}-[a-fA-F0-9]{12}\b"
+)
+
+# Chunked mode (scan_chunked). Windows partition match *start* offsets; each window also
+# re-walks `overlap` chars before its start so finditer's non-overlapping cursor is in the
+# same state a full scan would have. That only holds if overlap >= the longest match, so it
+# is clamped to LONGEST_BOUNDED_MATCH ("github_pat_" + 255 chars, the longest bounded rule).
+# Rules with unbounded repeats (JWT, refresh token, docker auth, SA email) rarely produce
+# matches longer than the default overlap; a longer *rejected* match straddling a window
+# start is the only case where chunked and full scans can disagree.
+DEFAULT_WINDOW_SIZE = 256 * 1024
+DEFAULT_OVERLAP = 4096
+LONGEST_BOUNDED_MATCH = len("github_pat_") + 255
+
+# Characters allowed in a GCP service account email match. Used to find where a "run" rule
+# can start, walking backwards from its trailing literal.
+_SA_EMAIL_RUN = re.compile(r"[0-9a-zA-Z._%+@-]*\Z")
+_RUN_LOOKBACK = 256
+
+# Compiled once per container. Everything below is read-only after import.
+_LITERAL_RULES = tuple(
+    (label, re.compile(pattern), literals, offset)
+    for label, pattern, literals, offset in LITERAL_RULES
+)
+_CASELESS_RULES = tuple(
+    (label, re.compile(pattern), literal) for label, pattern, literal in CASELESS_RULES
+)
+_TOKEN_MIN_LENGTH = min(length for _, length, _ in TOKEN_RULES)
+_TOKEN_RUN_RX = re.compile(r"[0-9A-Za-f]{%d,}" % _TOKEN_MIN_LENGTH)
+_WORD_CHAR_RX = re.compile(r"\w")
+_AZURE_GUID_RX = re.compile(AZURE_GUID_PATTERN)
+_AZURE_CONTEXT_RX = re.compile("|".join(re.escape(k) for k in AZURE_CONTEXT_KEYWORDS), re.IGNORECASE)
+
+_LONGEST_KEYWORD = max(len(k) for k in AZURE_CONTEXT_KEYWORDS + tuple(lit for *_, lit in CASELESS_RULES))
+
+# U+017F (long s) case-folds to "s" under re.IGNORECASE but str.lower() leaves it alone.
+_CASEFOLD_ONLY_CHARS = ("\u017f",)
+
+# Labels _scan_range() can report; "GCP Service Account JSON" is a whole-text heuristic.
+_RANGE_LABELS = frozenset(
+    [label for label, *_ in LITERAL_RULES]
+    + [label for label, *_ in CASELESS_RULES]
+    + [label for label, *_ in TOKEN_RULES]
+    + ["Azure GUID"]
+)
+
+
+def shannon_entropy(s: str) -> float:
+    """
+    Lightweight entropy estimate to filter obvious low-entropy junk (esp. base64-ish strings).
+    Not crypto-grade. Just a heuristic.
+    """
+    if not s:
+        return 0.0
+    length = len(s)
+    e = 0.0
+    for count in Counter(s).values():
+        p = count / length
+        e -= p * log2(p)
+    return e
+
+
+def is_placeholder(value: str) -> bool:
+    low = value.lower()
+    return any(p in low for p in PLACEHOLDERS)
+
+
+def _literal_hits(text: str, literals, start: int = 0, stop: int = None):
+    """Yield offsets in [start, stop) where any of `literals` begins, in ascending order."""
+    if stop is None:
+        stop = len(text)
+
+    def hits(lit):
+        find = text.find
+        end = stop + len(lit) - 1
+        i = find(lit, start, end)
+        while i != -1:
+            yield i
+            i = find(lit, i + 1, end)
+
+    if len(literals) == 1:
+        return hits(literals[0])
+    return heapq.merge(*(hits(lit) for lit in literals))
+
+
+def _accept(label: str, m) -> bool:
+    """Apply the same post-match filters detect_secrets() has always applied."""
+    if is_placeholder(m.group(0)):
+        return False
+    if label == "Docker Auth Base64":
+        # For docker auth, we check the captured "auth" field only.
+        inner = m.group(1)
+        if is_placeholder(inner):
+            return False
+        if shannon_entropy(inner) < DOCKER_AUTH_MIN_ENTROPY:
+            return False
+    return True
+
+
+def _run_start(text: str, end: int) -> int:
+    """Walk back from `end` to the first char of the contiguous email-ish run."""
+    lookback = _RUN_LOOKBACK
+    while True:
+        lo = max(0, end - lookback)
+        start = _SA_EMAIL_RUN.search(text, lo, end).start()
+        if start > lo or lo == 0:
+            return start
+        lookback *= 2
+
+
+def _scan_literal_rule(text: str, label: str, rx, literals, offset, lo: int, hi: int, warm: int,
+                       reach: int) -> bool:
+    """
+    Evaluate one literal-anchored rule for matches starting in [lo, hi), visiting matches in
+    the same order re.finditer would.
+
+    `pos` mirrors finditer's non-overlapping cursor: a rejected match still consumes its span,
+    so literal hits inside it are skipped exactly like the historical full-text scan did.
+    Matches starting in [warm, lo) only advance the cursor (see plan_windows()).
+    """
+    pos = warm
+    if offset is None:
+        # Variable-width prefix: the literal can sit past `hi`. Looking `reach` chars beyond
+        # hi covers every match that fits in the window overlap (see plan_windows()).
+        hits = _literal_hits(text, literals, warm, min(len(text), hi + reach))
+    else:
+        hits = _literal_hits(text, literals, warm + offset, hi + offset)
+    for hit in hits:
+        if offset == 0:
+            if hit < pos:
+                continue
+            m = rx.match(text, hit)
+        elif offset is not None:
+            start = hit - offset
+            if start < pos:
+                continue
+            m = rx.match(text, start)
+        else:
+            if hit < pos:
+                continue
+            # Bound the search to end right after this literal (+1 char so a trailing \b
+            # still sees the real next character), then re-match from the found start
+            # without a bound to get the exact span finditer would have produced.
+            start = max(pos, _run_start(text, hit))
+            if start >= hi:
+                break
+            m = rx.search(text, start, hit + len(literals[0]) + 1)
+            if m:
+                if m.start() >= hi:
+                    break
+                m = rx.match(text, m.start())
+        if not m:
+            continue
+        if m.start() >= lo and _accept(label, m):
+            return True
+        pos = m.end()
+    return False
+
+
+def _is_word_boundary(text: str, i: int) -> bool:
+    """True if the char at offset i is not a word char (or i is outside the text)."""
+    return i < 0 or i >= len(text) or not _WORD_CHAR_RX.match(text, i)
+
+
+def _scan_tokens(text: str, found: set, lo: int, hi: int) -> None:
+    wanted = [rule for rule in TOKEN_RULES if rule[0] not in found]
+    if not wanted:
+        return
+    # A run cut by `lo` fails the left boundary check below; the window that owns its real
+    # start sees it whole, because runs are matched against the full text (no endpos).
+    # Any qualifying run starting before `hi` has at least TOKEN_MIN_LENGTH chars before
+    # this endpos. A run truncated by endpos is re-matched to get its real extent.
+    n = len(text)
+    endpos = min(n, hi + _TOKEN_MIN_LENGTH)
+    for m in _TOKEN_RUN_RX.finditer(text, lo, endpos):
+        start, end = m.span()
+        if start >= hi:
+            return
+        if end == endpos < n:
+            m = _TOKEN_RUN_RX.match(text, start)
+            end = m.end()
+        run = m.group(0)
+        for rule in wanted:
+            label, length, alphabet = rule
+            if end - start != length or not alphabet.issuperset(run):
+                continue
+            if not (_is_word_boundary(text, start - 1) and _is_word_boundary(text, end)):
+                continue
+            if is_placeholder(run):
+                continue
+            found.add(label)
+            wanted.remove(rule)
+            break
+        if not wanted:
+            return
+
+
+def _lowered_slice(text: str, start: int, stop: int):
+    """
+    Lowercased copy of text[start:stop] for case-insensitive prefilters, or None if offsets
+    would not line up with the original (str.lower() grew the text) or a casefold-only char
+    could hide a match from str.find().
+    """
+    chunk = text[start:stop]
+    lowered = chunk.lower()
+    if len(lowered) != len(chunk) or any(c in chunk for c in _CASEFOLD_ONLY_CHARS):
+        return None
+    return lowered
+
+
+def _scan_caseless_rule(text: str, lowered, rx, literal: str, lo: int, hi: int, warm: int) -> bool:
+    pos = warm
+    if lowered is None:
+        hits = (m.start() for m in rx.finditer(text, warm))
+    else:
+        hits = (warm + i for i in _literal_hits(lowered, (literal,), 0, hi - warm))
+    for hit in hits:
+        if hit >= hi:
+            break
+        if hit < pos:
+            continue
+        m = rx.match(text, hit)
+        if not m:
+            continue
+        if hit >= lo and not is_placeholder(m.group(0)):
+            return True
+        pos = m.end()
+    return False
+
+
+def _scan_azure_guids(text: str, lowered, lo: int, hi: int, warm: int) -> bool:
+    """
+    Only regions within reach of a context keyword can produce an Azure GUID hit, so we never
+    run the GUID regex over text that has no keyword nearby.
+    """
+    reach = AZURE_CONTEXT_RADIUS + AZURE_GUID_LENGTH
+    n = len(text)
+    if lowered is None:
+        keyword_spans = (
+            k.span() for k in _AZURE_CONTEXT_RX.finditer(text, lo, min(n, hi + _LONGEST_KEYWORD))
+        )
+    else:
+        keyword_spans = (
+            (warm + i, warm + i + len(kw))
+            for kw in AZURE_CONTEXT_KEYWORDS
+            for i in _literal_hits(lowered, (kw,), lo - warm, hi - warm)
+        )
+    for k_start, k_end in keyword_spans:
+        region_lo = max(0, k_end - reach)
+        region_hi = min(n, k_start + reach + 1)
+        for m in _AZURE_GUID_RX.finditer(text, region_lo, region_hi):
+            # The bounded finditer can fake a trailing \b at `region_hi`; confirm on the full text.
+            full = _AZURE_GUID_RX.match(text, m.start())
+            if not full or full.end() != m.end():
+                continue
+            if is_placeholder(m.group(0)):
+                continue
+            window = text[max(0, m.start() - AZURE_CONTEXT_RADIUS): m.end() + AZURE_CONTEXT_RADIUS].lower()
+            if any(kw in window for kw in AZURE_CONTEXT_KEYWORDS):
+                return True
+    return False
+
+
+def _scan_range(text: str, lo: int, hi: int, warm: int, reach: int, skip=frozenset()) -> set:
+    """
+    Categories for matches that *start* in [lo, hi). Every match is still evaluated against
+    the full text, so there are no artificial edges at lo/hi: only the start offset is bounded.
+    `reach` bounds how far past hi a variable-width match may end. Labels in `skip` are
+    already known and not searched again.
+    """
+    found = set()
+
+    for label, rx, literals, offset in _LITERAL_RULES:
+        if label not in skip and _scan_literal_rule(text, label, rx, literals, offset, lo, hi, warm, reach):
+            found.add(label)
+
+    # One lowercased copy serves every case-insensitive prefilter in this range.
+    lowered = _lowered_slice(text, warm, min(len(text), hi + _LONGEST_KEYWORD))
+
+    for label, rx, literal in _CASELESS_RULES:
+        if label not in skip and _scan_caseless_rule(text, lowered, rx, literal, lo, hi, warm):
+            found.add(label)
+
+    known = found | skip
+    _scan_tokens(text, known, lo, hi)
+    found |= known - skip
+
+    if "Azure GUID" not in skip and _scan_azure_guids(text, lowered, lo, hi, warm):
+        found.add("Azure GUID")
+
+    return found
+
+
+def _scan_service_account_json(text: str) -> bool:
+    # Heuristic for embedded service account JSON.
+    return '"type"' in text and 'service_account' in text and '"private_key"' in text
+
+
+def scan(text: str) -> set:
+    """
+    Return the set of secret categories found in `text`.
+
+    Produces the same category set as the historical per-pattern finditer implementation.
+    """
+    if not text:
+        return set()
+
+    found = _scan_range(text, 0, len(text), 0, len(text))
+    if _scan_service_account_json(text):
+        found.add("GCP Service Account JSON")
+    return found
+
+
+def plan_windows(length: int, window_size: int = DEFAULT_WINDOW_SIZE, overlap: int = DEFAULT_OVERLAP) -> list:
+    """
+    Split [0, length) into (lo, hi, warm) windows: matches starting in [lo, hi) belong to the
+    window, and [warm, lo) is the overlap re-walked to sync the match cursor.
+    """
+    window_size = max(1, window_size)
+    overlap = max(overlap, LONGEST_BOUNDED_MATCH)
+    return [
+        (lo, min(length, lo + window_size), max(0, lo - overlap))
+        for lo in range(0, length, window_size)
+    ]
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _scan_windows(text: str, windows, overlap: int, deadline) -> tuple:
+    found = set()
+    for lo, hi, warm in windows:
+        if deadline is not None and time.monotonic() >= deadline:
+            return found, False
+        found |= _scan_range(text, lo, hi, warm, overlap, skip=frozenset(found))
+        if found >= _RANGE_LABELS:
+            break
+    return found, True
+
+
+def _scan_worker(conn, text: str, windows, overlap: int, deadline) -> None:
+    try:
+        found, complete = _scan_windows(text, windows, overlap, deadline)
+        conn.send((sorted(found), complete))
+    finally:
+        conn.close()
+
+
+def _fork_context():
+    # Lambda has no /dev/shm, so multiprocessing.Pool/Queue (SemLock) do not work there.
+    # Forked Processes + Pipes do, and fork lets workers read `text` without pickling it.
+    # Imported here: only parallel scans of very large pastes need it, and at module level it
+    # added ~25ms to every create cold start.
+    import multiprocessing
+    try:
+        return multiprocessing.get_context("fork")
+    except ValueError:
+        return None
+
+
+def scan_chunked(text: str, window_size: int = DEFAULT_WINDOW_SIZE, overlap: int = DEFAULT_OVERLAP,
+                 workers: int = None, budget_s: float = None) -> tuple:
+    """
+    Scan `text` in overlapping windows spread over worker processes and merge the category sets.
+
+    RETURNS:
+    - (categories, complete). complete is False if `budget_s` ran out before every window was
+      scanned; categories then hold whatever was found in time (never false positives).
+
+    NOTE:
+    - The budget is checked between windows in-process and enforced by terminating workers
+      in parallel mode, so window_size also bounds how far a single window can overrun it.
+    """
+    if not text:
+        return set(), True
+
+    deadline = time.monotonic() + budget_s if budget_s is not None else None
+    overlap = max(overlap, LONGEST_BOUNDED_MATCH)
+    windows = plan_windows(len(text), window_size, overlap)
+    workers = min(workers or available_cpus(), len(windows))
+    ctx = _fork_context() if workers > 1 else None
+
+    if ctx is None:
+        found, complete = _scan_windows(text, windows, overlap, deadline)
+    else:
+        import multiprocessing.connection
+        found, complete = set(), True
+        # Contiguous groups keep the per-worker skip set effective (once a label is found,
+        # later windows in the same group stop searching for it).
+        per_worker = -(-len(windows) // workers)
+        pending = {}
+        for i in range(0, len(windows), per_worker):
+            reader, writer = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_scan_worker, args=(writer, text, windows[i:i + per_worker], overlap, deadline),
+                               daemon=True)
+            proc.start()
+            writer.close()
+            pending[reader] = proc
+
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready = multiprocessing.connection.wait(list(pending), timeout)
+            if not ready:
+                break
+            for reader in ready:
+                try:
+                    labels, done = reader.recv()
+                    found.update(labels)
+                    complete = complete and done
+                except EOFError:
+                    # Worker died without reporting (OOM/killed): its windows are unscanned.
+                    complete = False
+                reader.close()
+                pending.pop(reader).join()
+
+        # Budget exhausted: stop stragglers so they cannot push the Lambda toward its timeout.
+        for reader, proc in pending.items():
+            proc.terminate()
+            proc.join()
+            reader.close()
+            complete = False
+
+    if _scan_service_account_json(text):
+        found.add("GCP Service Account JSON")
+    return found, complete
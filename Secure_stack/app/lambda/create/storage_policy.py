@@ -0,0 +1,189 @@
+"""
+Storage tiering policy: should a paste live inline in DynamoDB or in S3?
+
+WHY THIS EXISTS:
+- The cut-over used to be a hard-coded MAX_INLINE_SIZE in the create Lambda. The right value
+  depends on the read/write mix, latency targets and prices, so it is now a policy object
+  configured per environment (Lambda env vars, set from Terraform) and replayable offline
+  (bench/replay_storage_policy.py).
+
+POLICIES (STORAGE_POLICY env var):
+- "threshold" (default): inline if the stored size is <= INLINE_MAX_BYTES
+  (INLINE_MAX_BYTES_ENCRYPTED for ciphertext). INLINE_MAX_BYTES defaults to 4096, the old
+  MAX_INLINE_SIZE. INLINE_MAX_BYTES_ENCRYPTED defaults to the base64 length of INLINE_MAX_BYTES
+  (5464 for 4096): the old rule measured ciphertext decoded, so JSON ciphertext of up to 4096
+  decoded bytes still goes inline (base64 lengths are multiples of 4, so 4097-4098 do too).
+  Raw ciphertext from binary creates is measured as is and gets the same 5464-byte limit.
+- "cost": inline if projected cost + latency_weight * latency is lower than for S3, using the
+  CostModel below. LATENCY_USD_PER_MS expresses how many dollars one ms of user-facing latency
+  is worth per request; 0 means "cheapest wins".
+- Custom policies can be added with register_policy(name, factory).
+
+SIZES:
+- Sizes are *stored* bytes, i.e. after compression (see compress_for_storage in lambda_function),
+  in the form the inline item would hold them: base64 ciphertext from JSON creates is stored as
+  its string, so its size is the base64 length, not the decoded length.
+
+NOTE:
+- Whatever the policy says, nothing above INLINE_HARD_LIMIT goes inline: DynamoDB items are capped
+  at 400KB including attribute names and metadata.
+"""
+import math
+import os
+from dataclasses import dataclass, field
+
+INLINE = "inline"
+S3 = "s3"
+
+# DynamoDB's item limit is 400KB; leave room for metadata attributes.
+INLINE_HARD_LIMIT = 350 * 1024
+
+# Approximate size of the metadata attributes (paste_id, expiry, ttl, used, salt/iv, ...).
+ITEM_OVERHEAD_BYTES = 200
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """
+    Per-request cost/latency model for both tiers.
+
+    Prices are us-east-1 on-demand list prices (USD); override via env for other regions.
+    Latencies are typical in-region round trips and are what the policy and replay tool assume,
+    not measurements.
+    """
+    ddb_write_unit_usd: float = 1.25e-6          # per write request unit (1KB)
+    ddb_storage_gb_month_usd: float = 0.25
+    s3_put_usd: float = 5e-6
+    s3_get_usd: float = 4e-7
+    s3_storage_gb_month_usd: float = 0.023
+    ddb_ms: float = 5.0
+    s3_ms: float = 20.0
+    s3_ms_per_mb: float = 10.0                   # transfer time on top of the round trip
+    reads_per_paste: float = 1.0                 # one-time read; < 1 if many pastes are never read
+    retention_days: float = 1.0                  # average time a paste is stored
+
+    def _ddb_write_units(self, item_bytes: int) -> int:
+        return max(1, math.ceil(item_bytes / 1024))
+
+    def estimate(self, stored_size: int, tier: str) -> dict:
+        """Projected create/get latency (ms) and total lifetime cost (USD) of one paste."""
+        months = self.retention_days / 30
+        s3_transfer_ms = self.s3_ms_per_mb * stored_size / (1024 * 1024)
+        if tier == INLINE:
+            item = stored_size + ITEM_OVERHEAD_BYTES
+            # The get Lambda's conditional update is billed on the item size, like the put.
+            units = self._ddb_write_units(item) * (1 + self.reads_per_paste)
+            return {
+                "create_ms": self.ddb_ms,
+                "get_ms": self.ddb_ms,
+                "cost_usd": units * self.ddb_write_unit_usd
+                            + item / 1e9 * self.ddb_storage_gb_month_usd * months,
+            }
+        units = self._ddb_write_units(ITEM_OVERHEAD_BYTES) * (1 + self.reads_per_paste)
+        return {
+            # The create Lambda writes S3 and DynamoDB concurrently.
+            "create_ms": max(self.ddb_ms, self.s3_ms + s3_transfer_ms),
+            "get_ms": self.ddb_ms + self.s3_ms + s3_transfer_ms,
+            "cost_usd": units * self.ddb_write_unit_usd
+                        + self.s3_put_usd
+                        + self.reads_per_paste * self.s3_get_usd
+                        + stored_size / 1e9 * self.s3_storage_gb_month_usd * months
+                        + ITEM_OVERHEAD_BYTES / 1e9 * self.ddb_storage_gb_month_usd * months,
+        }
+
+
+def _base64_length(size: int) -> int:
+    """Length of the padded base64 encoding of size bytes."""
+    return 4 * math.ceil(size / 3)
+
+
+class ThresholdPolicy:
+    """
+    Inline up to a fixed stored size, separately configurable for ciphertext.
+
+    The ciphertext limit defaults to the base64 length of the plaintext one, so both cut over at
+    the same decoded size (see POLICIES above).
+    """
+
+    name = "threshold"
+
+    def __init__(self, inline_max_bytes: int = 4096, inline_max_bytes_encrypted: int = None):
+        self.inline_max_bytes = inline_max_bytes
+        self.inline_max_bytes_encrypted = (
+            _base64_length(inline_max_bytes) if inline_max_bytes_encrypted is None
+            else inline_max_bytes_encrypted
+        )
+
+    def choose(self, stored_size: int, encrypted: bool) -> str:
+        limit = self.inline_max_bytes_encrypted if encrypted else self.inline_max_bytes
+        return INLINE if stored_size <= min(limit, INLINE_HARD_LIMIT) else S3
+
+    def describe(self) -> str:
+        return (f"threshold(inline<={self.inline_max_bytes}B, "
+                f"encrypted inline<={self.inline_max_bytes_encrypted}B)")
+
+
+@dataclass
+class CostPolicy:
+    """Pick the tier with the lower cost + latency_usd_per_ms * (create_ms + get_ms)."""
+
+    model: CostModel = field(default_factory=CostModel)
+    latency_usd_per_ms: float = 0.0
+    name = "cost"
+
+    def score(self, stored_size: int, tier: str) -> float:
+        est = self.model.estimate(stored_size, tier)
+        return est["cost_usd"] + self.latency_usd_per_ms * (est["create_ms"] + est["get_ms"])
+
+    def choose(self, stored_size: int, encrypted: bool) -> str:
+        if stored_size > INLINE_HARD_LIMIT:
+            return S3
+        return INLINE if self.score(stored_size, INLINE) <= self.score(stored_size, S3) else S3
+
+    def describe(self) -> str:
+        return f"cost(latency_usd_per_ms={self.latency_usd_per_ms:g})"
+
+
+def _env_float(environ, name: str, default: float) -> float:
+    value = environ.get(name)
+    return default if value in (None, "") else float(value)
+
+
+def cost_model_from_env(environ=None) -> CostModel:
+    """CostModel with any COST_<FIELD> env var overriding the default (e.g. COST_S3_MS=15)."""
+    environ = os.environ if environ is None else environ
+    defaults = CostModel()
+    return CostModel(**{
+        name: _env_float(environ, f"COST_{name.upper()}", getattr(defaults, name))
+        for name in CostModel.__dataclass_fields__
+    })
+
+
+def _threshold_from_env(environ) -> ThresholdPolicy:
+    inline_max = int(environ.get("INLINE_MAX_BYTES", 4096))
+    encrypted = environ.get("INLINE_MAX_BYTES_ENCRYPTED")
+    return ThresholdPolicy(inline_max, int(encrypted) if encrypted else None)
+
+
+def _cost_from_env(environ) -> CostPolicy:
+    return CostPolicy(cost_model_from_env(environ), _env_float(environ, "LATENCY_USD_PER_MS", 0.0))
+
+
+_POLICIES = {
+    "threshold": _threshold_from_env,
+    "cost": _cost_from_env,
+}
+
+
+def register_policy(name: str, factory):
+    """Register a policy factory: factory(environ) -> object with choose(stored_size, encrypted)."""
+    _POLICIES[name] = factory
+
+
+def from_env(environ=None):
+    """Build the policy selected by STORAGE_POLICY (default "threshold")."""
+    environ = os.environ if environ is None else environ
+    name = environ.get("STORAGE_POLICY", "threshold")
+    if name not in _POLICIES:
+        raise ValueError(f"Unknown STORAGE_POLICY {name!r}; expected one of {sorted(_POLICIES)}")
+    return _POLICIES[name](environ)
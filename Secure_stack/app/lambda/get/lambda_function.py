@@ -1,18 +1,442 @@
 import json
 import os
 import time
-import boto3
-import traceback
+from botocore.exceptions import ClientError
 import re
-import base64
 
-dynamodb = boto3.client('dynamodb')
-s3 = boto3.client('s3')
+import admission
+import aws_clients
+import instrumentation
+import key_layout
+import negative_cache
+import profiling
+
+# Tuned clients (aws_clients.py); warmup() is a no-op unless WARMUP_CONNECTIONS is set.
+dynamodb = aws_clients.dynamodb()
+s3 = aws_clients.s3()
 
 table_name = os.environ.get('TABLE_NAME', 'missing')
 bucket_name = os.environ.get('BUCKET_NAME', 'missing')
 
+aws_clients.warmup(dynamodb, s3, table_name, bucket_name)
+
+PASTE_ID_RE = re.compile(r"^[a-zA-Z0-9_-]{10,50}$")
+
+# POST /status: metadata-only lookup for up to STATUS_MAX_IDS pastes per request.
+# BatchGetItem takes at most 100 keys per call; unprocessed keys are retried with backoff.
+STATUS_MAX_IDS = int(os.environ.get('STATUS_MAX_IDS', 500))
+BATCH_GET_CHUNK = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+BATCH_GET_BACKOFF_S = 0.05
+
+# Admission (admission.py): raw body limits, checked before the body is parsed or logged.
+# Requests here only carry IDs; a paste_id is at most 50 chars.
+PASTE_MAX_BODY_BYTES = 4 * 1024
+STATUS_MAX_BODY_BYTES = STATUS_MAX_IDS * 64 + 4 * 1024
+
+# Only small attributes: never content, salt or iv. Names are aliased because several
+# plausible attribute names (size, ttl, ...) are DynamoDB reserved words.
+STATUS_ATTRIBUTES = ("paste_id", "expiry", "used", "encrypted", "has_secrets", "secret_types",
+                     "content_length", "s3_key", "upload_pending")
+
+# S3-backed pastes can be handed out as a short-lived presigned GET instead of being read into
+# this Lambda's memory, base64'd and embedded in JSON (see presigned_download()).
+# - Clients opt in with {"download": "presigned"}.
+# - Pastes larger than MAX_PROXIED_CONTENT_BYTES are always presigned: JSON escaping and base64
+#   can inflate content ~3x and the Lambda response payload is capped at 6MB.
+PRESIGNED_GET_EXPIRES = int(os.environ.get('PRESIGNED_GET_EXPIRES', 60))
+MAX_PROXIED_CONTENT_BYTES = int(os.environ.get('MAX_PROXIED_CONTENT_BYTES', 1024 * 1024))
+
+# Recently answered 404/410s, repeated without a DynamoDB round trip (see negative_cache.py).
+tombstones = negative_cache.TombstoneCache()
+GONE_RESPONSES = {
+    negative_cache.NOT_FOUND: (404, "Paste not found"),
+    negative_cache.EXPIRED: (410, "Paste expired"),
+    negative_cache.VIEWED: (410, "Paste already viewed"),
+}
+
+# Consumed inline pastes can be deleted right after they are served (see delete_consumed()).
+# Off by default: a deleted paste answers 404 instead of 410 "already viewed" afterwards.
+# S3-backed pastes are left to the reaper (app/lambda/reaper), which keeps a grace period for
+# in-flight presigned downloads.
+EAGER_DELETE_INLINE = os.environ.get('EAGER_DELETE_INLINE', 'false').lower() in ('1', 'true', 'yes')
+
+# Binary mode (see binary_response()): requests with Accept: application/octet-stream get the
+# content as the response body instead of a JSON field. Errors and presigned downloads stay JSON.
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+
+def decode_stored_content(data: bytes, content_encoding: str) -> bytes:
+    """Undo the create Lambda's storage encoding (see compress_for_storage there)."""
+    if not content_encoding:
+        return data
+    if content_encoding == "zlib":
+        import zlib
+        return zlib.decompress(data)
+    raise ValueError(f"Unsupported content_encoding: {content_encoding}")
+
+
+def presigned_download(s3_key: str, encrypted: bool, content_encoding: str, content_length: int,
+                       chunks: dict = None) -> dict:
+    """
+    Short-lived presigned GET for an S3-backed paste the caller has already consumed.
+
+    SECURITY NOTE:
+    - Only call this after consume_paste() succeeded: the URL is the paste. It stays valid for
+      PRESIGNED_GET_EXPIRES seconds, so one-time-read becomes "one consume, short download window".
+    - The body is exactly what is stored: raw ciphertext bytes for encrypted pastes (not base64).
+
+    NOTE:
+    - zlib streams are what HTTP calls the "deflate" content coding, so compressed plaintext is
+      served with Content-Encoding: deflate and browsers/HTTP clients decompress it transparently.
+    - Signing is a local operation (no request to S3).
+    - Chunked pastes (see the create Lambda's CHUNK_SIZE) also return their manifest as
+      `chunks` = {"size", "count"}: clients fetch the parts with concurrent Range requests on
+      the same URL (Range is not part of the signature) and reassemble them in order.
+    """
+    params = {"Bucket": bucket_name, "Key": s3_key}
+    if encrypted:
+        params["ResponseContentType"] = "application/octet-stream"
+    else:
+        params["ResponseContentType"] = "text/plain; charset=utf-8"
+        if content_encoding == "zlib":
+            params["ResponseContentEncoding"] = "deflate"
+        elif content_encoding:
+            raise ValueError(f"Unsupported content_encoding: {content_encoding}")
+    url = s3.generate_presigned_url("get_object", Params=params, ExpiresIn=PRESIGNED_GET_EXPIRES)
+    download = {
+        "url": url,
+        "method": "GET",
+        "expires_in": PRESIGNED_GET_EXPIRES,
+        # Decoded size (what the client ends up with), when the create path recorded it.
+        "content_length": content_length,
+    }
+    # Ranges address stored bytes, so only advertise them when stored == served bytes.
+    if chunks and not content_encoding:
+        download["chunks"] = chunks
+    return download
+
+
+def read_object(s3_key: str) -> bytes:
+    """
+    Stored bytes of an S3-backed paste.
+
+    NOTE:
+    - A key layout migration (tools/migrate_key_layout.py) copies the object, updates the row and
+      then deletes the old copy. A reader that consumed the row before the update holds the old
+      key, so a missing object is looked up under the other layout(s) before giving up.
+    - Without s3:ListBucket, S3 reports a missing key as AccessDenied rather than NoSuchKey.
+    """
+    keys = key_layout.candidate_keys(s3_key)
+    for i, key in enumerate(keys):
+        try:
+            return s3.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+        except ClientError as e:
+            missing = e.response.get("Error", {}).get("Code") in ("NoSuchKey", "AccessDenied")
+            if not missing or i == len(keys) - 1:
+                raise
+
+
+def _header(event: dict, name: str) -> str:
+    """Case-insensitive header lookup (payload v2.0 lowercases names, other sources may not)."""
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return ""
+
+
+def wants_binary(event: dict) -> bool:
+    """True if the client asked for the content as the raw response body (binary mode)."""
+    return BINARY_CONTENT_TYPE in _header(event, "accept").lower()
+
+
+def binary_response(paste_id: str, encrypted: bool, content: str, salt: str = None, iv: str = None) -> dict:
+    """
+    Binary-mode read: the content is the response body, metadata travels in X-Paste-* headers.
+
+    PERFORMANCE NOTE:
+    - For ciphertext, `content` is already the base64 form the JSON response would embed; here it
+      becomes the Lambda response body as-is (isBase64Encoded) and API Gateway sends raw bytes.
+      No JSON escaping of a multi-MB string, 25% less on the wire and no atob() in the browser.
+      Inline ciphertext from JSON creates is stored as that base64 string, so it is not even copied.
+    - Plaintext goes out as text/plain (UTF-8).
+    """
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Expose-Headers": "X-Paste-Id, X-Paste-Encrypted, X-Paste-Salt, X-Paste-Iv",
+        "Content-Type": BINARY_CONTENT_TYPE if encrypted else "text/plain; charset=utf-8",
+        "X-Paste-Id": paste_id,
+        "X-Paste-Encrypted": "true" if encrypted else "false",
+    }
+    if encrypted:
+        headers["X-Paste-Salt"] = salt
+        headers["X-Paste-Iv"] = iv
+    return {
+        "statusCode": 200,
+        "headers": headers,
+        "body": content,
+        "isBase64Encoded": encrypted,
+    }
+
+
+def is_status_request(event: dict) -> bool:
+    """True for POST /status (HTTP API payload v2.0: routeKey, or rawPath as a fallback)."""
+    route = event.get("routeKey") or ""
+    path = (event.get("rawPath") or "").rstrip("/")
+    return route.endswith(" /status") or path.endswith("/status")
+
+
+def request_body_limit(event: dict) -> int:
+    return STATUS_MAX_BODY_BYTES if is_status_request(event) else PASTE_MAX_BODY_BYTES
+
+
+def batch_get_status(paste_ids: list) -> dict:
+    """
+    Fetch the STATUS_ATTRIBUTES of many pastes with BatchGetItem + ProjectionExpression.
+
+    Read-only: never touches S3, never flips `used`. Eventually consistent reads (half the RCUs);
+    a status taken within ~1s of a create or read may lag.
+
+    RETURNS:
+    - {paste_id: item} for the pastes that exist.
+    """
+    names = {f"#a{i}": name for i, name in enumerate(STATUS_ATTRIBUTES)}
+    projection = ", ".join(names)
+    found = {}
+    for i in range(0, len(paste_ids), BATCH_GET_CHUNK):
+        keys = [{"paste_id": {"S": paste_id}} for paste_id in paste_ids[i:i + BATCH_GET_CHUNK]]
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(BATCH_GET_BACKOFF_S * 2 ** (attempt - 1))
+            with instrumentation.phase("dynamodb_get"):
+                response = dynamodb.batch_get_item(RequestItems={
+                    table_name: {
+                        "Keys": keys,
+                        "ProjectionExpression": projection,
+                        "ExpressionAttributeNames": names,
+                    }
+                })
+            for item in response.get("Responses", {}).get(table_name, []):
+                found[item["paste_id"]["S"]] = item
+            keys = response.get("UnprocessedKeys", {}).get(table_name, {}).get("Keys", [])
+            if not keys:
+                break
+        if keys:
+            raise RuntimeError(f"{len(keys)} status lookups still unprocessed after retries")
+    return found
+
+
+def describe_status(paste_id: str, item: dict, now: int) -> dict:
+    """Client-facing status for one paste (item is None if it does not exist)."""
+    if item is None:
+        return {"paste_id": paste_id, "status": "not_found"}
+    expiry_ts = int(item.get("expiry", {}).get("N", "0"))
+    used = item.get("used", {}).get("BOOL", False)
+    # Same precedence as the read path: one-time-read first (the reaper pulls in the expiry of
+    # consumed pastes), then expiry.
+    if used:
+        state = "viewed"
+    elif expiry_ts < now:
+        state = "expired"
+    elif item.get("upload_pending", {}).get("BOOL", False):
+        # Registered for a direct upload that has not been finalized yet.
+        state = "pending"
+    else:
+        state = "available"
+    secret_types = item.get("secret_types", {}).get("S")
+    content_length = item.get("content_length", {}).get("N")
+    return {
+        "paste_id": paste_id,
+        "status": state,
+        "used": used,
+        "encrypted": item.get("encrypted", {}).get("BOOL", False),
+        "expiry": expiry_ts,
+        "expires_in": max(0, expiry_ts - now),
+        "has_secrets": item.get("has_secrets", {}).get("BOOL", False),
+        "secret_types": secret_types.split(", ") if secret_types else [],
+        # Pastes created before content_length was recorded report null.
+        "content_length": int(content_length) if content_length is not None else None,
+        "storage": "s3" if "s3_key" in item else "inline",
+    }
+
+
+def paste_status(event: dict) -> dict:
+    """
+    Metadata-only status: {"paste_id": "..."} or {"paste_ids": [...]}.
+
+    - Single ID: 200 with the status object, or 404 if the paste does not exist.
+    - Many IDs: 200 with {"results": [...]} in request order; missing pastes have
+      status "not_found". Duplicates are looked up once.
+    """
+    try:
+        body = json.loads(event.get("body") or "{}")
+        single = "paste_ids" not in body
+        paste_ids = [body.get("paste_id")] if single else body["paste_ids"]
+        if not isinstance(paste_ids, list) or not paste_ids or len(paste_ids) > STATUS_MAX_IDS:
+            raise ValueError(f"paste_ids must be a list of 1-{STATUS_MAX_IDS} IDs")
+        paste_ids = [paste_id.strip() if isinstance(paste_id, str) else "" for paste_id in paste_ids]
+        invalid = [paste_id for paste_id in paste_ids if not PASTE_ID_RE.match(paste_id)]
+        if invalid:
+            raise ValueError("Invalid paste_id format. Use 10-50 chars: letters, numbers, underscore, dash.")
+    except Exception as e:
+        return {
+            "statusCode": 400,
+            "headers": {"Access-Control-Allow-Origin": "*"},
+            "body": json.dumps({"message": "Invalid status request", "error": str(e)})
+        }
+
+    now = int(time.time())
+    found = batch_get_status(list(dict.fromkeys(paste_ids)))
+    results = [describe_status(paste_id, found.get(paste_id), now) for paste_id in paste_ids]
+
+    if single:
+        status_code = 404 if results[0]["status"] == "not_found" else 200
+        payload = results[0]
+    else:
+        status_code = 200
+        payload = {"results": results}
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Content-Type": "application/json"
+        },
+        "body": json.dumps(payload)
+    }
+
+
+def _error(status: int, message: str) -> dict:
+    return {
+        "statusCode": status,
+        "headers": {"Access-Control-Allow-Origin": "*"},
+        "body": json.dumps({"message": message})
+    }
+
+
+def consume_paste(paste_id: str):
+    """
+    Atomically mark the paste as used and return its pre-update attributes.
+
+    Returns (item, None) on success or (None, error_response) when the paste is missing,
+    expired, already viewed or still waiting for its direct upload.
+
+    NOTE:
+    - One conditional UpdateItem replaces GetItem + UpdateItem: half the DynamoDB latency,
+      and DynamoDB serializes writes per item, so only one reader can satisfy `used = false`.
+    - The expiry condition still matters even though TTL exists: TTL deletion is eventual.
+    - Rows registered for a direct-to-S3 upload are not readable until finalized
+      (upload_pending is removed by the create Lambda's finalize step).
+    - ReturnValuesOnConditionCheckFailure hands back the current item on failure (no extra
+      read, no extra WCU/RCU) so we can tell 404 from the two 410 cases.
+    - 410s are remembered in `tombstones` and repeated without calling DynamoDB. 404s are not:
+      the ID may be created next (see negative_cache.py).
+    """
+    gone = tombstones.get(paste_id)
+    if gone is not None:
+        instrumentation.count("negative_cache_hit")
+        return None, _error(*GONE_RESPONSES[gone])
+    instrumentation.count("negative_cache_miss")
+
+    now = int(time.time())
+    try:
+        with instrumentation.phase("dynamodb_update"):
+            response = dynamodb.update_item(
+                TableName=table_name,
+                Key={"paste_id": {"S": paste_id}},
+                UpdateExpression="SET used = :used",
+                ConditionExpression=("attribute_exists(paste_id) AND used = :unused AND expiry >= :now"
+                                     " AND attribute_not_exists(upload_pending)"),
+                ExpressionAttributeValues={
+                    ":used": {"BOOL": True},
+                    ":unused": {"BOOL": False},
+                    ":now": {"N": str(now)},
+                },
+                ReturnValues="ALL_OLD",
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        current = e.response.get("Item")
+        if not current:
+            return None, _error(*GONE_RESPONSES[negative_cache.NOT_FOUND])
+        # One-time-read first: the reaper shortens the expiry of consumed pastes, and those
+        # should keep answering "already viewed" rather than "expired".
+        if current.get("used", {}).get("BOOL", False):
+            gone = negative_cache.VIEWED
+        elif int(current.get("expiry", {}).get("N", "0")) < now:
+            gone = negative_cache.EXPIRED
+        elif current.get("upload_pending", {}).get("BOOL", False):
+            # Not terminal: the upload may still be finalized, so never cached.
+            return None, _error(409, "Paste upload not finished")
+        else:
+            # Condition failed without a visible reason (e.g. used flipped back meanwhile).
+            gone = negative_cache.VIEWED
+        tombstones.add(paste_id, gone)
+        return None, _error(*GONE_RESPONSES[gone])
+
+    return response["Attributes"], None
+
+
+def release_paste(paste_id: str):
+    """
+    Best-effort undo of consume_paste() when the content could not be delivered.
+
+    Only flips used back if it is still True; failures are logged, never raised, because the
+    caller is already returning an error. Also takes the paste out of the reaper's sweep index
+    (reap_shard/reap_at), in case the reaper already scheduled it.
+    """
+    try:
+        with instrumentation.phase("dynamodb_update"):
+            dynamodb.update_item(
+                TableName=table_name,
+                Key={"paste_id": {"S": paste_id}},
+                UpdateExpression="SET used = :unused REMOVE reap_shard, reap_at",
+                ConditionExpression="used = :used",
+                ExpressionAttributeValues={":used": {"BOOL": True}, ":unused": {"BOOL": False}},
+            )
+    except Exception:
+        import traceback
+        traceback.print_exc()
+
 
+def delete_consumed(paste_id: str):
+    """
+    Best-effort delete of a consumed inline paste (EAGER_DELETE_INLINE).
+
+    Conditional on used = true, so it never removes a paste that release_paste() handed back or
+    a new paste that reused the ID. Failures are logged, never raised: TTL removes the row anyway.
+    """
+    try:
+        with instrumentation.phase("dynamodb_delete"):
+            dynamodb.delete_item(
+                TableName=table_name,
+                Key={"paste_id": {"S": paste_id}},
+                ConditionExpression="used = :used AND attribute_not_exists(s3_key)",
+                ExpressionAttributeValues={":used": {"BOOL": True}},
+            )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            import traceback
+            traceback.print_exc()
+    except Exception:
+        import traceback
+        traceback.print_exc()
+
+
+def _put_s3_object(s3_key: str, data: bytes, content_type: str):
+    """Only used to store profiles (profiling.py, PROFILE_S3_PREFIX); reads never write to S3."""
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=s3_key,
+        Body=data,
+        ContentType=content_type,
+        ServerSideEncryption="AES256"
+    )
+
+
+@profiling.profiled(store=_put_s3_object)
+@instrumentation.instrumented
 def lambda_handler(event, context):
     """
     Retrieve Paste (Read Path) - one-time read semantics.
@@ -21,39 +445,66 @@ def lambda_handler(event, context):
     - Paste content must not be logged (plaintext or ciphertext).
     - If encrypted == True, this function MUST NOT attempt decryption.
       It returns ciphertext + metadata (salt/iv) only.
-    - Enforce one-time-read by marking "used" to True after successful retrieval.
-      (Caveat: not perfectly atomic in current implementation; see TODO.)
+    - Enforce one-time-read by atomically flipping "used" to True in the same DynamoDB
+      request that reads the item (conditional update, see consume_paste()).
+      Two concurrent readers can never both get the content.
 
     EXPIRY:
     - We check expiry in read-path even though DynamoDB TTL exists.
       TTL is eventual, so this prevents serving expired content during the TTL lag window.
+
+    BINARY:
+    - Accept: application/octet-stream returns the content as the raw body (see binary_response()).
+
+    DOWNLOAD:
+    - For S3-backed pastes the response may carry `download` (presigned GET, see presigned_download())
+      instead of `content`: on request ({"download": "presigned"}) or when the paste is too large
+      to proxy. Inline pastes always return `content`.
+
+    STATUS:
+    - POST /status returns metadata only (see paste_status()); it never consumes the paste.
     """
 
+    # Shed oversized bodies before parsing (or logging) them.
+    rejected = admission.admit(event, request_body_limit(event))
+    if rejected is not None:
+        return rejected
+
     # Logging full event is helpful during development but dangerous in production:
-    # request bodies can contain paste_id and potentially other metadata.
-    # Consider toggling with an env var like DEBUG_LOGS.
-    print("=== EVENT RECEIVED (debug) ===")
-    print(json.dumps(event, indent=2))
+    # request bodies can contain paste_id and potentially other metadata. Off unless DEBUG_LOGS.
+    instrumentation.debug_event(event)
+
+    # Metadata-only lookups share this Lambda (same table, same IAM) but never consume.
+    if is_status_request(event):
+        try:
+            return paste_status(event)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            return _error(500, "Internal server error")
 
     # Parse request and validate paste_id early.
     try:
-        body = json.loads(event.get("body", "{}"))
-        paste_id = body.get("paste_id")
+        with instrumentation.phase("parse"):
+            body = json.loads(event.get("body", "{}"))
+        with instrumentation.phase("validate"):
+            paste_id = body.get("paste_id")
 
-        if not paste_id:
-            raise Exception("paste_id is missing in request body")
+            if not paste_id:
+                raise Exception("paste_id is missing in request body")
 
-        paste_id = paste_id.strip()
+            paste_id = paste_id.strip()
+            wants_presigned = body.get("download") == "presigned"
 
-        # Strict validation prevents weird keys, log injection, and S3 path shenanigans.
-        if not re.match(r"^[a-zA-Z0-9_-]{10,50}$", paste_id):
-            return {
-                "statusCode": 400,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({
-                    "message": "Invalid paste_id format. Use 10-50 chars: letters, numbers, underscore, dash."
-                })
-            }
+            # Strict validation prevents weird keys, log injection, and S3 path shenanigans.
+            if not PASTE_ID_RE.match(paste_id):
+                return {
+                    "statusCode": 400,
+                    "headers": {"Access-Control-Allow-Origin": "*"},
+                    "body": json.dumps({
+                        "message": "Invalid paste_id format. Use 10-50 chars: letters, numbers, underscore, dash."
+                    })
+                }
 
     except Exception as e:
         return {
@@ -63,89 +514,90 @@ def lambda_handler(event, context):
         }
 
     try:
-        # Fetch metadata and (maybe) inline content.
-        response = dynamodb.get_item(
-            TableName=table_name,
-            Key={"paste_id": {"S": paste_id}}
-        )
-
-        item = response.get("Item")
-        if not item:
-            return {
-                "statusCode": 404,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({"message": "Paste not found"})
-            }
-
-        # Expiry check: prevents serving content during DynamoDB TTL delay.
-        expiry_ts = int(item.get("expiry", {}).get("N", "0"))
-        if expiry_ts < int(time.time()):
-            return {
-                "statusCode": 410,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({"message": "Paste expired"})
-            }
-
-        # One-time-read check.
-        if item.get("used", {}).get("BOOL", False):
-            return {
-                "statusCode": 410,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({"message": "Paste already viewed"})
-            }
+        # Read + consume in one round trip. On a failed condition we get the current item back
+        # and only use it to pick the right status code.
+        item, failure = consume_paste(paste_id)
+        if failure is not None:
+            return failure
 
         encrypted = item.get("encrypted", {}).get("BOOL", False)
+        instrumentation.set_dimensions(tier="s3" if "s3_key" in item else "inline", encrypted=encrypted)
+        # Set only for compressed plaintext; ciphertext is always stored as-is.
+        content_encoding = item.get("content_encoding", {}).get("S")
         content = ""
+        download = None
 
         # Content may live in S3 (large pastes) or in DynamoDB inline (small pastes).
         if "s3_key" in item:
             s3_key = item["s3_key"]["S"]
+            content_length = int(item["content_length"]["N"]) if "content_length" in item else None
+            chunks = None
+            if "chunk_count" in item:
+                chunks = {"size": int(item["chunk_size"]["N"]), "count": int(item["chunk_count"]["N"])}
 
-            try:
-                s3_obj = s3.get_object(Bucket=bucket_name, Key=s3_key)
-                content_bytes = s3_obj["Body"].read()
+            # Rows written before content_length existed are at most 1MB (the old create cap).
+            if wants_presigned or (content_length or 0) > MAX_PROXIED_CONTENT_BYTES:
+                try:
+                    with instrumentation.phase("presign"):
+                        download = presigned_download(s3_key, encrypted, content_encoding, content_length, chunks)
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
+                    release_paste(paste_id)
+                    return {
+                        "statusCode": 500,
+                        "headers": {"Access-Control-Allow-Origin": "*"},
+                        "body": json.dumps({"message": "Failed to create download URL", "error": str(e)})
+                    }
+            else:
+                try:
+                    with instrumentation.phase("s3_get"):
+                        content_bytes = read_object(s3_key)
 
-                if encrypted:
-                    # Encrypted content must remain opaque: return as base64 string.
-                    content = base64.b64encode(content_bytes).decode("ascii")
-                else:
-                    # Plaintext stored in S3 is expected to be UTF-8 text.
-                    content = content_bytes.decode("utf-8")
+                    with instrumentation.phase("decode"):
+                        if encrypted:
+                            # Encrypted content must remain opaque: return as base64 string.
+                            import base64
+                            content = base64.b64encode(content_bytes).decode("ascii")
+                        else:
+                            # Plaintext stored in S3 is expected to be UTF-8 text (possibly compressed).
+                            content = decode_stored_content(content_bytes, content_encoding).decode("utf-8")
 
-            except Exception as e:
-                traceback.print_exc()
-                return {
-                    "statusCode": 500,
-                    "headers": {"Access-Control-Allow-Origin": "*"},
-                    "body": json.dumps({"message": "Failed to retrieve content from S3", "error": str(e)})
-                }
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
+                    # Nothing was served, so give the reader another try instead of burning the paste.
+                    release_paste(paste_id)
+                    return {
+                        "statusCode": 500,
+                        "headers": {"Access-Control-Allow-Origin": "*"},
+                        "body": json.dumps({"message": "Failed to retrieve content from S3", "error": str(e)})
+                    }
 
         elif "content" in item:
-            # If encrypted and inline, item["content"] is base64 ciphertext string.
-            # If plaintext and inline, it's the plain string.
-            content = item["content"]["S"]
+            # If encrypted and inline, item["content"] is base64 ciphertext string (raw bytes, B,
+            # for binary creates).
+            # If plaintext and inline, it's the plain string, or zlib bytes (B) if compressed.
+            with instrumentation.phase("decode"):
+                if content_encoding:
+                    content = decode_stored_content(item["content"]["B"], content_encoding).decode("utf-8")
+                elif "B" in item["content"]:
+                    import base64
+                    content = base64.b64encode(item["content"]["B"]).decode("ascii")
+                else:
+                    content = item["content"]["S"]
         else:
             content = ""
 
-        # Mark paste as used.
-        #
-        # TODO (important for professionalism):
-        # This should be conditional to prevent race conditions:
-        # UpdateExpression + ConditionExpression (used = false AND expiry >= now)
-        # Otherwise two fast requests could both succeed before 'used' flips.
-        dynamodb.update_item(
-            TableName=table_name,
-            Key={"paste_id": {"S": paste_id}},
-            UpdateExpression="SET used = :val",
-            ExpressionAttributeValues={":val": {"BOOL": True}}
-        )
-
         response_body = {
             "paste_id": paste_id,
             "encrypted": encrypted,
-            "content": content,
             "message": "Paste retrieved successfully"
         }
+        if download is not None:
+            response_body["download"] = download
+        else:
+            response_body["content"] = content
 
         # Encrypted pastes require client-side decryption metadata.
         if encrypted:
@@ -166,19 +618,31 @@ def lambda_handler(event, context):
             response_body["salt"] = salt
             response_body["iv"] = iv
 
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-                "Content-Type": "application/json"
-            },
-            "body": json.dumps(response_body)
-        }
+        if EAGER_DELETE_INLINE and "s3_key" not in item:
+            # No tombstone: without its row, the ID can be created again right away.
+            delete_consumed(paste_id)
+        else:
+            # Served: the next read of this ID would be a 410, so skip the round trip for it.
+            tombstones.add(paste_id, negative_cache.VIEWED)
+
+        with instrumentation.phase("serialize"):
+            if download is None and wants_binary(event):
+                return binary_response(paste_id, encrypted, content, response_body.get("salt"), response_body.get("iv"))
+
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "*",
+                    "Content-Type": "application/json"
+                },
+                "body": json.dumps(response_body)
+            }
 
     except Exception as e:
         # Avoid returning stack traces in production.
         # It's useful for you now, but it leaks internal info in public deployments.
+        import traceback
         traceback.print_exc()
         return {
             "statusCode": 500,
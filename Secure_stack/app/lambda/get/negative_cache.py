@@ -0,0 +1,81 @@
+"""
+In-container negative cache: paste IDs known to be gone (viewed or expired).
+
+WHY THIS EXISTS:
+- Scrapers and retrying clients keep asking for IDs that are already consumed or expired. Each
+  of those reads costs a conditional UpdateItem in consume_paste() (failed
+  conditional writes still consume write capacity) just to return the same 404/410 again.
+- A warm container remembers those answers for a short while and repeats them without calling
+  DynamoDB.
+
+SAFETY:
+- Only terminal "gone" states are ever stored, so the cache can only answer "gone". Availability
+  is always decided by DynamoDB's conditional update. Pending uploads (409) are not cached.
+- "Not found" is never cached: create accepts client-chosen IDs, so a client may look an ID up
+  before creating it, and must then be able to read it.
+- Viewed and expired are terminal while the row exists: create refuses IDs that have a row
+  (conditional writes). Consumed rows outlive an entry (NEGATIVE_CACHE_TTL_SECONDS, default 60,
+  vs the reaper's grace period), and the handler adds no entry for rows it deletes right away
+  (EAGER_DELETE_INLINE). What is left: an expired row that TTL removes, and whose ID is created
+  again, within an entry's lifetime; or a racing reader's release_paste() handing a paste back.
+  The worst case is a briefly repeated 410, never content served twice.
+
+BOUNDS:
+- At most NEGATIVE_CACHE_MAX_ENTRIES IDs (default 10000, ~2MB; 0 disables the cache). The oldest
+  entry is evicted first. Expired entries are dropped when they are looked up or evicted.
+- Counters (hits, misses, evictions) live for the container; the handler also reports hits and
+  misses per invocation through instrumentation.count().
+"""
+import os
+import time
+from collections import OrderedDict
+
+NOT_FOUND = "not_found"   # answered, never cached (see SAFETY)
+EXPIRED = "expired"
+VIEWED = "viewed"
+
+MAX_ENTRIES = int(os.environ.get("NEGATIVE_CACHE_MAX_ENTRIES", 10000))
+TTL_SECONDS = float(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", 60))
+
+
+class TombstoneCache:
+    """Bounded paste_id -> gone state map with per-entry expiry (insertion-ordered eviction)."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_s: float = TTL_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, paste_id: str):
+        """The cached gone state (EXPIRED / VIEWED), or None to ask DynamoDB."""
+        entry = self._entries.get(paste_id)
+        if entry is not None:
+            state, expires_at = entry
+            if expires_at > self.clock():
+                self.hits += 1
+                return state
+            del self._entries[paste_id]
+        self.misses += 1
+        return None
+
+    def add(self, paste_id: str, state: str):
+        if self.max_entries <= 0:
+            return
+        if state not in (EXPIRED, VIEWED):
+            raise ValueError(f"Only terminal states can be cached, got {state!r}")
+        self._entries[paste_id] = (state, self.clock() + self.ttl_s)
+        self._entries.move_to_end(paste_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
@@ -0,0 +1,79 @@
+"""
+Build the Lambda deployment zips: each function's directory plus the shared modules.
+
+Usage (from Secure_stack/):
+    python app/lambda/package.py                      # all functions, zips in the current directory
+    python app/lambda/package.py --out dist create    # dist/lambda_create.zip only
+
+Modules used by several Lambdas (aws_clients, key_layout, instrumentation, ...) live once, in
+app/lambda/shared. Lambda imports them as top-level modules next to lambda_function.py, so
+every zip gets them at its root; zipping a function directory by hand would leave them out.
+
+- Everything under the function directory is included, e.g. wheels installed there with
+  `pip install -t` (see DEPLOYMENT.md), except bytecode caches.
+- A function module with the same name as a shared one is an error: one of the two would
+  silently shadow the other in the zip.
+- Entries are sorted and carry a fixed timestamp, so an unchanged tree produces a byte-identical
+  zip and Terraform's source_code_hash only redeploys functions that actually changed.
+"""
+import argparse
+import os
+import sys
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SHARED_DIR = os.path.join(HERE, "shared")
+FUNCTIONS = ("create", "get", "reaper")
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)   # earliest date a zip entry can hold
+
+
+def _files(directory: str) -> dict:
+    """{path inside the zip: path on disk} for every file under directory."""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for name in names:
+            if name.endswith(".pyc"):
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, directory).replace(os.sep, "/")] = path
+    return files
+
+
+def build(name: str, out_dir: str) -> str:
+    files = _files(os.path.join(HERE, name))
+    shared = _files(SHARED_DIR)
+    clashes = sorted(set(files) & set(shared))
+    if clashes:
+        raise SystemExit(f"{name}: {', '.join(clashes)} also in app/lambda/shared; remove the function's copy")
+    files.update(shared)
+
+    path = os.path.join(out_dir, f"lambda_{name}.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for arcname in sorted(files):
+            info = zipfile.ZipInfo(arcname, ZIP_TIMESTAMP)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(files[arcname], "rb") as f:
+                archive.writestr(info, f.read())
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("functions", nargs="*", metavar="function",
+                        help=f"functions to package: {', '.join(FUNCTIONS)} (default: all)")
+    parser.add_argument("--out", default=".", help="directory for the lambda_<name>.zip files")
+    args = parser.parse_args()
+    unknown = sorted(set(args.functions) - set(FUNCTIONS))
+    if unknown:
+        parser.error(f"unknown function(s): {', '.join(unknown)}")
+
+    os.makedirs(args.out, exist_ok=True)
+    for name in args.functions or FUNCTIONS:
+        print(build(name, args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
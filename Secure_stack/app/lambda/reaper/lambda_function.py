@@ -0,0 +1,295 @@
+"""
+Reaper: removes the S3 bodies of pastes that are gone, fed by the paste table's DynamoDB stream,
+and deletes consumed pastes once their grace period is over (scheduled sweep).
+
+WHY THIS EXISTS:
+- DynamoDB TTL (on `expiry`) eventually removes a paste's row, but its S3 body stayed until the
+  bucket's blanket 2-day lifecycle rule. Consumed one-time pastes kept their bodies (and rows)
+  until expiry too.
+
+EVENTS (the event source mapping filters to these two kinds; checked again here):
+- REMOVE (TTL deletion or an explicit delete): the old image's s3_key is deleted with batched
+  DeleteObjects calls (up to 1000 keys each), together with the same object's key under the
+  other key layout (key_layout.py), in case a layout migration left a copy behind.
+- MODIFY with used false -> true (a paste was consumed): its body cannot be deleted right away.
+  The get Lambda may still be streaming it to the reader, or may have handed out a presigned GET
+  that is used seconds later. Instead schedule_reap() sets reap_at = consumed_at +
+  REAP_GRACE_SECONDS (and reap_shard), which puts the row in the table's sparse REAP_INDEX for
+  the sweep, and pulls its expiry in to reap_at as a backstop.
+  If the get Lambda releases the paste after that (release_paste, delivery failed), the row
+  leaves the index but keeps the shortened expiry: the reader gets another try within the grace
+  period, not until the original expiry.
+
+SWEEP (EventBridge "Scheduled Event", every few minutes):
+- TTL alone sets no deadline: it removes expired rows eventually, typically within days. The
+  sweep queries REAP_INDEX for rows with reap_at <= now and deletes them, each conditional on
+  used = true and reap_at <= now, so a released or re-created paste is never removed. The
+  REMOVE record then deletes the body as above. A consumed body is gone by about reap_at + the
+  stream batching window + the sweep interval, and the table stays small for the hot path.
+- The index's hash key is one of REAP_SHARDS values derived from the paste_id, so consumptions
+  spread over several index partitions instead of one hot one.
+- Stops when the invocation is close to its timeout; the next sweep picks up the rest.
+
+IDEMPOTENCY / RETRIES:
+- Deleting a missing key succeeds, and the reap scheduling and sweep deletes are conditional,
+  so replayed records and overlapping sweeps are harmless. Keys that fail (per-key
+  DeleteObjects errors or whole-call errors) are retried with backoff; whatever still fails is
+  reported as a batch item failure, and Lambda retries from the earliest failed record
+  (ReportBatchItemFailures).
+
+SECURITY NOTE:
+- create refuses a client-chosen paste_id only while its row exists; once the row is removed
+  the ID can be created again, and S3 keys derive from it. Before deleting, keys whose paste_id
+  has a row again are skipped (consistent BatchGetItem), so a new paste's body is never removed
+  because an old row with the same ID expired. That row's own removal reaps the body later.
+"""
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+import key_layout
+
+dynamodb = aws_clients.dynamodb()
+s3 = aws_clients.s3()
+
+table_name = os.environ.get('TABLE_NAME', 'missing')
+bucket_name = os.environ.get('BUCKET_NAME', 'missing')
+
+# Consumed pastes stay readable for this long after consumption (presigned GETs last
+# PRESIGNED_GET_EXPIRES, 60s by default, in the get Lambda).
+REAP_GRACE_SECONDS = int(os.environ.get('REAP_GRACE_SECONDS', 300))
+REAP_INDEX = os.environ.get('REAP_INDEX', 'reap-index')
+REAP_SHARDS = 8              # never lower it: rows keep the shard they were given
+SWEEP_CONCURRENCY = 8        # DeleteItem calls in flight (<= aws_clients.MAX_POOL_CONNECTIONS)
+SWEEP_PAGE = 500             # rows per index query, i.e. between two time checks
+SWEEP_TIME_MARGIN_MS = 5000  # stop sweeping when the invocation has less time left than this
+
+DELETE_BATCH = 1000          # DeleteObjects limit
+DELETE_MAX_ATTEMPTS = 5
+DELETE_BACKOFF_S = 0.1
+LIVE_CHECK_CHUNK = 100       # BatchGetItem limit
+LIVE_CHECK_MAX_ATTEMPTS = 5
+
+
+def _used(image: dict) -> bool:
+    return (image or {}).get("used", {}).get("BOOL", False)
+
+
+def classify(record: dict):
+    """
+    RETURNS:
+    - ("delete", paste_id, s3_key) for a removed S3-backed row.
+    - ("schedule", paste_id, reap_at) for a paste that was just consumed.
+    - None for anything else (inline removals, other updates).
+    """
+    change = record.get("dynamodb", {})
+    if record.get("eventName") == "REMOVE":
+        old = change.get("OldImage") or {}
+        if "s3_key" in old:
+            return "delete", old["paste_id"]["S"], old["s3_key"]["S"]
+        return None
+    if record.get("eventName") == "MODIFY":
+        old, new = change.get("OldImage"), change.get("NewImage")
+        if new and _used(new) and not _used(old):
+            consumed_at = int(change.get("ApproximateCreationDateTime") or time.time())
+            return "schedule", new["paste_id"]["S"], consumed_at + REAP_GRACE_SECONDS
+    return None
+
+
+def live_paste_ids(paste_ids: list) -> set:
+    """paste_ids that currently have a row (consistent reads; unprocessed keys are retried)."""
+    live = set()
+    for i in range(0, len(paste_ids), LIVE_CHECK_CHUNK):
+        keys = [{"paste_id": {"S": paste_id}} for paste_id in paste_ids[i:i + LIVE_CHECK_CHUNK]]
+        for attempt in range(LIVE_CHECK_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(DELETE_BACKOFF_S * 2 ** (attempt - 1))
+            response = dynamodb.batch_get_item(RequestItems={
+                table_name: {"Keys": keys, "ProjectionExpression": "paste_id", "ConsistentRead": True}
+            })
+            live.update(item["paste_id"]["S"] for item in response.get("Responses", {}).get(table_name, []))
+            keys = response.get("UnprocessedKeys", {}).get(table_name, {}).get("Keys", [])
+            if not keys:
+                break
+        if keys:
+            raise RuntimeError(f"{len(keys)} liveness checks still unprocessed after retries")
+    return live
+
+
+def delete_objects(keys: list) -> set:
+    """
+    Delete keys with DeleteObjects, DELETE_BATCH per call, retrying failed keys with backoff.
+
+    RETURNS:
+    - The keys that could not be deleted (empty on full success).
+    """
+    failed = set()
+    for i in range(0, len(keys), DELETE_BATCH):
+        pending = keys[i:i + DELETE_BATCH]
+        for attempt in range(DELETE_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(DELETE_BACKOFF_S * 2 ** (attempt - 1))
+            try:
+                response = s3.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in pending], "Quiet": True},
+                )
+            except Exception as e:
+                # botocore already retried transient errors; try the whole chunk again.
+                print(f"DeleteObjects failed for {len(pending)} keys: {e}")
+                continue
+            pending = [error["Key"] for error in response.get("Errors", [])]
+            if not pending:
+                break
+        failed.update(pending)
+    return failed
+
+
+def reap_shard(paste_id: str) -> int:
+    return zlib.crc32(paste_id.encode("utf-8")) % REAP_SHARDS
+
+
+def schedule_reap(paste_id: str, reap_at: int) -> bool:
+    """
+    Index a consumed paste for the sweep at reap_at, and pull its expiry in to reap_at (never
+    extends it). False when the row is gone or was released (used = false) meanwhile.
+    """
+    values = {
+        ":reap_at": {"N": str(reap_at)},
+        ":shard": {"N": str(reap_shard(paste_id))},
+        ":used": {"BOOL": True},
+    }
+    updates = (
+        # Usual case: index it and shorten the expiry in one write.
+        {"UpdateExpression": "SET reap_shard = :shard, reap_at = :reap_at, expiry = :reap_at, #ttl = :reap_at",
+         "ConditionExpression": "used = :used AND expiry > :reap_at",
+         "ExpressionAttributeNames": {"#ttl": "ttl"}},
+        # Already expiring sooner (or a replayed record): index it, keep the expiry.
+        {"UpdateExpression": "SET reap_shard = :shard, reap_at = :reap_at",
+         "ConditionExpression": "used = :used"},
+    )
+    for update in updates:
+        try:
+            dynamodb.update_item(TableName=table_name, Key={"paste_id": {"S": paste_id}},
+                                 ExpressionAttributeValues=values, **update)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+    return False
+
+
+def due_paste_ids(now: int):
+    """Yield the paste_ids in REAP_INDEX with reap_at <= now, one page at a time (lists)."""
+    for shard in range(REAP_SHARDS):
+        request = {
+            "TableName": table_name,
+            "IndexName": REAP_INDEX,
+            "KeyConditionExpression": "reap_shard = :shard AND reap_at <= :now",
+            "ExpressionAttributeValues": {":shard": {"N": str(shard)}, ":now": {"N": str(now)}},
+            "ProjectionExpression": "paste_id",
+            "Limit": SWEEP_PAGE,
+        }
+        while True:
+            response = dynamodb.query(**request)
+            yield [item["paste_id"]["S"] for item in response.get("Items", [])]
+            if "LastEvaluatedKey" not in response:
+                break
+            request["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def reap_consumed(paste_id: str, now: int) -> str:
+    """Delete a consumed paste whose grace period is over: "deleted", "skipped" or "failed"."""
+    try:
+        dynamodb.delete_item(
+            TableName=table_name,
+            Key={"paste_id": {"S": paste_id}},
+            ConditionExpression="used = :used AND reap_at <= :now",
+            ExpressionAttributeValues={":used": {"BOOL": True}, ":now": {"N": str(now)}},
+        )
+        return "deleted"
+    except ClientError as e:
+        # Released, re-created or already deleted since the (eventually consistent) query.
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return "skipped"
+        print(f"Reap delete failed: {e}")
+    except Exception as e:
+        print(f"Reap delete failed: {e}")
+    return "failed"
+
+
+def sweep(context) -> dict:
+    """Scheduled run: delete every consumed paste past its reap_at (see SWEEP above)."""
+    now = int(time.time())
+    counts = {"deleted": 0, "skipped": 0, "failed": 0}
+    complete = True
+    with ThreadPoolExecutor(max_workers=SWEEP_CONCURRENCY) as pool:
+        for page in due_paste_ids(now):
+            if context is not None and context.get_remaining_time_in_millis() < SWEEP_TIME_MARGIN_MS:
+                complete = False
+                break
+            for outcome in pool.map(lambda paste_id: reap_consumed(paste_id, now), page):
+                counts[outcome] += 1
+    summary = dict(counts, complete=complete)
+    print(json.dumps({"reaper_sweep": summary}))
+    return summary
+
+
+def lambda_handler(event, context):
+    """
+    DynamoDB stream batch -> {"batchItemFailures": [...]} (empty when every record was handled).
+    EventBridge scheduled event -> sweep() summary.
+    """
+    if event.get("detail-type") == "Scheduled Event":
+        return sweep(context)
+
+    records = event.get("Records", [])
+    failed_records = []
+    deletes = {}   # s3_key -> (paste_id, [sequence numbers])
+    scheduled = 0
+
+    for record in records:
+        action = classify(record)
+        if action is None:
+            continue
+        sequence = record["dynamodb"]["SequenceNumber"]
+        if action[0] == "delete":
+            _, paste_id, s3_key = action
+            for key in key_layout.candidate_keys(s3_key):
+                deletes.setdefault(key, (paste_id, []))[1].append(sequence)
+        else:
+            _, paste_id, reap_at = action
+            try:
+                scheduled += schedule_reap(paste_id, reap_at)
+            except Exception as e:
+                print(f"Reap scheduling failed: {e}")
+                failed_records.append(sequence)
+
+    skipped = deleted = 0
+    if deletes:
+        try:
+            live = live_paste_ids(sorted({paste_id for paste_id, _ in deletes.values()}))
+            keys = [key for key, (paste_id, _) in deletes.items() if paste_id not in live]
+            skipped = len(deletes) - len(keys)
+            failed_keys = delete_objects(keys)
+            deleted = len(keys) - len(failed_keys)
+        except Exception as e:
+            print(f"Reaping failed: {e}")
+            failed_keys = set(deletes)
+        for key in failed_keys:
+            failed_records.extend(deletes[key][1])
+
+    failed_records = list(dict.fromkeys(failed_records))   # a record fails once per failed key
+    print(json.dumps({"reaper": {
+        "records": len(records),
+        "deleted_keys": deleted,
+        "skipped_live": skipped,
+        "scheduled": scheduled,
+        "failed_records": len(failed_records),
+    }}))
+    return {"batchItemFailures": [{"itemIdentifier": sequence} for sequence in failed_records]}
@@ -0,0 +1,87 @@
+"""
+Admission control: shed oversized requests before any real work is done on them.
+
+WHY THIS EXISTS:
+- Handlers used to json.loads() the whole body before looking at its size, so an abusive
+  multi-MB body cost a full parse (time + memory) before the 413.
+- admit() runs first and only looks at len() of the raw body string, which is O(1). Base64
+  bodies (isBase64Encoded, binary requests) are measured by their decoded size without decoding.
+- Limits are per route and owned by each handler (see request_body_limit() there). Checks that
+  need the parsed request (e.g. the exact content size of a JSON create) go through
+  reject_oversized(), so every 413 looks the same and is counted the same way.
+
+COUNTERS:
+- shed_counts = {route: {reason: n}} for this container, and one JSON log line per shed request
+  ({"admission": "shed", ...}) for CloudWatch Logs metric filters / Insights.
+
+NOTE:
+- Used by the create and get Lambdas. This is the only copy: app/lambda/package.py adds it to
+  each function's zip.
+"""
+import json
+
+shed_counts = {}
+
+
+def route_of(event: dict) -> str:
+    """HTTP API payload v2.0 routeKey, or "METHOD /path" as a fallback."""
+    route = event.get("routeKey")
+    if route and route != "$default":
+        return route
+    method = event.get("requestContext", {}).get("http", {}).get("method", "")
+    return f"{method} {event.get('rawPath') or ''}".strip()
+
+
+def body_size(event: dict) -> int:
+    """
+    Size of the request body in bytes, without decoding or encoding it.
+
+    Base64 bodies report their decoded size (exact for well-formed base64). Text bodies report
+    len() of the string, which undercounts non-ASCII UTF-8; that is fine for a cheap first gate.
+    """
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        return len(body) // 4 * 3 - body[-2:].count("=")
+    return len(body)
+
+
+def _shed(route: str, reason: str, size: int, limit: int):
+    per_route = shed_counts.setdefault(route, {})
+    per_route[reason] = per_route.get(reason, 0) + 1
+    print(json.dumps({
+        "admission": "shed",
+        "route": route,
+        "reason": reason,
+        "size": size,
+        "limit": limit,
+        "shed_count": per_route[reason],
+    }))
+
+
+def reject_oversized(size: int, limit: int, route: str, reason: str, message: str):
+    """Count and return a 413 if size > limit, else None."""
+    if size <= limit:
+        return None
+    _shed(route, reason, size, limit)
+    return {
+        "statusCode": 413,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Content-Type": "application/json",
+        },
+        "body": json.dumps({"message": message}),
+    }
+
+
+def admit(event: dict, limit: int):
+    """
+    Pre-parse gate. Returns None to let the request through, or a 413 response.
+
+    Call it before json.loads() or logging the event.
+    """
+    size = body_size(event)
+    route = route_of(event)
+    return reject_oversized(
+        size, limit, route, "body_too_large",
+        f"Request body too large: {size} bytes (limit for {route} is {limit} bytes).",
+    )
@@ -0,0 +1,108 @@
+"""
+AWS client factory: tuned botocore clients shared by the handlers, plus an optional init-phase
+connection warmup.
+
+WHY THIS EXISTS:
+- Handlers used boto3.client(...) with botocore defaults: 60s connect and read timeouts, legacy
+  retries and 10 pooled connections. A stalled connection held a request until API Gateway's
+  own 30s timeout instead of failing fast and retrying.
+- Clients are built straight from a botocore session. boto3 adds nothing these handlers use
+  (resources, s3transfer) and importing it costs ~70ms of every cold start.
+- warmup() makes one cheap call per client while the container initializes, so DNS, TCP and TLS
+  setup is paid in the init phase (which runs before the first request and at full CPU) instead
+  of by the first request.
+
+SETTINGS (env vars):
+- AWS_CONNECT_TIMEOUT (seconds, default 1), DYNAMODB_READ_TIMEOUT (default 2), S3_READ_TIMEOUT
+  (default 10: CompleteMultipartUpload and multi-MB GETs are legitimately slow).
+- AWS_MAX_ATTEMPTS (default 3, adaptive retry mode: client-side rate limiting on throttles).
+- AWS_MAX_POOL_CONNECTIONS (default 16, >= the create Lambda's IO_CONCURRENCY).
+- WARMUP_CONNECTIONS ("true" to enable warmup; off by default so local runs stay offline).
+
+NOTE:
+- Used by the create, get and reaper Lambdas. This is the only copy: app/lambda/package.py
+  adds it to each function's zip.
+- timings records how long each step took (ms) for cold-start reporting (bench/bench_coldstart.py).
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import botocore.session
+from botocore.config import Config
+
+CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", 1))
+DYNAMODB_READ_TIMEOUT = float(os.environ.get("DYNAMODB_READ_TIMEOUT", 2))
+S3_READ_TIMEOUT = float(os.environ.get("S3_READ_TIMEOUT", 10))
+MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", 3))
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", 16))
+
+# Key read (and ignored) by warmup(). S3 objects live under pastes/, so it never exists there.
+WARMUP_KEY = "__warmup__"
+
+timings = {}
+
+# One session per container: it caches the endpoint and service model data shared by clients.
+_session = botocore.session.get_session()
+
+
+def _config(read_timeout: float, **extra) -> Config:
+    return Config(
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=read_timeout,
+        retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        **extra,
+    )
+
+
+def _create(service: str, config: Config):
+    started = time.perf_counter()
+    client = _session.create_client(service, config=config)
+    timings[service] = (time.perf_counter() - started) * 1000
+    return client
+
+
+def dynamodb():
+    return _create("dynamodb", _config(DYNAMODB_READ_TIMEOUT))
+
+
+def s3():
+    # SigV4 explicitly: presigned URLs must carry X-Amz-Expires / X-Amz-Credential in every region.
+    return _create("s3", _config(S3_READ_TIMEOUT, signature_version="s3v4"))
+
+
+def warmup_enabled() -> bool:
+    return os.environ.get("WARMUP_CONNECTIONS", "").lower() in ("1", "true", "yes")
+
+
+def warmup(dynamodb_client, s3_client, table_name: str, bucket_name: str):
+    """
+    Open one pooled connection per client with a harmless read, if WARMUP_CONNECTIONS is set.
+
+    SECURITY NOTE:
+    - Only reads, with permissions the handlers already have. GetItem is projected to the key, so it
+      neither reveals nor consumes a paste that happens to use this id. Results and errors
+      (404/403) are discarded.
+
+    PERFORMANCE NOTE:
+    - Both calls run concurrently and are waited on for at most 2x the connect timeout, so an
+      unreachable endpoint delays init by at most that much and never fails it.
+    """
+    if not warmup_enabled():
+        return
+    started = time.perf_counter()
+    calls = (
+        lambda: dynamodb_client.get_item(
+            TableName=table_name,
+            Key={"paste_id": {"S": WARMUP_KEY}},
+            ProjectionExpression="paste_id",
+        ),
+        lambda: s3_client.head_object(Bucket=bucket_name, Key=WARMUP_KEY),
+    )
+    pool = ThreadPoolExecutor(max_workers=len(calls))
+    futures = [pool.submit(call) for call in calls]
+    wait(futures, timeout=2 * CONNECT_TIMEOUT)
+    pool.shutdown(wait=False)
+    timings["warmup"] = (time.perf_counter() - started) * 1000
@@ -0,0 +1,176 @@
+"""
+Per-invocation instrumentation: phase timings emitted as one CloudWatch Embedded Metric Format
+(EMF) record per invocation, plus debug logging that is off by default.
+
+WHY THIS EXISTS:
+- Handlers used to print ad-hoc lines (and the get Lambda pretty-printed every event) on the hot
+  path: time spent on every request, request data in the logs, and nothing about where the
+  latency went.
+- Handlers wrap their phases in `with instrumentation.phase("s3_put"):` and are decorated with
+  @instrumented, which prints one EMF JSON line when the invocation ends. CloudWatch Logs turns
+  the <phase>_ms fields into metrics with Route / Tier / Encrypted dimensions: no API calls, no
+  extra IAM permissions, nothing on the request's critical path but a json.dumps.
+
+PHASES:
+- parse, validate, secret_scan, compress, s3_put, s3_get, s3_head, presign, dynamodb_put,
+  dynamodb_get, dynamodb_update, dynamodb_delete, decode, serialize, and total for the whole
+  invocation.
+- A phase entered several times (batch creates, retries) reports the sum of its durations.
+- S3 and DynamoDB writes of one paste run concurrently, so phases can add up to more than total.
+
+COUNTS:
+- count(name) adds a Count metric to the same record (e.g. negative_cache_hit in the get Lambda).
+
+DIMENSIONS:
+- Route (routeKey), Tier ("inline" / "s3", "mixed" for batches that use both, "none" when
+  nothing was stored or read) and Encrypted ("true" / "false" / "none").
+
+SETTINGS (env vars):
+- METRICS_ENABLED (default "true"), METRICS_NAMESPACE (default "SecureStack").
+- DEBUG_LOGS ("true" to enable debug() lines and event dumps; never enable it in production).
+
+SECURITY NOTE:
+- EMF records only carry the route, the two dimensions, timings, the status code and the cold
+  start flag: never paste ids, content, headers or salt/iv.
+
+NOTE:
+- Used by the create and get Lambdas. This is the only copy: app/lambda/package.py adds it to
+  each function's zip.
+- Lambda runs one invocation per container at a time, so the current invocation is module state.
+  Phases may be recorded from worker threads (the create Lambda's IO pool) while it is active.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import admission
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).lower() in ("1", "true", "yes")
+
+
+METRICS_ENABLED = _env_flag("METRICS_ENABLED", "true")
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "SecureStack")
+DEBUG_LOGS = _env_flag("DEBUG_LOGS", "false")
+
+DIMENSIONS = ("Route", "Tier", "Encrypted")
+
+_lock = threading.Lock()
+_current = None
+_cold_start = True
+
+
+class Invocation:
+    def __init__(self, route: str):
+        self.route = route
+        self.tier = "none"
+        self.encrypted = "none"
+        self.phases = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    def add(self, name: str, ms: float):
+        with _lock:
+            self.phases[name] = self.phases.get(name, 0.0) + ms
+
+
+@contextmanager
+def phase(name: str):
+    """Time the enclosed block as `name` in the current invocation (no-op outside one)."""
+    invocation = _current
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if invocation is not None:
+            invocation.add(name, (time.perf_counter() - started) * 1000)
+
+
+def count(name: str, n: int = 1):
+    """Add n to the Count metric `name` of the current invocation (no-op outside one)."""
+    invocation = _current
+    if invocation is None:
+        return
+    with _lock:
+        invocation.counts[name] = invocation.counts.get(name, 0) + n
+
+
+def _merge(current: str, value: str) -> str:
+    return value if current in ("none", value) else "mixed"
+
+
+def set_dimensions(tier: str = None, encrypted: bool = None):
+    """Record the storage tier and/or encrypted flag of the paste being handled."""
+    invocation = _current
+    if invocation is None:
+        return
+    with _lock:
+        if tier is not None:
+            invocation.tier = _merge(invocation.tier, tier)
+        if encrypted is not None:
+            invocation.encrypted = _merge(invocation.encrypted, "true" if encrypted else "false")
+
+
+def emf_record(invocation: Invocation, status, total_ms: float, cold_start: bool) -> dict:
+    """One EMF log record: metric values and dimensions are top-level fields."""
+    metrics = {f"{name}_ms": round(ms, 3) for name, ms in invocation.phases.items()}
+    metrics["total_ms"] = round(total_ms, 3)
+    definitions = [{"Name": name, "Unit": "Milliseconds"} for name in metrics]
+    definitions += [{"Name": name, "Unit": "Count"} for name in invocation.counts]
+    metrics.update(invocation.counts)
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(DIMENSIONS)],
+                "Metrics": definitions,
+            }],
+        },
+        "Route": invocation.route,
+        "Tier": invocation.tier,
+        "Encrypted": invocation.encrypted,
+        "StatusCode": status,
+        "ColdStart": cold_start,
+        **metrics,
+    }
+
+
+def instrumented(handler):
+    """Decorate a Lambda handler: time the invocation and print its EMF record at the end."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current, _cold_start
+        invocation = Invocation(admission.route_of(event))
+        _current = invocation
+        status = "error"
+        try:
+            response = handler(event, context)
+            if isinstance(response, dict):
+                status = response.get("statusCode", status)
+            return response
+        finally:
+            _current = None
+            total_ms = (time.perf_counter() - invocation.started) * 1000
+            cold_start, _cold_start = _cold_start, False
+            if METRICS_ENABLED:
+                print(json.dumps(emf_record(invocation, status, total_ms, cold_start)))
+
+    return wrapper
+
+
+def debug(*args):
+    """print() that only runs when DEBUG_LOGS is set. Never pass content or secrets."""
+    if DEBUG_LOGS:
+        print(*args)
+
+
+def debug_event(event: dict):
+    """Dump the raw event when DEBUG_LOGS is set (it can contain paste ids and content)."""
+    if DEBUG_LOGS:
+        print(json.dumps(event))
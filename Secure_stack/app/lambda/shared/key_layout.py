@@ -0,0 +1,77 @@
+"""
+S3 key layouts for S3-backed pastes.
+
+WHY THIS EXISTS:
+- Every body used to be written as pastes/<paste_id><ext>, one flat prefix. S3 scales request
+  rates per prefix partition (~3,500 writes/s each) and splits partitions gradually, so bursty CI
+  uploads hit throttling (503 SlowDown) long before the bucket's real capacity.
+- The hashed layout puts two hex chars of sha256(paste_id) right after pastes/: writes spread
+  evenly over 256 prefixes from the first request on, whatever the shape of the paste ids.
+
+LAYOUTS (the version is stored on the item as `key_layout`; rows without it are layout 1):
+- 1 (flat):   pastes/<paste_id><ext>
+- 2 (hashed): pastes/<sha256(paste_id)[:2]>/<paste_id><ext>
+- <ext> is .txt or .enc, plus .zlib for compressed plaintext. paste_ids never contain "." or "/",
+  so a key can be moved between layouts without looking at the item (relocate()).
+
+SETTINGS (env vars):
+- S3_KEY_LAYOUT: layout of new writes (default 2). Existing objects keep their key until
+  tools/migrate_key_layout.py moves them; readers accept both layouts meanwhile.
+
+NOTE:
+- Used by the create, get and reaper Lambdas. This is the only copy: app/lambda/package.py
+  adds it to each function's zip.
+"""
+import hashlib
+import os
+
+PREFIX = "pastes/"
+LAYOUT_FLAT = 1
+LAYOUT_HASHED = 2
+LAYOUTS = (LAYOUT_FLAT, LAYOUT_HASHED)
+HASH_CHARS = 2
+
+CURRENT = int(os.environ.get("S3_KEY_LAYOUT", LAYOUT_HASHED))
+
+if CURRENT not in LAYOUTS:
+    raise ValueError(f"Unknown S3_KEY_LAYOUT {CURRENT}; expected one of {LAYOUTS}")
+
+
+def object_key(paste_id: str, ext: str, layout: int = CURRENT) -> str:
+    if layout == LAYOUT_FLAT:
+        return f"{PREFIX}{paste_id}{ext}"
+    if layout == LAYOUT_HASHED:
+        shard = hashlib.sha256(paste_id.encode()).hexdigest()[:HASH_CHARS]
+        return f"{PREFIX}{shard}/{paste_id}{ext}"
+    raise ValueError(f"Unknown key layout {layout}")
+
+
+def _split(s3_key: str) -> tuple:
+    """(paste_id, ext) of a key in any layout."""
+    name = s3_key.rsplit("/", 1)[-1]
+    paste_id, dot, ext = name.partition(".")
+    return paste_id, dot + ext
+
+
+def layout_of(s3_key: str) -> int:
+    return LAYOUT_FLAT if "/" not in s3_key[len(PREFIX):] else LAYOUT_HASHED
+
+
+def relocate(s3_key: str, layout: int) -> str:
+    """The same object's key under another layout."""
+    return object_key(*_split(s3_key), layout=layout)
+
+
+def layout_of_item(item: dict) -> int:
+    """Layout recorded on a DynamoDB item (low-level format); rows written before it existed are flat."""
+    return int(item.get("key_layout", {}).get("N", LAYOUT_FLAT))
+
+
+def candidate_keys(s3_key: str) -> list:
+    """
+    Every key the object may live under: the stored key first, then the other layouts.
+
+    A key layout migration copies the object and then updates the row, so a reader (or the
+    reaper) holding a row from before the update can find the object under either key.
+    """
+    return [s3_key] + [relocate(s3_key, layout) for layout in LAYOUTS if layout != layout_of(s3_key)]
@@ -0,0 +1,209 @@
+"""
+On-demand profiling of selected Lambda invocations, written out already aggregated.
+
+WHY THIS EXISTS:
+- EMF phase metrics (instrumentation.py) say which phase got slow, not which code inside it.
+  This hook profiles the handler in place, in production, for a small share of invocations.
+- Output is collapsed stacks ("frame;frame;frame count" per stack), so many profiles can be
+  merged offline into one flame graph: bench/merge_profiles.py.
+
+SELECTION (env vars; profiling is off unless one trigger is set):
+- PROFILE_SAMPLE_RATE: fraction of invocations to profile (e.g. 0.01).
+- PROFILE_MIN_BODY_BYTES: always profile requests with a body at least this large (decoded size,
+  see admission.body_size), to catch size-dependent slowness.
+
+MODES (PROFILE_MODE):
+- "sample" (default): a thread snapshots the stacks every PROFILE_INTERVAL_MS (default 5) of
+  wall-clock time, so time spent waiting on S3/DynamoDB shows up too. Weights are sample counts.
+  Covers the handler thread and busy worker threads (idle pool workers are skipped).
+- "cprofile": deterministic cProfile of the handler thread only. pstats keeps caller/callee
+  pairs, not full stacks, so stacks are two frames deep (caller;callee). Weights are self time in
+  microseconds. Expect noticeable overhead on CPU-heavy requests.
+
+OUTPUT:
+- One JSON record per profiled invocation ({"profile": {...}}) printed to the logs, or, with
+  PROFILE_S3_PREFIX set, stored as <prefix><route>/<date>/<request id>.json in the paste bucket
+  (expired by the bucket's lifecycle rule like everything else in it).
+- At most PROFILE_MAX_STACKS stacks (heaviest first) per record; the rest is summed into one
+  "[truncated]" stack, which keeps log records well under CloudWatch's 256KB event limit.
+
+SECURITY NOTE:
+- Records hold code locations (function, file, line), the route, sizes and timings only; never
+  arguments, locals, paste ids or content.
+
+NOTE:
+- Used by the create and get Lambdas. This is the only copy: app/lambda/package.py adds it to
+  each function's zip.
+"""
+import cProfile
+import functools
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+
+import admission
+
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+MIN_BODY_BYTES = int(os.environ.get("PROFILE_MIN_BODY_BYTES", 0))
+MODE = os.environ.get("PROFILE_MODE", "sample")
+INTERVAL_S = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+S3_PREFIX = os.environ.get("PROFILE_S3_PREFIX", "")
+MAX_STACKS = int(os.environ.get("PROFILE_MAX_STACKS", 500))
+
+if MODE not in ("sample", "cprofile"):
+    raise ValueError(f"Unknown PROFILE_MODE {MODE!r}; expected 'sample' or 'cprofile'")
+
+# Innermost Python frame of an idle concurrent.futures worker (SimpleQueue.get is C code).
+_IDLE_LEAF = ("thread.py", "_worker")
+
+
+def should_profile(event: dict) -> bool:
+    if MIN_BODY_BYTES and admission.body_size(event) >= MIN_BODY_BYTES:
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> list:
+    """Root-first list of frames."""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return codes[::-1]
+
+
+def _is_idle(codes: list) -> bool:
+    leaf = codes[-1]
+    return (os.path.basename(leaf.co_filename), leaf.co_name) == _IDLE_LEAF
+
+
+class StackSampler:
+    """Wall-clock sampler of every thread but its own; collapsed stacks -> sample count."""
+
+    def __init__(self, target_thread_id: int, interval_s: float = INTERVAL_S):
+        self.target = target_thread_id
+        self.interval_s = interval_s
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                codes = _stack(frame)
+                if thread_id != self.target and _is_idle(codes):
+                    continue
+                if thread_id not in names:
+                    names[thread_id] = "handler" if thread_id == self.target else next(
+                        (t.name for t in threading.enumerate() if t.ident == thread_id), "thread")
+                key = ";".join([names[thread_id]] + [_label(code) for code in codes])
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _cprofile_stacks(profile: cProfile.Profile) -> dict:
+    """caller;callee -> self time (us) of callee when called from caller."""
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    stacks = {}
+    for func, (_, _, tottime, _, callers) in pstats.Stats(profile).stats.items():
+        if not callers:
+            stacks[label(func)] = stacks.get(label(func), 0) + round(tottime * 1e6)
+            continue
+        for caller, caller_stats in callers.items():
+            key = f"{label(caller)};{label(func)}"
+            stacks[key] = stacks.get(key, 0) + round(caller_stats[2] * 1e6)
+    return {key: weight for key, weight in stacks.items() if weight > 0}
+
+
+def _truncate(stacks: dict, limit: int) -> dict:
+    if len(stacks) <= limit:
+        return stacks
+    ordered = sorted(stacks.items(), key=lambda kv: kv[1], reverse=True)
+    kept = dict(ordered[:limit])
+    kept["[truncated]"] = sum(weight for _, weight in ordered[limit:])
+    return kept
+
+
+def _emit(record: dict, store):
+    if S3_PREFIX and store is not None:
+        key = (f"{S3_PREFIX}{record['route'].replace(' ', '').replace('/', '_')}/"
+               f"{time.strftime('%Y/%m/%d', time.gmtime())}/{record['request_id']}.json")
+        try:
+            store(key, json.dumps({"profile": record}).encode(), "application/json")
+            return
+        except Exception as e:
+            print(f"Profile upload failed ({e}); logging it instead")
+    print(json.dumps({"profile": record}))
+
+
+def profiled(store=None):
+    """
+    Decorate a Lambda handler with the on-demand profiler.
+
+    store(key, data, content_type) writes one object to the paste bucket; it is only used when
+    PROFILE_S3_PREFIX is set. It is called after the handler returned, inside the invocation, so
+    S3 mode adds one PUT to the latency of profiled invocations only.
+    """
+    def decorator(handler):
+        if not (SAMPLE_RATE > 0 or MIN_BODY_BYTES):
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not should_profile(event):
+                return handler(event, context)
+            started = time.perf_counter()
+            if MODE == "cprofile":
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(handler, event, context)
+                finally:
+                    stacks, unit = _cprofile_stacks(profile), "us"
+                    _finish(event, context, stacks, unit, started, store)
+            sampler = StackSampler(threading.get_ident())
+            try:
+                with sampler:
+                    return handler(event, context)
+            finally:
+                _finish(event, context, sampler.stacks, "samples", started, store)
+
+        return wrapper
+
+    return decorator
+
+
+def _finish(event, context, stacks, unit, started, store):
+    _emit({
+        "mode": MODE,
+        "unit": unit,
+        "interval_ms": INTERVAL_S * 1000 if MODE == "sample" else None,
+        "route": admission.route_of(event),
+        "request_id": getattr(context, "aws_request_id", None) or f"local-{uuid.uuid4().hex}",
+        "body_bytes": admission.body_size(event),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        "stacks": _truncate(stacks, MAX_STACKS),
+    }, store)
@@ -0,0 +1,191 @@
+"""
+Cold-start benchmark for the create and get Lambda handlers.
+
+Usage (from Secure_stack/, needs botocore and numpy installed locally; no AWS credentials or network):
+    python bench/bench_coldstart.py                    # run, print report, check budgets
+    python bench/bench_coldstart.py --runs 30
+    python bench/bench_coldstart.py --write-budgets    # re-baseline bench/coldstart_budgets.json
+
+What it does:
+- Every run starts a fresh interpreter, like a new Lambda container, and in it measures:
+  - init_ms: importing lambda_function, i.e. what Lambda runs (and bills) as the init phase:
+    imports, client creation, rule compilation. WARMUP_CONNECTIONS is unset, so no network.
+  - clients_ms: the part of init spent creating botocore clients (aws_clients.timings).
+  - first_invoke_ms: the first request, against the in-memory fakes with no injected latency
+    (a 4KB plaintext create; a read of an inline paste), i.e. lazy work left to the first request.
+- Reports p50/p99 per handler and exits non-zero if a p99 exceeds bench/coldstart_budgets.json
+  (handlers over budget are re-measured once, so a single slow run does not fail the gate).
+
+Interpreter startup and the harness's own imports (json, time, ...; botocore loads them anyway)
+are not included. Budgets are wall-clock and machine dependent; they carry generous headroom.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUDGETS_PATH = os.path.join(HERE, "coldstart_budgets.json")
+HANDLERS = ("create", "get")
+METRICS = ("init_ms", "clients_ms", "first_invoke_ms")
+
+# Budget headroom applied by --write-budgets (see bench_handlers.py).
+INIT_HEADROOM = 1.5
+INIT_SLACK_MS = 100.0
+INVOKE_HEADROOM = 2.0
+INVOKE_SLACK_MS = 50.0
+
+
+def child(name: str):
+    """Runs inside the fresh interpreter: measure one cold start and print it as JSON."""
+    sys.path.insert(0, HERE)
+    from bench_handlers import api_event, create_body, load_handler, quiet
+    from fakes import FakeDynamoDB, FakeS3
+
+    started = time.perf_counter()
+    module = quiet(load_handler, name)
+    init_ms = (time.perf_counter() - started) * 1000
+    clients_ms = sum(module.aws_clients.timings.get(service, 0.0) for service in ("dynamodb", "s3"))
+
+    module.dynamodb, module.s3 = FakeDynamoDB(), FakeS3()
+    if name == "create":
+        event = api_event("POST /create", create_body(random.Random(1), 4096, encrypted=False))
+        expect = 201
+    else:
+        paste_id = "coldstart-paste"
+        module.dynamodb.put_item(TableName=module.table_name, Item={
+            "paste_id": {"S": paste_id},
+            "expiry": {"N": str(int(time.time()) + 3600)},
+            "used": {"BOOL": False},
+            "encrypted": {"BOOL": False},
+            "content_length": {"N": "5"},
+            "content": {"S": "hello"},
+        })
+        event = api_event("POST /paste", {"paste_id": paste_id})
+        expect = 200
+    started = time.perf_counter()
+    response = quiet(module.lambda_handler, event, None)
+    first_invoke_ms = (time.perf_counter() - started) * 1000
+    if response["statusCode"] != expect:
+        raise RuntimeError(f"expected {expect}, got {response['statusCode']}: {response['body'][:300]}")
+
+    print(json.dumps({"init_ms": init_ms, "clients_ms": clients_ms, "first_invoke_ms": first_invoke_ms}))
+
+
+def cold_start(name: str) -> dict:
+    env = dict(os.environ)
+    env.pop("WARMUP_CONNECTIONS", None)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} cold start failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run(runs: int, handlers=HANDLERS) -> dict:
+    results = {}
+    for name in handlers:
+        samples = [cold_start(name) for _ in range(runs)]
+        results[name] = {
+            metric: {"p50_ms": percentile([s[metric] for s in samples], 50),
+                     "p99_ms": percentile([s[metric] for s in samples], 99)}
+            for metric in METRICS
+        }
+    return results
+
+
+def print_report(results: dict):
+    print(f"{'handler':<10}{'metric':<20}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, metrics in results.items():
+        for i, (metric, stats) in enumerate(metrics.items()):
+            print(f"{name if i == 0 else '':<10}{metric:<20}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def check_budgets(results: dict, budgets: dict) -> list:
+    failures = []
+    for name, limits in budgets.get("handlers", {}).items():
+        if name not in results:
+            failures.append(f"{name}: handler missing from results")
+            continue
+        for metric, limit in limits.items():
+            p99 = results[name][metric.replace("_p99", "")]["p99_ms"]
+            if p99 > limit:
+                failures.append(f"{name}: {metric.replace('_p99_ms', '')} p99 {p99:.1f}ms > budget {limit:.1f}ms")
+    return failures
+
+
+def write_budgets(results: dict):
+    budgets = {
+        "_comment": "Generated by bench/bench_coldstart.py --write-budgets. "
+                    "Limits are measured values times headroom; edit deliberately.",
+        "handlers": {
+            name: {
+                "init_p99_ms": round(max(m["init_ms"]["p99_ms"] * INIT_HEADROOM,
+                                         m["init_ms"]["p99_ms"] + INIT_SLACK_MS), 1),
+                "first_invoke_p99_ms": round(max(m["first_invoke_ms"]["p99_ms"] * INVOKE_HEADROOM,
+                                                 m["first_invoke_ms"]["p99_ms"] + INVOKE_SLACK_MS), 1),
+            }
+            for name, m in results.items()
+        },
+    }
+    with open(BUDGETS_PATH, "w", encoding="utf-8") as f:
+        json.dump(budgets, f, indent=2)
+        f.write("\n")
+    print(f"Wrote {BUDGETS_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Cold starts per handler")
+    parser.add_argument("--write-budgets", action="store_true", help="Re-baseline coldstart_budgets.json from this run")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    parser.add_argument("--child", choices=HANDLERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    if args.write_budgets:
+        write_budgets(results)
+        return 0
+
+    budgets = {}
+    if os.path.exists(BUDGETS_PATH):
+        with open(BUDGETS_PATH, encoding="utf-8") as f:
+            budgets = json.load(f)
+    failures = check_budgets(results, budgets)
+    if failures:
+        suspects = sorted({failure.split(":")[0] for failure in failures})
+        print(f"\nRe-measuring {len(suspects)} handler(s) over budget: {', '.join(suspects)}")
+        results.update(run(args.runs, suspects))
+        failures = check_budgets(results, budgets)
+    if failures:
+        print("\nBUDGET REGRESSIONS:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\nOK: within budgets" if budgets else "\nNo coldstart_budgets.json; run with --write-budgets to create one")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
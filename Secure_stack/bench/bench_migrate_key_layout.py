@@ -0,0 +1,206 @@
+"""
+Offline check and throughput benchmark for the S3 key layout migration (tools/migrate_key_layout.py).
+
+Usage (from Secure_stack/, needs botocore installed locally; no AWS credentials or network):
+    python bench/bench_migrate_key_layout.py
+    python bench/bench_migrate_key_layout.py --rows 20000 --workers 64 --s3-latency-ms 30
+
+What it does:
+- Seeds the in-memory fakes (bench/fakes.py) with flat-layout pastes, plus rows the migration
+  must leave alone: a pending direct upload, an expired paste, an inline paste and a row whose
+  object is already gone.
+- Runs a dry run and checks that it changes nothing.
+- Migrates to the hashed layout with injected per-call latency and reports rows/s. One paste is
+  removed (row and object, like the reaper does) just before its batch of row updates, so the
+  cancelled-transaction path runs and its copy must be deleted again.
+- Checks that every moved row points at an object holding the original bytes, that only the
+  objects of skipped rows are left under flat keys, that a rerun moves nothing and that
+  migrating back to layout 1 restores the original keys.
+
+Exit code is non-zero on any failed check.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "tools"))
+sys.path.insert(0, os.path.join(HERE, "..", "app", "lambda", "shared"))
+
+import key_layout  # noqa: E402
+import migrate_key_layout  # noqa: E402
+from fakes import FakeDynamoDB, FakeS3, Latency  # noqa: E402
+
+TABLE_NAME = "bench-paste-metadata"
+BUCKET_NAME = "bench-pastes"
+
+# Seeded rows with a role in the checks, by index.
+PENDING, EXPIRED, MISSING, REMOVED = 1, 2, 3, 10
+
+
+class ReapingDynamoDB(FakeDynamoDB):
+    """Removes one paste (row and object) right before the transaction that would update its row."""
+
+    def __init__(self, s3: FakeS3, victim: str, **kwargs):
+        super().__init__(**kwargs)
+        self.s3 = s3
+        self.victim = victim
+        self.reaped = False
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        for entry in TransactItems:
+            update = entry["Update"]
+            if not self.reaped and update["Key"]["paste_id"]["S"] == self.victim:
+                self.reaped = True
+                self.delete_item(TableName=update["TableName"], Key=update["Key"])
+                self.s3.delete_object(Bucket=BUCKET_NAME, Key=update["ExpressionAttributeValues"][":old"]["S"])
+        return super().transact_write_items(TransactItems=TransactItems, **kwargs)
+
+
+def paste_id(i: int) -> str:
+    return f"bench{i:07d}"
+
+
+def seed(rows: int, now: int) -> tuple:
+    """RETURNS: (dynamodb, s3, {paste_id: (flat key, content)}), without injected latency."""
+    s3 = FakeS3()
+    dynamodb = ReapingDynamoDB(s3, paste_id(REMOVED))
+    originals = {}
+    for i in range(rows):
+        s3_key = key_layout.object_key(paste_id(i), ".enc" if i % 2 else ".txt", key_layout.LAYOUT_FLAT)
+        content = b"paste %d" % i
+        item = {
+            "paste_id": {"S": paste_id(i)},
+            "s3_key": {"S": s3_key},
+            "expiry": {"N": str(now - 5 if i == EXPIRED else now + 3600)},
+            "used": {"BOOL": i % 3 == 0},
+        }
+        if i == PENDING:
+            item["upload_pending"] = {"BOOL": True}
+        dynamodb.put_item(TableName=TABLE_NAME, Item=item)
+        if i != MISSING:
+            s3.put_object(Bucket=BUCKET_NAME, Key=s3_key, Body=content, ServerSideEncryption="AES256")
+        originals[paste_id(i)] = (s3_key, content)
+    inline = {"paste_id": {"S": "bench-inline"}, "content": {"S": "x"}, "expiry": {"N": str(now + 3600)}}
+    dynamodb.put_item(TableName=TABLE_NAME, Item=inline)
+    return dynamodb, s3, originals
+
+
+def get_row(dynamodb: FakeDynamoDB, pid: str) -> dict:
+    return dynamodb.tables[TABLE_NAME].get(dynamodb._key({"paste_id": {"S": pid}}))
+
+
+def snapshot(dynamodb: FakeDynamoDB, s3: FakeS3) -> tuple:
+    rows = {k: dict(v) for k, v in dynamodb.tables[TABLE_NAME].items()}
+    return rows, dict(s3.objects)
+
+
+def migrate(dynamodb, s3, target: int, args, dry_run: bool = False) -> tuple:
+    """RETURNS: (stats, seconds)."""
+    migration = migrate_key_layout.Migration(dynamodb, s3, TABLE_NAME, BUCKET_NAME, target,
+                                             args.workers, dry_run)
+    started = time.perf_counter()
+    stats = migration.run(args.segments, 0, keep_source=False)
+    return stats, time.perf_counter() - started
+
+
+def expect(failures: list, what: str, actual, wanted):
+    if actual != wanted:
+        failures.append(f"{what}: got {actual!r}, expected {wanted!r}")
+
+
+def check(args) -> tuple:
+    """RETURNS: (report, failures)."""
+    now = int(time.time())
+    dynamodb, s3, originals = seed(args.rows, now)
+    dynamodb.latency, s3.latency = Latency(args.ddb_latency_ms), Latency(args.s3_latency_ms)
+    failures = []
+    skipped = {paste_id(PENDING), paste_id(EXPIRED)}
+    moving = args.rows - len(skipped)
+
+    before = snapshot(dynamodb, s3)
+    stats, _ = migrate(dynamodb, s3, key_layout.LAYOUT_HASHED, args, dry_run=True)
+    expect(failures, "dry run: rows selected", stats["selected"], moving)
+    expect(failures, "dry run: rows and objects unchanged", snapshot(dynamodb, s3) == before, True)
+
+    stats, seconds = migrate(dynamodb, s3, key_layout.LAYOUT_HASHED, args)
+    updated = moving - 2  # MISSING has nothing to copy, REMOVED loses its row mid-migration
+    for name, wanted in (("selected", moving), ("copied", moving - 1), ("missing", 1), ("conflicts", 1),
+                         ("updated", updated), ("sources_deleted", updated), ("failed", 0)):
+        expect(failures, f"migration: {name}", stats[name], wanted)
+
+    moved = set(originals) - skipped - {paste_id(MISSING), paste_id(REMOVED)}
+    for pid in sorted(moved):
+        old_key, content = originals[pid]
+        item = get_row(dynamodb, pid)
+        if item["s3_key"]["S"] != key_layout.relocate(old_key, key_layout.LAYOUT_HASHED):
+            failures.append(f"{pid}: row points at {item['s3_key']['S']}")
+        elif key_layout.layout_of_item(item) != key_layout.LAYOUT_HASHED:
+            failures.append(f"{pid}: key_layout attribute is {item.get('key_layout')}")
+        elif s3.objects.get((BUCKET_NAME, item["s3_key"]["S"])) != content:
+            failures.append(f"{pid}: object under the new key does not hold the original bytes")
+    expect(failures, "removed paste: row", get_row(dynamodb, paste_id(REMOVED)), None)
+    expect(failures, "unmoved rows keep their key",
+           {pid: get_row(dynamodb, pid)["s3_key"]["S"] for pid in skipped | {paste_id(MISSING)}},
+           {pid: originals[pid][0] for pid in skipped | {paste_id(MISSING)}})
+    layouts = {}
+    for _, key in s3.objects:
+        layouts.setdefault(key_layout.layout_of(key), set()).add(key)
+    left = layouts.get(key_layout.LAYOUT_FLAT, set()) - {originals[pid][0] for pid in skipped}
+    expect(failures, "objects left under flat keys besides the skipped rows'", len(left), 0)
+    expect(failures, "objects under hashed keys (no orphaned copies)", len(layouts.get(key_layout.LAYOUT_HASHED, ())),
+           len(moved))
+
+    rerun, _ = migrate(dynamodb, s3, key_layout.LAYOUT_HASHED, args)
+    expect(failures, "rerun: rows moved", (rerun["copied"], rerun["updated"]), (0, 0))
+
+    back, _ = migrate(dynamodb, s3, key_layout.LAYOUT_FLAT, args)
+    expect(failures, "rollback: rows moved back", back["updated"], len(moved))
+    restored = sum(1 for pid in moved
+                   if get_row(dynamodb, pid)["s3_key"]["S"] == originals[pid][0]
+                   and s3.objects.get((BUCKET_NAME, originals[pid][0])) == originals[pid][1])
+    expect(failures, "rollback: rows on their original key and bytes", restored, len(moved))
+
+    report = {
+        "rows": args.rows,
+        "migration_s": seconds,
+        "rows_per_s": stats["updated"] / seconds if seconds else 0.0,
+        "stats": stats,
+    }
+    return report, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="S3-backed pastes to seed")
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent CopyObject calls")
+    parser.add_argument("--ddb-latency-ms", type=float, default=5.0)
+    parser.add_argument("--s3-latency-ms", type=float, default=20.0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    if args.rows <= REMOVED:
+        parser.error(f"--rows must be greater than {REMOVED}")
+
+    report, failures = check(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['rows']} rows, {args.segments} segments, {args.workers} workers, "
+              f"DynamoDB {args.ddb_latency_ms:g}ms / S3 {args.s3_latency_ms:g}ms per call")
+        print(f"migrated {report['stats']['updated']} rows in {report['migration_s']:.2f}s "
+              f"({report['rows_per_s']:.0f} rows/s)")
+    if failures:
+        print("\nMIGRATION CHECK FAILURES:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\nOK: migration checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,574 @@
+"""
+In-memory stand-ins for the boto3 DynamoDB and S3 clients used by the Lambda handlers.
+
+They implement only the calls the handlers (and tools/migrate_key_layout.py) make, with the
+same request/response shapes (low-level client API, typed attribute values), plus configurable injected latency so the
+benchmark can model network round trips without touching AWS.
+
+Every call is timed and recorded in `calls` as (operation, started, seconds) so the harness can
+break handler latency down per phase, including calls that overlap in time.
+"""
+import random
+import threading
+import time
+import zlib
+
+from botocore.exceptions import ClientError
+
+
+class Latency:
+    """Fixed latency (ms) plus optional uniform jitter (ms), applied with time.sleep()."""
+
+    def __init__(self, ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.ms = ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.ms
+        if self.jitter_ms:
+            with self._lock:
+                delay += self._rng.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+
+class _Recorder:
+    def __init__(self, latency: Latency):
+        self.latency = latency or Latency()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, op: str, started: float):
+        with self._lock:
+            self.calls.append((op, started, time.perf_counter() - started))
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = []
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+class FakeDynamoDB(_Recorder):
+    """Single-table-per-name fake of the low-level DynamoDB client."""
+
+    def __init__(self, latency: Latency = None, unprocessed_ratio: float = 0.0, seed: int = 0):
+        super().__init__(latency)
+        self.tables = {}
+        self._data_lock = threading.Lock()
+        # Fraction of BatchWriteItem requests handed back as UnprocessedItems, to exercise retries.
+        self.unprocessed_ratio = unprocessed_ratio
+        self._rng = random.Random(seed)
+
+    def _table(self, name):
+        return self.tables.setdefault(name, {})
+
+    @staticmethod
+    def _key(key: dict):
+        return tuple(sorted((k, tuple(v.items())) for k, v in key.items()))
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None,
+                 ExpressionAttributeNames=None, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                table = self._table(TableName)
+                key = self._key({"paste_id": Item["paste_id"]})
+                if ConditionExpression and not self._condition_holds(
+                        table.get(key), ConditionExpression, ExpressionAttributeValues or {},
+                        ExpressionAttributeNames or {}):
+                    raise _client_error("ConditionalCheckFailedException",
+                                        "The conditional request failed", "PutItem")
+                table[key] = dict(Item)
+        finally:
+            self._record("dynamodb.put_item", started)
+        return {}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        unprocessed = {}
+        try:
+            if sum(len(requests) for requests in RequestItems.values()) > 25:
+                raise _client_error("ValidationException", "Too many items requested for the BatchWriteItem call", "BatchWriteItem")
+            with self._data_lock:
+                for name, requests in RequestItems.items():
+                    keys = [self._key({"paste_id": r["PutRequest"]["Item"]["paste_id"]}) for r in requests]
+                    if len(set(keys)) != len(keys):
+                        raise _client_error("ValidationException", "Provided list of item keys contains duplicates", "BatchWriteItem")
+                    for key, request in zip(keys, requests):
+                        if self.unprocessed_ratio and self._rng.random() < self.unprocessed_ratio:
+                            unprocessed.setdefault(name, []).append(request)
+                            continue
+                        self._table(name)[key] = dict(request["PutRequest"]["Item"])
+        finally:
+            self._record("dynamodb.batch_write_item", started)
+        return {"UnprocessedItems": unprocessed}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        responses, unprocessed = {}, {}
+        try:
+            with self._data_lock:
+                for name, request in RequestItems.items():
+                    if len(request["Keys"]) > 100:
+                        raise _client_error("ValidationException", "Too many items requested for the BatchGetItem call", "BatchGetItem")
+                    aliases = request.get("ExpressionAttributeNames", {})
+                    projection = request.get("ProjectionExpression")
+                    wanted = ({aliases.get(n.strip(), n.strip()) for n in projection.split(",")}
+                              if projection else None)
+                    for key in request["Keys"]:
+                        if self.unprocessed_ratio and self._rng.random() < self.unprocessed_ratio:
+                            unprocessed.setdefault(name, {"Keys": []})["Keys"].append(key)
+                            continue
+                        item = self._table(name).get(self._key(key))
+                        if item is not None:
+                            if wanted is not None:
+                                item = {k: v for k, v in item.items() if k in wanted}
+                            responses.setdefault(name, []).append(dict(item))
+        finally:
+            self._record("dynamodb.batch_get_item", started)
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def get_item(self, TableName, Key, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        with self._data_lock:
+            item = self._table(TableName).get(self._key(Key))
+        self._record("dynamodb.get_item", started)
+        return {"Item": dict(item)} if item is not None else {}
+
+    @staticmethod
+    def _number_or_value(value: dict):
+        return float(value["N"]) if "N" in value else value
+
+    def _condition_holds(self, item, expression: str, values: dict, names: dict) -> bool:
+        """
+        Evaluate the subset of condition expressions the handlers use: clauses of
+        "attribute_exists(a)", "attribute_not_exists(a)", "a = :x", "a >= :x", "a > :x" or
+        "a <= :x" joined by AND.
+        """
+        item = item or {}
+        for clause in expression.split(" AND "):
+            clause = clause.strip()
+            for function, wanted in (("attribute_exists(", True), ("attribute_not_exists(", False)):
+                if clause.startswith(function):
+                    name = clause[len(function):-1].strip()
+                    if (names.get(name, name) in item) != wanted:
+                        return False
+                    break
+            else:
+                op = next(op for op in (">=", "<=", ">", "=") if op in clause)
+                name, placeholder = (part.strip() for part in clause.split(op))
+                name = names.get(name, name)
+                if name not in item:
+                    return False
+                have, want = self._number_or_value(item[name]), self._number_or_value(values[placeholder])
+                if ((op == "=" and have != want) or (op == ">=" and not have >= want)
+                        or (op == ">" and not have > want) or (op == "<=" and not have <= want)):
+                    return False
+        return True
+
+    @staticmethod
+    def _parse_update(expression: str, names: dict) -> tuple:
+        """Parse 'SET a = :x, b = :y REMOVE c' into ([(a, :x), (b, :y)], [c]), resolving #aliases."""
+        sets, removes = [], []
+        section = None
+        for token in expression.replace(",", " , ").split():
+            if token in ("SET", "REMOVE"):
+                section = token
+                continue
+            if section == "SET":
+                sets.append(token)
+            elif token != ",":
+                removes.append(names.get(token, token))
+        assignments = []
+        for part in " ".join(sets).split(","):
+            if part.strip():
+                name, placeholder = (p.strip() for p in part.split("="))
+                assignments.append((names.get(name, name), placeholder))
+        return assignments, removes
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ConditionExpression=None, ReturnValues="NONE",
+                    ReturnValuesOnConditionCheckFailure="NONE", **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        assignments, removes = self._parse_update(UpdateExpression, names)
+        try:
+            with self._data_lock:
+                table = self._table(TableName)
+                existing = table.get(self._key(Key))
+                if ConditionExpression and not self._condition_holds(existing, ConditionExpression, values, names):
+                    error = _client_error("ConditionalCheckFailedException",
+                                          "The conditional request failed", "UpdateItem")
+                    if ReturnValuesOnConditionCheckFailure == "ALL_OLD" and existing is not None:
+                        error.response["Item"] = dict(existing)
+                    raise error
+                old = dict(existing) if existing is not None else None
+                item = table.setdefault(self._key(Key), dict(Key))
+                for name, placeholder in assignments:
+                    item[name] = values[placeholder]
+                for name in removes:
+                    item.pop(name, None)
+        finally:
+            self._record("dynamodb.update_item", started)
+        if ReturnValues == "ALL_OLD" and old is not None:
+            return {"Attributes": old}
+        return {}
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, Limit=100, ExclusiveStartKey=None,
+             ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        """Paged scan in key order; items of a segment are those whose key hashes to it."""
+        started = time.perf_counter()
+        self.latency.wait()
+        aliases = ExpressionAttributeNames or {}
+        wanted = ({aliases.get(n.strip(), n.strip()) for n in ProjectionExpression.split(",")}
+                  if ProjectionExpression else None)
+        with self._data_lock:
+            keys = sorted(k for k in self._table(TableName)
+                          if zlib.crc32(repr(k).encode()) % TotalSegments == Segment)
+            if ExclusiveStartKey is not None:
+                keys = [k for k in keys if k > self._key(ExclusiveStartKey)]
+            page = [dict(self._table(TableName)[k]) for k in keys[:Limit]]
+        self._record("dynamodb.scan", started)
+        if wanted is not None:
+            page = [{k: v for k, v in item.items() if k in wanted} for item in page]
+        response = {"Items": page, "Count": len(page)}
+        if len(keys) > Limit:
+            response["LastEvaluatedKey"] = {"paste_id": self._table(TableName)[keys[Limit - 1]]["paste_id"]}
+        return response
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              Limit=100, ExclusiveStartKey=None, ProjectionExpression=None, **kwargs):
+        """
+        Sparse-index query for "h = :x AND r <= :y": items holding both attributes match on the
+        condition, in (r, paste_id) order. The index itself is implied by the condition's names.
+        """
+        started = time.perf_counter()
+        self.latency.wait()
+        hash_name = KeyConditionExpression.split(" AND ")[0].split("=")[0].strip()
+        range_name = KeyConditionExpression.split(" AND ")[1].split("<=")[0].strip()
+        with self._data_lock:
+            items = [dict(item) for item in self._table(TableName).values()
+                     if hash_name in item and range_name in item
+                     and self._condition_holds(item, KeyConditionExpression, ExpressionAttributeValues, {})]
+        self._record("dynamodb.query", started)
+
+        def order(item):
+            return float(item[range_name]["N"]), item["paste_id"]["S"]
+
+        items.sort(key=order)
+        if ExclusiveStartKey is not None:
+            items = [item for item in items if order(item) > order(ExclusiveStartKey)]
+        page = items[:Limit]
+        response = {"Items": page, "Count": len(page)}
+        if len(items) > Limit:
+            last = page[-1]
+            response["LastEvaluatedKey"] = {name: last[name] for name in ("paste_id", hash_name, range_name)}
+        if ProjectionExpression:
+            wanted = {name.strip() for name in ProjectionExpression.split(",")}
+            response["Items"] = [{k: v for k, v in item.items() if k in wanted} for item in page]
+        return response
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        """All-or-nothing conditional updates (the only transaction kind the tools use)."""
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            if len(TransactItems) > 100:
+                raise _client_error("ValidationException", "Member must have length less than or equal to 100", "TransactWriteItems")
+            with self._data_lock:
+                reasons, failed = [], False
+                for entry in TransactItems:
+                    update = entry["Update"]
+                    existing = self._table(update["TableName"]).get(self._key(update["Key"]))
+                    holds = self._condition_holds(existing, update.get("ConditionExpression", ""),
+                                                  update.get("ExpressionAttributeValues", {}),
+                                                  update.get("ExpressionAttributeNames", {})) \
+                        if update.get("ConditionExpression") else True
+                    reasons.append({"Code": "None" if holds else "ConditionalCheckFailed"})
+                    failed = failed or not holds
+                if failed:
+                    error = _client_error("TransactionCanceledException", "Transaction cancelled", "TransactWriteItems")
+                    error.response["CancellationReasons"] = reasons
+                    raise error
+                for entry in TransactItems:
+                    update = entry["Update"]
+                    names = update.get("ExpressionAttributeNames", {})
+                    assignments, removes = self._parse_update(update["UpdateExpression"], names)
+                    item = self._table(update["TableName"]).setdefault(self._key(update["Key"]), dict(update["Key"]))
+                    for name, placeholder in assignments:
+                        item[name] = update["ExpressionAttributeValues"][placeholder]
+                    for name in removes:
+                        item.pop(name, None)
+        finally:
+            self._record("dynamodb.transact_write_items", started)
+        return {}
+
+    def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                table = self._table(TableName)
+                existing = table.get(self._key(Key))
+                if ConditionExpression and not self._condition_holds(
+                        existing, ConditionExpression, ExpressionAttributeValues or {},
+                        ExpressionAttributeNames or {}):
+                    raise _client_error("ConditionalCheckFailedException",
+                                        "The conditional request failed", "DeleteItem")
+                table.pop(self._key(Key), None)
+        finally:
+            self._record("dynamodb.delete_item", started)
+        return {}
+
+
+class _Body:
+    """Enough of botocore's StreamingBody for `.read()`."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self, amt=None):
+        if amt is None:
+            data, self._data = self._data, b""
+            return data
+        data, self._data = self._data[:amt], self._data[amt:]
+        return data
+
+
+class FakeS3(_Recorder):
+    def __init__(self, latency: Latency = None):
+        super().__init__(latency)
+        self.objects = {}
+        self.sse = {}
+        self.presigned = {}
+        self.multipart = {}
+        self.fail_deletes = set()
+        self._data_lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ServerSideEncryption=None, IfNoneMatch=None, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                if IfNoneMatch == "*" and (Bucket, Key) in self.objects:
+                    raise _client_error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold", "PutObject")
+                self.objects[(Bucket, Key)] = bytes(Body)
+                self.sse[(Bucket, Key)] = ServerSideEncryption
+        finally:
+            self._record("s3.put_object", started)
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        with self._data_lock:
+            data = self.objects.get((Bucket, Key))
+        self._record("s3.get_object", started)
+        if data is None:
+            raise _client_error("NoSuchKey", "The specified key does not exist.", "GetObject")
+        return {"Body": _Body(data), "ContentLength": len(data)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        with self._data_lock:
+            self.objects.pop((Bucket, Key), None)
+        self._record("s3.delete_object", started)
+        return {}
+
+    def copy_object(self, Bucket, Key, CopySource, ServerSideEncryption=None, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                data = self.objects.get((CopySource["Bucket"], CopySource["Key"]))
+                if data is None:
+                    raise _client_error("NoSuchKey", "The specified key does not exist.", "CopyObject")
+                self.objects[(Bucket, Key)] = data
+                self.sse[(Bucket, Key)] = ServerSideEncryption
+        finally:
+            self._record("s3.copy_object", started)
+        return {"CopyObjectResult": {}}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        """Deleting a missing key succeeds, like the real API. Keys in fail_deletes report an error."""
+        started = time.perf_counter()
+        self.latency.wait()
+        objects = Delete["Objects"]
+        if len(objects) > 1000:
+            raise _client_error("MalformedXML", "More than 1000 keys", "DeleteObjects")
+        deleted, errors = [], []
+        with self._data_lock:
+            for entry in objects:
+                if entry["Key"] in self.fail_deletes:
+                    errors.append({"Key": entry["Key"], "Code": "InternalError", "Message": "injected"})
+                    continue
+                self.objects.pop((Bucket, entry["Key"]), None)
+                deleted.append({"Key": entry["Key"]})
+        self._record("s3.delete_objects", started)
+        response = {"Errors": errors} if errors else {}
+        if not Delete.get("Quiet"):
+            response["Deleted"] = deleted
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        with self._data_lock:
+            data = self.objects.get((Bucket, Key))
+            sse = self.sse.get((Bucket, Key))
+        self._record("s3.head_object", started)
+        if data is None:
+            raise _client_error("404", "Not Found", "HeadObject")
+        result = {"ContentLength": len(data)}
+        if sse:
+            result["ServerSideEncryption"] = sse
+        return result
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        """Local operation, like the real one (no request is made). Remembers the policy for upload_via_post."""
+        url = f"https://{Bucket}.s3.fake.invalid/"
+        fields = dict(Fields or {}, key=Key, policy=f"fake-policy-{len(self.presigned)}")
+        self.presigned[fields["policy"]] = (Bucket, Key, list(Conditions or []), time.time() + ExpiresIn)
+        return {"url": url, "fields": fields}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600):
+        """Local operation, like the real one. Remembers the request for download_via_url."""
+        params = dict(Params or {})
+        url = f"https://{params['Bucket']}.s3.fake.invalid/{params['Key']}?sig={len(self.presigned)}"
+        self.presigned[url] = (ClientMethod, params, time.time() + ExpiresIn)
+        return url
+
+    def download_via_url(self, url: str, byte_range: tuple = None) -> tuple:
+        """
+        What S3 answers to a GET on a presigned URL: (status, headers, body).
+        byte_range = (first, last) inclusive, like a "Range: bytes=first-last" header (206).
+        """
+        signed = self.presigned.get(url)
+        if signed is None or signed[0] != "get_object" or time.time() > signed[2]:
+            return 403, {}, b""
+        params = signed[1]
+        with self._data_lock:
+            data = self.objects.get((params["Bucket"], params["Key"]))
+        if data is None:
+            return 404, {}, b""
+        status = 200
+        if byte_range is not None:
+            status, data = 206, data[byte_range[0]:byte_range[1] + 1]
+        headers = {"Content-Length": str(len(data))}
+        for param, header in (("ResponseContentType", "Content-Type"),
+                              ("ResponseContentEncoding", "Content-Encoding")):
+            if param in params:
+                headers[header] = params[param]
+        return status, headers, data
+
+    def upload_via_url(self, url: str, data: bytes) -> int:
+        """What S3 answers to a PUT on a presigned UploadPart URL (200, 403 or 404)."""
+        signed = self.presigned.get(url)
+        if signed is None or signed[0] != "upload_part" or time.time() > signed[2]:
+            return 403
+        params = signed[1]
+        with self._data_lock:
+            upload = self.multipart.get(params["UploadId"])
+            if upload is None:
+                return 404
+            upload["parts"][params["PartNumber"]] = bytes(data)
+        return 200
+
+    def create_multipart_upload(self, Bucket, Key, ServerSideEncryption=None, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        with self._data_lock:
+            upload_id = f"upload-{len(self.multipart)}"
+            self.multipart[upload_id] = {"bucket": Bucket, "key": Key, "sse": ServerSideEncryption, "parts": {}}
+        self._record("s3.create_multipart_upload", started)
+        return {"UploadId": upload_id}
+
+    def _upload(self, Bucket, Key, UploadId, operation):
+        upload = self.multipart.get(UploadId)
+        if upload is None or (upload["bucket"], upload["key"]) != (Bucket, Key):
+            raise _client_error("NoSuchUpload", "The specified upload does not exist.", operation)
+        return upload
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker=0, MaxParts=1000, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                parts = self._upload(Bucket, Key, UploadId, "ListParts")["parts"]
+                numbers = sorted(n for n in parts if n > PartNumberMarker)
+                page = numbers[:MaxParts]
+                result = {
+                    "Parts": [{"PartNumber": n, "Size": len(parts[n]), "ETag": f'"etag-{n}"'} for n in page],
+                    "IsTruncated": len(numbers) > MaxParts,
+                }
+                if result["IsTruncated"]:
+                    result["NextPartNumberMarker"] = page[-1]
+        finally:
+            self._record("s3.list_parts", started)
+        return result
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                upload = self._upload(Bucket, Key, UploadId, "CompleteMultipartUpload")
+                numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+                if numbers != sorted(numbers) or any(n not in upload["parts"] for n in numbers):
+                    raise _client_error("InvalidPart", "One or more of the specified parts could not be found.",
+                                        "CompleteMultipartUpload")
+                if any(len(upload["parts"][n]) < 5 * 1024 * 1024 for n in numbers[:-1]):
+                    raise _client_error("EntityTooSmall", "Your proposed upload is smaller than the minimum allowed size",
+                                        "CompleteMultipartUpload")
+                self.objects[(Bucket, Key)] = b"".join(upload["parts"][n] for n in numbers)
+                self.sse[(Bucket, Key)] = upload["sse"]
+                del self.multipart[UploadId]
+        finally:
+            self._record("s3.complete_multipart_upload", started)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        started = time.perf_counter()
+        self.latency.wait()
+        try:
+            with self._data_lock:
+                self._upload(Bucket, Key, UploadId, "AbortMultipartUpload")
+                del self.multipart[UploadId]
+        finally:
+            self._record("s3.abort_multipart_upload", started)
+        return {}
+
+    def upload_via_post(self, fields: dict, data: bytes) -> int:
+        """
+        What S3 does with a browser-style POST upload: enforce the signed policy, store the object.
+        Returns the HTTP status S3 would answer with (204 or 403).
+        """
+        policy = self.presigned.get(fields.get("policy"))
+        if policy is None:
+            return 403
+        bucket, key, conditions, expires = policy
+        if time.time() > expires or fields.get("key") != key:
+            return 403
+        for condition in conditions:
+            if isinstance(condition, dict):
+                if any(fields.get(name) != value for name, value in condition.items()):
+                    return 403
+            elif condition[0] == "content-length-range" and not condition[1] <= len(data) <= condition[2]:
+                return 403
+        with self._data_lock:
+            self.objects[(bucket, key)] = bytes(data)
+            self.sse[(bucket, key)] = fields.get("x-amz-server-side-encryption")
+        return 204
@@ -0,0 +1,120 @@
+"""
+Merge profiles written by the Lambdas' profiling hook into one collapsed-stack file.
+
+Usage (from Secure_stack/, stdlib only):
+    python bench/merge_profiles.py logs/*.txt > create.folded
+    python bench/merge_profiles.py profiles/ --route "POST /create" --min-body-bytes 262144 -o big.folded
+    aws s3 sync s3://<bucket>/profiles/ profiles/ && python bench/merge_profiles.py profiles/
+    python bench/merge_profiles.py logs.txt --mode cprofile --top 20
+
+Inputs are files or directories (searched recursively) holding profile records, either the S3
+objects ({"profile": {...}} per file) or exported CloudWatch Logs: any line containing a
+{"profile": ...} JSON object, with or without the timestamp/request-id prefix, is picked up.
+Other lines are ignored.
+
+Output is the collapsed-stack format ("frame;frame;frame weight" per line) that flamegraph.pl,
+speedscope and most flame-graph viewers read. Weights are summed across profiles; they are sample
+counts for "sample" profiles and microseconds for "cprofile" ones, so the two modes are never
+mixed (--mode, default "sample"). --top N prints the N heaviest leaf frames instead.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def _records_in_text(text: str):
+    """Yield every {"profile": ...} object in a file: whole-file JSON or one per log line."""
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            document = json.loads(stripped)
+        except ValueError:
+            document = None
+        if isinstance(document, dict) and "profile" in document:
+            yield document["profile"]
+            return
+    for line in text.splitlines():
+        start = line.find('{"profile"')
+        if start < 0:
+            continue
+        try:
+            yield json.loads(line[start:])["profile"]
+        except (ValueError, KeyError):
+            continue
+
+
+def iter_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def load_records(paths):
+    for path in iter_paths(paths):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from _records_in_text(f.read())
+
+
+def merge(records, mode: str = "sample", route: str = None, min_body_bytes: int = 0) -> tuple:
+    """RETURNS: ({stack: summed weight}, number of profiles merged)."""
+    merged, count = {}, 0
+    for record in records:
+        if record.get("mode") != mode:
+            continue
+        if route and record.get("route") != route:
+            continue
+        if (record.get("body_bytes") or 0) < min_body_bytes:
+            continue
+        count += 1
+        for stack, weight in record.get("stacks", {}).items():
+            merged[stack] = merged.get(stack, 0) + weight
+    return merged, count
+
+
+def top_leaves(merged: dict, n: int) -> list:
+    """Heaviest leaf frames: [(frame, weight)] (self time for cprofile, on-CPU-or-waiting samples)."""
+    leaves = {}
+    for stack, weight in merged.items():
+        leaf = stack.rsplit(";", 1)[-1]
+        leaves[leaf] = leaves.get(leaf, 0) + weight
+    return sorted(leaves.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="profile files, log exports or directories")
+    parser.add_argument("--mode", choices=("sample", "cprofile"), default="sample")
+    parser.add_argument("--route", help='only profiles of this route, e.g. "POST /create"')
+    parser.add_argument("--min-body-bytes", type=int, default=0, help="only requests at least this large")
+    parser.add_argument("--top", type=int, help="print the N heaviest leaf frames instead of stacks")
+    parser.add_argument("-o", "--output", help="write here instead of stdout")
+    args = parser.parse_args()
+
+    merged, count = merge(load_records(args.paths), args.mode, args.route, args.min_body_bytes)
+    if not count:
+        print("No matching profiles found", file=sys.stderr)
+        return 1
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.top:
+            total = sum(merged.values())
+            for frame, weight in top_leaves(merged, args.top):
+                out.write(f"{100 * weight / total:6.2f}%  {weight:>12}  {frame}\n")
+        else:
+            for stack, weight in sorted(merged.items()):
+                out.write(f"{stack} {weight}\n")
+    finally:
+        if args.output:
+            out.close()
+    print(f"Merged {count} {args.mode} profile(s), {len(merged)} distinct stacks", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Replay a paste size histogram through the storage tiering policy and project latency and cost.
+
+Usage (from Secure_stack/, stdlib only, no AWS access):
+    python bench/replay_storage_policy.py                                  # synthetic histogram
+    python bench/replay_storage_policy.py --histogram sizes.csv
+    python bench/replay_storage_policy.py --thresholds 2048,4096,16384 --latency-usd-per-ms 0,1e-7
+    COST_S3_MS=35 COST_RETENTION_DAYS=3 python bench/replay_storage_policy.py --json
+
+Histogram CSV: header `size_bytes,count[,encrypted]`, one row per size bucket. Sizes are *stored*
+bytes (after compression for plaintext), e.g. exported from the items' content/s3 object sizes.
+Without --histogram a synthetic mix is used (log-normal plaintext around 2KB stored, 20% ciphertext
+around 6KB), which is only useful for comparing policies against each other.
+
+For every candidate policy (one "threshold" policy per --thresholds value, with the default
+ciphertext limit of that value's base64 length, and one "cost" policy per --latency-usd-per-ms
+value) it reports the inline share, request-weighted p50/p99 create and
+get latency, projected cost per million pastes and storage per million pastes, all from
+storage_policy.CostModel. Cost model parameters come from COST_<FIELD> env vars, exactly as in
+the Lambda.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app", "lambda", "create"))
+
+import storage_policy  # noqa: E402
+
+DEFAULT_THRESHOLDS = (1024, 2048, 4096, 8192, 16384, 65536, 262144)
+
+
+def load_histogram(path: str) -> list:
+    """[(size_bytes, count, encrypted)] from a CSV file."""
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            encrypted = str(row.get("encrypted", "")).strip().lower() in ("1", "true", "yes")
+            rows.append((int(row["size_bytes"]), float(row["count"]), encrypted))
+    return rows
+
+
+def synthetic_histogram(seed: int = 1, samples: int = 100_000) -> list:
+    """Bucketed log-normal mix standing in for real traffic when no histogram is given."""
+    rng = random.Random(seed)
+    buckets = {}
+    for _ in range(samples):
+        encrypted = rng.random() < 0.2
+        median = 6 * 1024 if encrypted else 2 * 1024
+        size = min(int(rng.lognormvariate(math.log(median), 1.3)) + 1, 1024 * 1024)
+        # Round up to the next power-of-two-ish bucket edge (8 buckets per doubling).
+        edge = 2 ** (math.ceil(math.log2(size) * 8) / 8)
+        key = (int(edge), encrypted)
+        buckets[key] = buckets.get(key, 0) + 1
+    return [(size, count, encrypted) for (size, encrypted), count in sorted(buckets.items())]
+
+
+def weighted_percentile(pairs: list, pct: float) -> float:
+    """pairs = [(value, weight)]."""
+    pairs = sorted(pairs)
+    total = sum(w for _, w in pairs)
+    if not total:
+        return 0.0
+    cutoff, acc = total * pct / 100, 0.0
+    for value, weight in pairs:
+        acc += weight
+        if acc >= cutoff:
+            return value
+    return pairs[-1][0]
+
+
+def replay(policy, histogram: list, model: storage_policy.CostModel) -> dict:
+    total = sum(count for _, count, _ in histogram)
+    inline_count = cost = inline_bytes = s3_bytes = 0.0
+    create, get = [], []
+    for size, count, encrypted in histogram:
+        tier = policy.choose(size, encrypted)
+        est = model.estimate(size, tier)
+        cost += est["cost_usd"] * count
+        create.append((est["create_ms"], count))
+        get.append((est["get_ms"], count))
+        if tier == storage_policy.INLINE:
+            inline_count += count
+            inline_bytes += size * count
+        else:
+            s3_bytes += size * count
+    per_million = 1e6 / total if total else 0.0
+    return {
+        "policy": policy.describe(),
+        "inline_pct": 100 * inline_count / total if total else 0.0,
+        "create_p50_ms": weighted_percentile(create, 50),
+        "create_p99_ms": weighted_percentile(create, 99),
+        "get_p50_ms": weighted_percentile(get, 50),
+        "get_p99_ms": weighted_percentile(get, 99),
+        "usd_per_million": cost * per_million,
+        "ddb_gb_per_million": inline_bytes * per_million / 1e9,
+        "s3_gb_per_million": s3_bytes * per_million / 1e9,
+    }
+
+
+def candidate_policies(thresholds, latency_weights, model):
+    for threshold in thresholds:
+        yield storage_policy.ThresholdPolicy(threshold)
+    for weight in latency_weights:
+        yield storage_policy.CostPolicy(model, weight)
+
+
+def print_report(results: list, histogram: list):
+    total = sum(count for _, count, _ in histogram)
+    encrypted = sum(count for _, count, enc in histogram if enc)
+    print(f"{total:,.0f} pastes in {len(histogram)} buckets ({100 * encrypted / total:.0f}% encrypted)\n")
+    print(f"{'policy':<56}{'inline%':>8}{'create p50/p99 ms':>20}{'get p50/p99 ms':>18}"
+          f"{'$/1M':>9}{'DDB GB/1M':>11}{'S3 GB/1M':>10}")
+    for r in results:
+        print(f"{r['policy']:<56}{r['inline_pct']:>8.1f}"
+              f"{r['create_p50_ms']:>11.1f}/{r['create_p99_ms']:<8.1f}"
+              f"{r['get_p50_ms']:>9.1f}/{r['get_p99_ms']:<8.1f}"
+              f"{r['usd_per_million']:>9.2f}{r['ddb_gb_per_million']:>11.2f}{r['s3_gb_per_million']:>10.2f}")
+
+
+def _floats(value: str) -> list:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--histogram", help="CSV with size_bytes,count[,encrypted]")
+    parser.add_argument("--thresholds", type=lambda v: [int(x) for x in _floats(v)],
+                        default=list(DEFAULT_THRESHOLDS), help="comma-separated inline limits (bytes)")
+    parser.add_argument("--latency-usd-per-ms", type=_floats, default=[0.0, 1e-8, 1e-7],
+                        help="comma-separated latency weights for the cost policy")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the synthetic histogram")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    histogram = load_histogram(args.histogram) if args.histogram else synthetic_histogram(args.seed)
+    if not histogram:
+        parser.error("histogram is empty")
+    model = storage_policy.cost_model_from_env()
+    results = [replay(policy, histogram, model)
+               for policy in candidate_policies(args.thresholds, args.latency_usd_per_ms, model)]
+
+    if args.json:
+        print(json.dumps({"cost_model": model.__dict__, "results": results}, indent=2))
+    else:
+        print_report(results, histogram)
+
+
+if __name__ == "__main__":
+    main()
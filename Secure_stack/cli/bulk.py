@@ -0,0 +1,274 @@
+"""
+Bulk create/get: many pastes at once, concurrently, over one pooled requests.Session.
+
+WHY THIS EXISTS:
+- Scripts looped over `create`/`get`, paying a new TCP+TLS handshake per paste and running one
+  request at a time. Here `--workers` requests share the session's keep-alive connections.
+
+INPUTS:
+- bulk-create: files, directories (every file below them, recursively) and glob patterns, plus
+  an optional JSON lines manifest: {"file": "...", "paste_id": "...", "expiry_seconds": 600}
+  or {"text": "...", ...} per line. Relative paths are taken from the manifest's directory.
+  Pastes without a paste_id get a random one.
+- bulk-get: paste IDs as arguments and/or a manifest with one ID (or {"paste_id": ...}) per line;
+  "-" reads the manifest from stdin.
+
+OUTPUT:
+- One JSON object per paste on stdout (or --results), in completion order: source/paste_id,
+  status code, ok, elapsed_ms and the API's fields or an error. Progress and the final summary
+  go to stderr, so the results can be piped (e.g. into jq).
+- Throttling (429) and 5xx answers are retried with backoff (utils.post_json()).
+
+ENCRYPTION (see crypto.py):
+- bulk-create --encrypt and bulk-get --decrypt ask for the password once. All pastes of a
+  bulk-create share one salt, so PBKDF2 runs once per run; bulk-get derives each distinct salt
+  once (once in total for pastes created by one bulk-create).
+- A paste that fails to decrypt keeps its ciphertext (content or file, plus salt/iv in its
+  result line) and is reported as failed.
+
+SECURITY NOTE:
+- bulk-get without --output-dir puts paste content in the result lines (like `get --json`);
+  treat that output like the pastes themselves.
+"""
+import base64
+import glob
+import io
+import json
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+
+import crypto
+from utils import PasteSource, create_paste, make_session, paste_content, post_json, validate_paste_id, write_paste
+
+
+def _random_paste_id():
+    return secrets.token_urlsafe(18)   # 24 chars of [A-Za-z0-9_-]
+
+
+def create_specs(sources, manifest=None):
+    """Expand bulk-create inputs into [{"source", "paste_id", "file" | "text", ...}] in order."""
+    specs, seen = [], set()
+    for source in sources:
+        if os.path.isdir(source):
+            paths = sorted(os.path.join(root, name) for root, _, names in os.walk(source) for name in names)
+        elif os.path.isfile(source):
+            paths = [source]
+        else:
+            paths = sorted(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+            if not paths:
+                raise click.BadParameter(f"No files match {source!r}")
+        # A file matched by several sources (a directory and a glob) is created once.
+        paths = [path for path in paths if os.path.abspath(path) not in seen]
+        seen.update(os.path.abspath(path) for path in paths)
+        specs += [{"source": path, "file": path, "paste_id": _random_paste_id()} for path in paths]
+
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest.name)) if manifest.name != "<stdin>" else os.getcwd()
+        for number, line in enumerate(manifest, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "file" in entry:
+                entry["file"] = os.path.join(base, entry["file"])
+            elif "text" not in entry:
+                raise click.BadParameter(f"Manifest line {number} needs \"file\" or \"text\"")
+            entry.setdefault("paste_id", _random_paste_id())
+            entry.setdefault("source", entry.get("file") or f"{manifest.name}:{number}")
+            specs.append(entry)
+    return specs
+
+
+def get_specs(paste_ids, manifest=None):
+    """Expand bulk-get inputs into [{"paste_id", ...}], duplicates dropped (a paste reads once)."""
+    specs = [{"paste_id": paste_id} for paste_id in paste_ids]
+    if manifest:
+        for line in manifest:
+            line = line.strip()
+            if line:
+                specs.append(json.loads(line) if line.startswith("{") else {"paste_id": line})
+    return list({spec["paste_id"]: spec for spec in specs}.values())
+
+
+def _create_one(session, api_url, spec, expiry, encode_b64, attempts, keys=None, chunked=None):
+    paste_id = spec["paste_id"]
+    if not validate_paste_id(paste_id):
+        return {"status": None, "ok": False, "error": "Invalid paste_id format"}
+    # Files are streamed from disk (see utils.PasteSource), so large ones stay out of memory.
+    try:
+        if "file" in spec:
+            source = PasteSource(path=spec["file"]) if keys else PasteSource.from_file(spec["file"], encode_b64)
+        else:
+            source = PasteSource.from_text(spec["text"], encode_b64)
+    except UnicodeDecodeError:
+        return {"status": None, "ok": False, "error": "Not UTF-8 text; use --encode-b64 or --encrypt"}
+    if not source.size:
+        return {"status": None, "ok": False, "error": "Empty content"}
+    payload = {
+        "paste_id": paste_id,
+        "expiry_seconds": spec.get("expiry_seconds", expiry),
+        "content_encrypted": encode_b64 or bool(keys),
+    }
+    if keys:
+        source = crypto.EncryptedSource(source, keys, chunked)
+        payload.update(salt=source.salt, iv=source.iv)
+    r = create_paste(api_url, payload, source, session, attempts=attempts)
+    return _result(r, ok=r.status_code == 201)
+
+
+def _get_one(session, api_url, spec, output_dir, attempts, keys=None):
+    # Also keeps IDs from escaping --output-dir (they become file names).
+    if not validate_paste_id(spec["paste_id"]):
+        return {"status": None, "ok": False, "error": "Invalid paste_id format"}
+    r = post_json(session, f"{api_url}/paste", {"paste_id": spec["paste_id"]}, attempts=attempts)
+    result = _result(r, ok=r.status_code == 200)
+    if not result["ok"]:
+        return result
+    data = result.pop("response")
+    fields = {k: v for k, v in data.items() if k not in ("paste_id", "content", "download", "message")}
+    decrypting = bool(keys and data.get("encrypted"))
+    try:
+        if output_dir:
+            # Streamed to disk in binary through a temporary name, like `get --output`.
+            path = os.path.join(output_dir, spec.get("output") or spec["paste_id"])
+            partial = f"{path}.part"
+            try:
+                with open(partial, "wb") as f:
+                    if decrypting:
+                        decrypted = crypto.write_decrypted(data, f, keys, session)
+                    else:
+                        write_paste(data, f, session)
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            record = dict(result, path=path, **fields)
+        elif decrypting:
+            sink = io.BytesIO()
+            decrypted = crypto.write_decrypted(data, sink, keys, session)
+            record = dict(result, **_content_fields(sink.getvalue(), decrypted), **fields)
+        else:
+            return dict(result, content=paste_content(data, session), **fields)
+    except crypto.DecryptionError as e:
+        return dict(result, ok=False, error=str(e), **fields)
+    except Exception as e:
+        return dict(result, ok=False, error=f"Download failed ({e}); the link may have expired")
+    if decrypting:
+        record["decrypted"] = decrypted
+        if not decrypted:
+            record.update(ok=False, error="Decryption failed: wrong password (or a malformed salt/iv)? The ciphertext was kept (see `decrypt`)")
+    return record
+
+
+def _content_fields(content, decrypted):
+    """Result fields for content bytes: text as "content", binary plaintext as "content_b64"."""
+    if not decrypted:
+        return {"content": content.decode("ascii")}   # base64 ciphertext
+    try:
+        return {"content": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"content_b64": base64.b64encode(content).decode("ascii")}
+
+
+def _result(r, ok):
+    """{"status", "ok"} plus the parsed body as "response" (success) or its message as "error"."""
+    try:
+        body = r.json()
+    except ValueError:
+        body = {"message": r.text[:200]}
+    result = {"status": r.status_code, "ok": ok}
+    if ok:
+        result["response"] = body
+    else:
+        result["error"] = body.get("message", "Unknown error")
+    return result
+
+
+class Progress:
+    """Running counts on stderr (redrawn in place on a terminal) and a final summary."""
+
+    def __init__(self, total, label):
+        self.total = total
+        self.label = label
+        self.done = self.ok = 0
+        self.latencies = []
+        self.started = time.perf_counter()
+        self.live = sys.stderr.isatty()
+        self._drawn = 0.0
+
+    def update(self, result):
+        self.done += 1
+        self.ok += bool(result["ok"])
+        self.latencies.append(result["elapsed_ms"])
+        now = time.perf_counter()
+        if self.live and (now - self._drawn > 0.2 or self.done == self.total):
+            self._drawn = now
+            click.echo(f"\r{self.label}: {self.done}/{self.total}, {self.done - self.ok} failed", nl=False, err=True)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies) or [0.0]
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        if self.live:
+            click.echo(err=True)
+        click.echo(f"{self.label}: {self.ok} ok, {self.done - self.ok} failed in {elapsed:.1f}s "
+                   f"({self.done / elapsed if elapsed else 0:.1f}/s, p50 {p50:.0f}ms, p95 {p95:.0f}ms)", err=True)
+
+
+def run(specs, task, workers, results, label):
+    """
+    Run task(session, spec) for every spec on `workers` threads sharing one session.
+
+    Returns the number of failed specs. Each result is written to `results` as a JSON line as
+    soon as it completes.
+    """
+    progress = Progress(len(specs), label)
+    session = make_session(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_timed, task, session, spec): spec for spec in specs}
+            for future in as_completed(futures):
+                spec = futures[future]
+                result = future.result()
+                record = {"source": spec["source"]} if "source" in spec else {}
+                record["paste_id"] = spec["paste_id"]
+                record.update(result)
+                results.write(json.dumps(record) + "\n")
+                results.flush()
+                progress.update(result)
+    finally:
+        session.close()
+    progress.summary()
+    return progress.done - progress.ok
+
+
+def _timed(task, session, spec):
+    started = time.perf_counter()
+    try:
+        result = task(session, spec)
+    except Exception as e:
+        result = {"status": None, "ok": False, "error": str(e)}
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def bulk_create(api_url, specs, expiry, encode_b64, workers, attempts, results, keys=None, chunked=None):
+    def task(session, spec):
+        result = _create_one(session, api_url, spec, expiry, encode_b64, attempts, keys, chunked)
+        if result.get("ok"):
+            response = result.pop("response")
+            result.update({k: v for k, v in response.items() if k != "paste_id"})
+        return result
+    return run(specs, task, workers, results, "bulk-create")
+
+
+def bulk_get(api_url, specs, output_dir, workers, attempts, results, keys=None):
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return run(specs, lambda session, spec: _get_one(session, api_url, spec, output_dir, attempts, keys),
+               workers, results, "bulk-get")
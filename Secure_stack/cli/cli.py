@@ -1,12 +1,13 @@
 import click
-import base64
 import json
 import requests
 import time
 import os
 import boto3
 
-from utils import validate_paste_id
+import bulk
+import crypto
+from utils import STREAM_BLOCK, Base64Decoder, PasteSource, create_paste, validate_paste_id, write_paste
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,6 +19,41 @@ DEV_MODE = os.getenv("DEV_MODE", "false").lower() == "true"
 # Default base URL for the deployed API. Allow override for staging/local testing.
 DEFAULT_API_URL = "https://ptto3xcw05.execute-api.us-east-1.amazonaws.com"
 
+# Encryption password for --encrypt/--decrypt; prompted for when unset.
+PASSWORD_ENV = "PSSTBIN_PASSWORD"
+# Same rule as the web UI.
+MIN_PASSWORD_LENGTH = 8
+
+
+def read_password(confirm=False):
+    """
+    Password from PSSTBIN_PASSWORD, else prompted for (hidden, on stderr).
+
+    SECURITY NOTE:
+    - There is deliberately no --password option: command lines end up in shell history and
+      are visible to other local users (ps).
+    """
+    password = os.environ.get(PASSWORD_ENV) or click.prompt(
+        "Password", hide_input=True, confirmation_prompt=confirm, err=True)
+    if confirm and len(password) < MIN_PASSWORD_LENGTH:
+        raise click.UsageError(f"Password must be at least {MIN_PASSWORD_LENGTH} characters.")
+    return password
+
+
+def encryption_options(command):
+    """--encrypt and --chunked/--no-chunked, shared by create and bulk-create."""
+    command = click.option("--chunked/--no-chunked", default=None,
+                           help=f"Chunked encryption (CLI-only format, parallel, streamed). "
+                                f"Default: only above {crypto.CHUNKED_THRESHOLD // 2**20}MB")(command)
+    return click.option("--encrypt", is_flag=True,
+                        help=f"AES-GCM encrypt like the web UI (password from ${PASSWORD_ENV} or prompt)")(command)
+
+
+def _decryption_failed(data, saved_to):
+    click.echo("❌ Decryption failed: wrong password (or a malformed salt/iv)?", err=True)
+    click.echo(f"The ciphertext was saved to {saved_to} instead. Decrypt it with:", err=True)
+    click.echo(f"  decrypt <file> --salt '{data.get('salt')}' --iv '{data.get('iv')}'", err=True)
+
 
 @click.group()
 @click.option("--api-url", default=DEFAULT_API_URL, show_default=True, help="Custom API base URL")
@@ -27,51 +63,74 @@ def cli(ctx, api_url):
     PsstBin CLI
 
     SECURITY INVARIANTS (for the CLI):
-    - Never attempt to "decrypt" unless you actually implemented real encryption.
+    - Encryption is client-side only (--encrypt/--decrypt, see crypto.py): the API never sees
+      the password or the key.
     - Do not log secrets by default.
-    - Prefer client-side encryption (AES-GCM in your browser app). Base64 is NOT encryption.
-
-    NOTE:
-    - This CLI currently supports optional *base64 encoding* for content.
-      If you want real encryption parity with the web UI, you should add AES-GCM + PBKDF2 here too.
+    - Base64 (--encode-b64) is NOT encryption.
     """
     ctx.ensure_object(dict)
     ctx.obj["API_URL"] = api_url
-    click.echo("🔐 Welcome to PsstBin - Encrypted. Ephemeral. Yours.\n")
+    # stderr, so command output (e.g. bulk JSON lines) can be piped.
+    click.echo("🔐 Welcome to PsstBin - Encrypted. Ephemeral. Yours.\n", err=True)
 
 
 @cli.command()
 @click.pass_context
 @click.argument("paste_id")
-@click.option("--file", type=click.File("r"), help="File to paste from")
+@click.option("--file", type=click.Path(dir_okay=False, allow_dash=True),
+              help="File to paste from ('-' for stdin)")
 @click.option("--text", help="Text to paste")
 @click.option("--expiry", default=3600, show_default=True, help="Paste expiry in seconds")
 @click.option("--encode-b64", is_flag=True, help="Encode content as base64 (NOT encryption)")
-def create(ctx, paste_id, file, text, expiry, encode_b64):
-    """Create a new paste."""
+@encryption_options
+def create(ctx, paste_id, file, text, expiry, encode_b64, encrypt, chunked):
+    """
+    Create a new paste.
+
+    Files are read in binary and streamed: large ones are uploaded part by part straight from
+    disk (base64 encoded on the fly with --encode-b64), so memory stays bounded whatever the
+    file size. stdin is read whole. Without --encode-b64 or --encrypt content must be UTF-8 text.
+
+    --encrypt produces the web UI's format (readable there if the content is text), or the
+    chunked format for large files, which is encrypted in parallel while it uploads.
+    """
     api_url = ctx.obj["API_URL"]
 
     # Strict ID validation prevents malformed keys and makes URLs predictable/clean.
     if not validate_paste_id(paste_id):
         click.echo("❌ Invalid paste_id format.")
         return
+    if encrypt and encode_b64:
+        raise click.UsageError("--encrypt and --encode-b64 are exclusive.")
 
-    content = file.read() if file else text
-    if not content:
+    # IMPORTANT: base64 is encoding, not encryption.
+    # We expose this as an option mainly for binary-ish payloads and safe transport.
+    try:
+        if file == "-":
+            data = click.get_binary_stream("stdin").read()
+            source = PasteSource(data=data) if encrypt else PasteSource.from_bytes(data, encode_b64)
+        elif file:
+            source = PasteSource(path=file) if encrypt else PasteSource.from_file(file, encode_b64)
+        else:
+            source = PasteSource.from_text(text or "", encode_b64)
+    except UnicodeDecodeError:
+        click.echo("❌ Content is not UTF-8 text; use --encode-b64 or --encrypt for binary files.")
+        return
+    if not source.size:
         click.echo("❌ Provide content via --file or --text.")
         return
 
-    # IMPORTANT: base64 is encoding, not encryption.
-    # We expose this as an option mainly for binary-ish payloads and safe transport.
     payload = {
         "paste_id": paste_id,
-        "content": base64.b64encode(content.encode()).decode() if encode_b64 else content,
         "expiry_seconds": expiry,
-        "content_encrypted": encode_b64,  # naming is legacy; ideally rename to "content_base64" or similar
+        "content_encrypted": encode_b64 or encrypt,  # naming is legacy; with --encode-b64 it only means "base64"
     }
+    if encrypt:
+        source = crypto.EncryptedSource(source, crypto.PasswordKeys(read_password(confirm=True)), chunked)
+        payload.update(salt=source.salt, iv=source.iv)
 
-    # NOTE: Add timeout to avoid hanging forever on network issues.
-    r = requests.post(f"{api_url}/create", json=payload, timeout=15)
+    # Large content skips the API body limit: register, upload straight to S3, finalize.
+    r = create_paste(api_url, payload, source)
     click.echo(r.text)
 
 
@@ -80,7 +139,8 @@ def create(ctx, paste_id, file, text, expiry, encode_b64):
 @click.argument("paste_id")
 @click.option("--output", type=click.Path(), help="Save paste to file")
 @click.option("--json", "as_json", is_flag=True, help="Print full JSON instead of content only")
-def get(ctx, paste_id, output, as_json):
+@click.option("--decrypt", is_flag=True, help=f"Decrypt encrypted pastes (password from ${PASSWORD_ENV} or prompt)")
+def get(ctx, paste_id, output, as_json, decrypt):
     """
     Retrieve a paste by ID (one-time read).
 
@@ -88,8 +148,13 @@ def get(ctx, paste_id, output, as_json):
     - Your frontend uses POST /paste with JSON body.
     - Your CLI previously used GET /paste/{id}.
     Pick one and keep it consistent. This version uses POST /paste for consistency.
+    - Large pastes come back as a short-lived presigned S3 URL (`download`) instead of `content`;
+      the CLI fetches it right away (the paste is already consumed).
+    - --decrypt asks for the password before the read, since the read consumes the paste. If
+      it turns out wrong, the ciphertext is written instead (see crypto.write_decrypted()).
     """
     api_url = ctx.obj["API_URL"]
+    keys = crypto.PasswordKeys(read_password()) if decrypt else None
 
     # Use the same retrieval endpoint format as your web UI to reduce drift.
     r = requests.post(
@@ -112,25 +177,140 @@ def get(ctx, paste_id, output, as_json):
         click.echo(json.dumps(data, indent=2))
         return
 
-    content = data.get("content", "")
+    # Without --decrypt, encrypted content is written as its base64 ciphertext.
+    # (stderr, so the content itself can be piped.)
+    decrypting = bool(data.get("encrypted") and keys)
+    if data.get("encrypted") and not keys:
+        click.echo("🔐 This paste is encrypted; writing the ciphertext (use --decrypt to decrypt it).", err=True)
+
+    def write(sink):
+        if decrypting:
+            return crypto.write_decrypted(data, sink, keys)
+        write_paste(data, sink)
+        return True
+
+    # Streamed in binary: downloads are written as they arrive, never held whole in memory.
+    # --output is written to a temporary name first, so a failed download never leaves a
+    # truncated file (or clobbers an existing one).
+    try:
+        if output:
+            partial = f"{output}.part"
+            try:
+                with open(partial, "wb") as f:
+                    decrypted = write(f)
+                os.replace(partial, output)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+        else:
+            stdout = click.get_binary_stream("stdout")
+            decrypted = write(stdout)
+            stdout.write(b"\n")
+            stdout.flush()
+    except crypto.DecryptionError as e:
+        click.echo(f"❌ {e}")
+        return
+    except Exception as e:
+        click.echo(f"❌ Download failed ({e}); the link may have expired.")
+        return
+    if not decrypted:
+        _decryption_failed(data, output or "stdout")
+        return
+    if output:
+        click.echo(f"[Saved to {output}]")
+
 
-    # WARNING:
-    # If 'encrypted' is True in your system, content is AES-GCM ciphertext (base64),
-    # and the CLI does NOT implement AES-GCM decryption, so we should not pretend to decrypt.
-    if data.get("encrypted"):
-        click.echo("🔐 This paste is encrypted. CLI decryption is not implemented.")
-        click.echo("Tip: use the web UI or implement AES-GCM here.")
-        # Still allow saving ciphertext if user wants.
-    else:
-        # Plaintext paste.
-        pass
+@cli.command(name="decrypt")
+@click.pass_context
+@click.argument("file", type=click.File("rb"))
+@click.option("--salt", required=True, help="The paste's salt")
+@click.option("--iv", required=True, help="The paste's iv")
+@click.option("--output", type=click.Path(), help="Save the plaintext to file (default stdout)")
+def decrypt_cmd(ctx, file, salt, iv, output):
+    """
+    Decrypt base64 ciphertext saved by `get`/`bulk-get` ('-' for stdin), offline.
 
+    For pastes read without --decrypt, or with a wrong password (both write the ciphertext).
+    """
+    keys = crypto.PasswordKeys(read_password())
+
+    def blocks():
+        decoder = Base64Decoder()
+        for block in iter(lambda: file.read(STREAM_BLOCK), b""):
+            yield decoder.update(block)
+        yield decoder.final()
+
+    sink = open(f"{output}.part", "wb") if output else click.get_binary_stream("stdout")
+    try:
+        for plaintext in crypto.decrypt(blocks(), salt, iv, keys):
+            sink.write(plaintext)
+        if output:
+            sink.close()
+            os.replace(f"{output}.part", output)
+    except (crypto.DecryptionError, ValueError) as e:   # ValueError: not base64
+        click.echo(f"❌ {e}", err=True)
+        ctx.exit(1)
+    finally:
+        if output:
+            sink.close()
+            if os.path.exists(f"{output}.part"):
+                os.remove(f"{output}.part")
     if output:
-        with open(output, "w", encoding="utf-8") as f:
-            f.write(content)
-        click.echo(f"[Saved to {output}]")
-    else:
-        click.echo(content)
+        click.echo(f"[Saved to {output}]", err=True)
+
+
+@cli.command(name="bulk-create")
+@click.pass_context
+@click.argument("sources", nargs=-1)
+@click.option("--manifest", type=click.File("r"), help="JSON lines: {\"file\"|\"text\", \"paste_id\", \"expiry_seconds\"} ('-' for stdin)")
+@click.option("--expiry", default=3600, show_default=True, help="Default paste expiry in seconds")
+@click.option("--encode-b64", is_flag=True, help="Encode content as base64 (NOT encryption)")
+@encryption_options
+@click.option("--workers", default=8, show_default=True, help="Concurrent requests")
+@click.option("--retries", default=3, show_default=True, help="Retries on 429/5xx/connection errors")
+@click.option("--results", type=click.File("w"), default="-", help="JSON lines output (default stdout)")
+def bulk_create_cmd(ctx, sources, manifest, expiry, encode_b64, encrypt, chunked, workers, retries, results):
+    """
+    Create many pastes concurrently from files, directories, globs and/or a manifest.
+
+    Prints one JSON line per paste (source, paste_id, status, ok, ...) and a summary on stderr.
+    With --encrypt, every paste is encrypted with the same password (asked once).
+    Exits 1 if any paste failed.
+    """
+    if encrypt and encode_b64:
+        raise click.UsageError("--encrypt and --encode-b64 are exclusive.")
+    specs = bulk.create_specs(sources, manifest)
+    if not specs:
+        raise click.UsageError("Nothing to create: pass files, directories, globs or --manifest.")
+    keys = crypto.PasswordKeys(read_password(confirm=True)) if encrypt else None
+    failed = bulk.bulk_create(ctx.obj["API_URL"], specs, expiry, encode_b64, workers, retries + 1, results,
+                              keys, chunked)
+    ctx.exit(1 if failed else 0)
+
+
+@cli.command(name="bulk-get")
+@click.pass_context
+@click.argument("paste_ids", nargs=-1)
+@click.option("--manifest", type=click.File("r"), help="One paste ID (or {\"paste_id\": ...}) per line ('-' for stdin)")
+@click.option("--output-dir", type=click.Path(file_okay=False), help="Save each paste to <dir>/<paste_id>")
+@click.option("--decrypt", is_flag=True, help=f"Decrypt encrypted pastes (password from ${PASSWORD_ENV} or prompt)")
+@click.option("--workers", default=8, show_default=True, help="Concurrent requests")
+@click.option("--retries", default=3, show_default=True, help="Retries on 429/5xx/connection errors")
+@click.option("--results", type=click.File("w"), default="-", help="JSON lines output (default stdout)")
+def bulk_get_cmd(ctx, paste_ids, manifest, output_dir, decrypt, workers, retries, results):
+    """
+    Retrieve (and consume) many pastes concurrently.
+
+    Without --output-dir the content is part of each JSON line; encrypted pastes come back as
+    ciphertext + salt/iv, like `get --json`, unless --decrypt is given (one password for all).
+    Exits 1 if any paste failed.
+    """
+    specs = bulk.get_specs(paste_ids, manifest)
+    if not specs:
+        raise click.UsageError("Nothing to get: pass paste IDs or --manifest.")
+    keys = crypto.PasswordKeys(read_password()) if decrypt else None
+    failed = bulk.bulk_get(ctx.obj["API_URL"], specs, output_dir, workers, retries + 1, results, keys)
+    ctx.exit(1 if failed else 0)
 
 
 @cli.command()
@@ -138,16 +318,13 @@ def get(ctx, paste_id, output, as_json):
 @click.argument("paste_id")
 def status(ctx, paste_id):
     """
-    Fetch metadata of a paste.
+    Fetch metadata of a paste (does NOT consume it).
 
-    NOTE:
-    - Your current API does not have a dedicated metadata endpoint.
-      This command calls /paste, which consumes the one-time paste.
-    - That’s a problem: status checks will destroy content.
-    Professional fix: create a /status endpoint that returns metadata only and does NOT mark used=True.
+    Calls /status, which reads a projection of the DynamoDB item only:
+    no content, never flips used=True.
     """
     api_url = ctx.obj["API_URL"]
-    r = requests.post(f"{api_url}/paste", json={"paste_id": paste_id}, timeout=15)
+    r = requests.post(f"{api_url}/status", json={"paste_id": paste_id}, timeout=15)
 
     try:
         data = r.json()
@@ -156,13 +333,9 @@ def status(ctx, paste_id):
         return
 
     if r.status_code == 200:
-        click.echo(json.dumps({
-            "paste_id": data.get("paste_id"),
-            "encrypted": data.get("encrypted"),
-            # In your create lambda you store 'secret_types' in DynamoDB metadata,
-            # but retrieval endpoint doesn't currently return it (unless you added it).
-            "secret_types": data.get("secret_types", None),
-        }, indent=2))
+        click.echo(json.dumps(data, indent=2))
+    elif r.status_code == 404:
+        click.echo("❌ Paste not found")
     else:
         click.echo(f"❌ {data.get('message', 'Unknown error')}")
 
@@ -0,0 +1,280 @@
+"""
+Client-side encryption for the CLI, compatible with the web UI (frontend/script.js).
+
+WHY THIS EXISTS:
+- The CLI could only base64 "encode" content, and could not read the encrypted pastes the web
+  UI creates. Encryption happens here, before upload; the API only ever sees ciphertext plus
+  salt/iv, exactly like for browser-made pastes.
+
+FORMAT (stored as the paste's ciphertext, `salt` and `iv`):
+- key = PBKDF2-HMAC-SHA256(UTF-8 password, salt, 100000 iterations) -> AES-256-GCM key.
+  salt is 16 random bytes, sent base64 encoded.
+- Single (the web UI's format): iv is 12 random bytes (base64); the ciphertext is
+  AES-GCM(key, iv, plaintext) with the 16-byte tag appended, as WebCrypto produces it.
+- Chunked (CLI only, for large files; the web UI cannot read these):
+  iv = "gcm-chunked:<chunk size>:<base64 nonce prefix>". The plaintext is cut into chunk-size
+  pieces and each one is sealed on its own, with nonce = prefix (7 random bytes) || chunk index
+  (4 bytes, big endian) || last-chunk flag (1 byte). The ciphertext is the sealed chunks back to
+  back (chunk size + 16 bytes each, the last one shorter). Chunks can be sealed and opened
+  independently, yet not reordered, dropped, or cut off at a chunk boundary: any of those
+  changes a nonce and fails the tag check.
+
+KEY CACHE:
+- PBKDF2 is deliberately slow. PasswordKeys derives each salt's key once and keeps it; new
+  pastes all use the instance's salt, so a bulk-create runs PBKDF2 once, and a bulk-get of
+  pastes created together runs it once as well.
+
+PERFORMANCE NOTE:
+- AES-GCM and PBKDF2 in `cryptography` release the GIL, so chunks sealed/opened on the
+  CRYPTO_WORKERS thread pool use every core. Chunked content is sealed as it is read for upload
+  (EncryptedSource.read()) and opened as it downloads (decrypt()): memory stays bounded by the
+  parts in flight. Single-format content is sealed and opened in one piece, in memory.
+
+SECURITY NOTE:
+- Decrypted output is only produced once its tag has verified (chunk by chunk when chunked).
+- Pastes sharing a PasswordKeys share a key: their ivs/nonce prefixes are random per paste,
+  so nonces never repeat in practice, but anyone holding the password reads all of them.
+- The password itself never reaches the API, and is never accepted on the command line
+  (see cli.py, read_password()).
+"""
+import base64
+import binascii
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from utils import Base64Encoder, iter_download
+
+PBKDF2_ITERATIONS = 100000   # must match frontend/script.js deriveKey()
+SALT_BYTES = 16
+IV_BYTES = 12
+TAG_BYTES = 16
+
+CHUNKED_IV_TAG = "gcm-chunked"
+PREFIX_BYTES = 7             # + 4 index bytes + 1 flag byte = IV_BYTES
+CHUNK_SIZE = 1024 * 1024
+# Without an explicit choice, content above this is encrypted chunked: the web UI could not
+# open it anyway (it decrypts in one piece, in memory).
+CHUNKED_THRESHOLD = 64 * 1024 * 1024
+CRYPTO_WORKERS = os.cpu_count() or 1
+
+_pool = ThreadPoolExecutor(max_workers=CRYPTO_WORKERS)
+
+
+class DecryptionError(Exception):
+    """
+    A tag did not verify (wrong password, or a corrupted/truncated paste), or salt/iv are malformed.
+
+    `ciphertext` holds the bytes read so far when nothing decrypted had been produced yet (the
+    first chunk failed, wrong password most likely, or salt/iv were rejected before reading);
+    None when a later chunk failed.
+    """
+
+    def __init__(self, message, ciphertext=None):
+        super().__init__(message)
+        self.ciphertext = ciphertext
+
+
+class PasswordKeys:
+    """AES-GCM keys derived from one password, one per salt, each derived once (thread-safe)."""
+
+    def __init__(self, password):
+        self._password = password.encode("utf-8")
+        self.salt = os.urandom(SALT_BYTES)   # for pastes encrypted with these keys
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def key(self, salt):
+        # Concurrent first uses of a salt wait for one derivation instead of each running PBKDF2.
+        with self._lock:
+            future = self._keys.get(salt)
+            owner = future is None
+            if owner:
+                future = self._keys[salt] = Future()
+        if owner:
+            try:
+                kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=PBKDF2_ITERATIONS)
+                future.set_result(AESGCM(kdf.derive(self._password)))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
+def _nonce(prefix, index, last):
+    return prefix + index.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+
+def _decode(value, name):
+    try:
+        return base64.b64decode(value, validate=True)
+    except (TypeError, ValueError):   # binascii.Error is a ValueError
+        raise DecryptionError(f"Invalid {name}: not base64") from None
+
+
+def _parse_iv(iv):
+    """
+    (nonce, None) for a single-format iv, (prefix, chunk_size) for a chunked one.
+    Raises DecryptionError for anything malformed (a corrupted paste or a mistyped --iv).
+    """
+    if not isinstance(iv, str):
+        raise DecryptionError("Invalid iv")
+    if not iv.startswith(CHUNKED_IV_TAG + ":"):
+        nonce = _decode(iv, "iv")
+        if len(nonce) != IV_BYTES:
+            raise DecryptionError(f"Invalid iv: must be {IV_BYTES} bytes")
+        return nonce, None
+    parts = iv.split(":")
+    if len(parts) != 3 or not parts[1].isdigit() or int(parts[1]) < 1:
+        raise DecryptionError(f"Invalid iv: expected {CHUNKED_IV_TAG}:<chunk size>:<base64 nonce prefix>")
+    prefix = _decode(parts[2], "iv")
+    if len(prefix) != PREFIX_BYTES:
+        raise DecryptionError(f"Invalid iv: nonce prefix must be {PREFIX_BYTES} bytes")
+    return prefix, int(parts[1])
+
+
+class EncryptedSource:
+    """
+    Ciphertext of a plaintext utils.PasteSource, read like one: size and read(offset, length).
+
+    chunked=None picks the chunked format above CHUNKED_THRESHOLD. Chunked ciphertext is sealed
+    on demand: read() seals just the chunks covering the requested range, in parallel, so a
+    file is read and encrypted part by part while it uploads. The single format is sealed
+    once, up front, in memory.
+    `salt` and `iv` are the strings to send with the paste.
+    """
+
+    def __init__(self, plain, keys, chunked=None):
+        self.plain = plain
+        self.salt = base64.b64encode(keys.salt).decode("ascii")
+        self._key = keys.key(keys.salt)
+        self.chunked = plain.size > CHUNKED_THRESHOLD if chunked is None else chunked
+        if self.chunked:
+            self._prefix = os.urandom(PREFIX_BYTES)
+            self.iv = f"{CHUNKED_IV_TAG}:{CHUNK_SIZE}:{base64.b64encode(self._prefix).decode('ascii')}"
+            self._chunks = max(1, -(-plain.size // CHUNK_SIZE))
+            self.size = plain.size + self._chunks * TAG_BYTES
+        else:
+            iv = os.urandom(IV_BYTES)
+            self.iv = base64.b64encode(iv).decode("ascii")
+            self._ciphertext = self._key.encrypt(iv, plain.read(0, plain.size), None)
+            self.size = len(self._ciphertext)
+
+    def _seal(self, index):
+        data = self.plain.read(index * CHUNK_SIZE, CHUNK_SIZE)
+        return self._key.encrypt(_nonce(self._prefix, index, index == self._chunks - 1), data, None)
+
+    def read(self, offset, length):
+        if not self.chunked:
+            return self._ciphertext[offset:offset + length]
+        sealed_size = CHUNK_SIZE + TAG_BYTES
+        first = offset // sealed_size
+        end = min(self._chunks, (offset + length + sealed_size - 1) // sealed_size)
+        sealed = b"".join(_pool.map(self._seal, range(first, end)))
+        start = offset - first * sealed_size
+        return sealed[start:start + length]
+
+
+def _open(key, prefix, index, sealed, last):
+    try:
+        return key.decrypt(_nonce(prefix, index, last), sealed, None)
+    except InvalidTag:
+        raise DecryptionError(f"Chunk {index} failed authentication: the paste is corrupted or truncated") from None
+
+
+def decrypt(blocks, salt, iv, keys):
+    """
+    Yield the plaintext of ciphertext arriving as an iterator of byte blocks, in order.
+
+    Chunked ciphertext is opened CRYPTO_WORKERS-wide as it arrives, with a bounded window of
+    chunks in flight; the single format is collected and opened in one piece.
+    Raises DecryptionError (see there) when a tag does not verify or salt/iv are malformed.
+    """
+    blocks = iter(blocks)
+    try:
+        nonce, chunk_size = _parse_iv(iv)
+        salt = _decode(salt, "salt")
+    except DecryptionError as e:
+        raise DecryptionError(str(e), b"") from None   # nothing read yet: the ciphertext is whole
+    key = keys.key(salt)
+    if chunk_size is None:
+        ciphertext = b"".join(blocks)
+        try:
+            plaintext = key.decrypt(nonce, ciphertext, None)
+        except InvalidTag:
+            raise DecryptionError("Decryption failed: wrong password?", ciphertext) from None
+        yield plaintext
+        return
+
+    prefix = nonce
+    sealed_size = chunk_size + TAG_BYTES
+    buffer = bytearray()
+    pending = deque()
+    index = 0
+    while True:
+        # Read ahead past the chunk to know whether it is the last one.
+        while len(buffer) <= sealed_size:
+            block = next(blocks, None)
+            if block is None:
+                break
+            buffer += block
+        last = len(buffer) <= sealed_size
+        sealed = bytes(buffer[:sealed_size])
+        del buffer[:sealed_size]
+        if index == 0:
+            # Checked before anything is produced, so a wrong password leaves the ciphertext whole.
+            try:
+                plaintext = key.decrypt(_nonce(prefix, 0, last), sealed, None)
+            except InvalidTag:
+                raise DecryptionError("Decryption failed: wrong password?", sealed + bytes(buffer)) from None
+            yield plaintext
+        else:
+            pending.append(_pool.submit(_open, key, prefix, index, sealed, last))
+            if len(pending) >= 2 * CRYPTO_WORKERS:
+                yield pending.popleft().result()
+        if last:
+            break
+        index += 1
+    while pending:
+        yield pending.popleft().result()
+
+
+def ciphertext_blocks(data, session=requests):
+    """Raw ciphertext of an encrypted POST /paste response, as an iterator of byte blocks."""
+    if "download" in data:
+        return iter_download(data["download"], session)
+    return iter([binascii.a2b_base64(data.get("content", ""))])
+
+
+def write_decrypted(data, sink, keys, session=requests):
+    """
+    Decrypt an encrypted POST /paste response into the binary file object sink.
+
+    RETURNS:
+    - True once everything was decrypted and written.
+    - False if nothing could be decrypted: the first chunk did not verify (wrong password,
+      most likely) or salt/iv are malformed. The paste is consumed by now, so instead of
+      losing it the sink gets the ciphertext in the same base64 form `get` writes without
+      --decrypt; `decrypt` can open it later.
+    Raises DecryptionError if a later chunk fails (corrupted or truncated paste).
+    """
+    blocks = ciphertext_blocks(data, session)
+    try:
+        for plaintext in decrypt(blocks, data.get("salt"), data.get("iv"), keys):
+            sink.write(plaintext)
+        return True
+    except DecryptionError as e:
+        if e.ciphertext is None:
+            raise
+        encoder = Base64Encoder()
+        sink.write(encoder.update(e.ciphertext))
+        for block in blocks:
+            sink.write(encoder.update(block))
+        sink.write(encoder.final())
+        return False
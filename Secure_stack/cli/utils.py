@@ -1,4 +1,296 @@
+import base64
+import codecs
+import os
+import random
 import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Content above this goes through the two-phase direct-to-S3 create (the API caps inline creates at 1MB).
+DIRECT_UPLOAD_THRESHOLD = 1024 * 1024
+# Concurrent part uploads / ranged downloads for chunked pastes.
+TRANSFER_WORKERS = 8
+# Read/write block for streamed files and downloads.
+STREAM_BLOCK = 1024 * 1024
+
+# API calls answered with these (throttling, Lambda/API Gateway errors) are retried with backoff.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_ATTEMPTS = 4
+RETRY_BACKOFF_S = 0.5
+RETRY_MAX_DELAY_S = 20
+
 
 def validate_paste_id(paste_id):
     return re.match(r'^[a-zA-Z0-9_-]{3,50}$', paste_id)
+
+
+def make_session(workers):
+    """
+    requests.Session whose connection pools hold `workers` connections per host.
+
+    Reusing one session keeps TCP+TLS connections to API Gateway and S3 open across calls;
+    the default pool (10) would make concurrent workers open and drop extra connections.
+    Part transfers of one paste run TRANSFER_WORKERS wide on top of that.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers + TRANSFER_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _retry_delay(attempt, response=None):
+    """Exponential backoff with full jitter, or the server's Retry-After if it sent one."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), RETRY_MAX_DELAY_S)
+    return random.uniform(0, min(RETRY_BACKOFF_S * 2 ** attempt, RETRY_MAX_DELAY_S))
+
+
+def post_json(session, url, payload, timeout=15, attempts=RETRY_ATTEMPTS, **kwargs):
+    """
+    POST JSON, retrying connection errors and RETRY_STATUSES with backoff.
+
+    Returns the last response; raises the last connection error if no attempt got one.
+    payload=None sends kwargs (data=..., headers=...) as given instead of a JSON body.
+
+    NOTE:
+    - Retrying a read (POST /paste) that failed after the paste was consumed answers 410 on the
+      next attempt; the get API gives the paste back itself when it could not deliver it.
+    """
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            r = session.post(url, json=payload, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if last:
+                raise
+            time.sleep(_retry_delay(attempt))
+            continue
+        if r.status_code not in RETRY_STATUSES or last:
+            return r
+        time.sleep(_retry_delay(attempt, r))
+
+
+class PasteSource:
+    """
+    Content to upload: a file (read on demand) or in-memory bytes, optionally base64 encoded.
+
+    read(offset, length) returns a slice of the *uploaded* (encoded) bytes and only reads the
+    matching part of the file, so parts of a chunked upload are read when they are sent and
+    memory stays bounded by the parts in flight, whatever the file size.
+    """
+
+    def __init__(self, path=None, data=None, encode_b64=False):
+        self.path = path
+        self.data = data
+        self.encode_b64 = encode_b64
+        raw_size = os.path.getsize(path) if path is not None else len(data)
+        self.size = 4 * ((raw_size + 2) // 3) if encode_b64 else raw_size
+
+    @classmethod
+    def from_file(cls, path, encode_b64=False):
+        """Binary-safe. Without base64 the file must be UTF-8 text, checked in one streaming pass."""
+        if not encode_b64:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(STREAM_BLOCK), b""):
+                    decoder.decode(block)
+            decoder.decode(b"", final=True)
+        return cls(path=path, encode_b64=encode_b64)
+
+    @classmethod
+    def from_bytes(cls, data, encode_b64=False):
+        if not encode_b64:
+            data.decode("utf-8")   # raises UnicodeDecodeError, like from_file()
+        return cls(data=data, encode_b64=encode_b64)
+
+    @classmethod
+    def from_text(cls, text, encode_b64=False):
+        return cls(data=text.encode("utf-8"), encode_b64=encode_b64)
+
+    def _raw(self, offset, length):
+        if self.path is None:
+            return self.data[offset:offset + length]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def read(self, offset, length):
+        if not self.encode_b64:
+            return self._raw(offset, length)
+        # Base64 maps each 3 raw bytes to 4 output bytes: encode the covering 3-byte groups.
+        first_group, end_group = offset // 4, (offset + length + 3) // 4
+        encoded = base64.b64encode(self._raw(first_group * 3, (end_group - first_group) * 3))
+        start = offset - first_group * 4
+        return encoded[start:start + length]
+
+    def text(self):
+        """The whole content as the JSON `content` string (inline creates, <= DIRECT_UPLOAD_THRESHOLD)."""
+        return self.read(0, self.size).decode("ascii" if self.encode_b64 else "utf-8")
+
+
+def create_paste(api_url, payload, source, session=requests, attempts=1):
+    """
+    Create a paste from a create body without "content" and a PasteSource.
+
+    Content above DIRECT_UPLOAD_THRESHOLD goes through upload_direct() (not retried: it is three
+    steps, two of them on presigned URLs); everything else is one POST /create retried up to
+    `attempts` times by post_json().
+
+    Ciphertext (payload with salt/iv, source a crypto.EncryptedSource) is sent like the web UI
+    does: a binary create, raw bytes as the body and the metadata in X-Paste-* headers. Stored
+    S3 bodies are raw ciphertext either way.
+    """
+    if source.size > DIRECT_UPLOAD_THRESHOLD:
+        return upload_direct(api_url, payload, source, session)
+    if payload.get("salt"):
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "X-Paste-Id": payload["paste_id"],
+            "X-Expiry-Seconds": str(payload["expiry_seconds"]),
+            "X-Paste-Salt": payload["salt"],
+            "X-Paste-Iv": payload["iv"],
+        }
+        return post_json(session, f"{api_url}/create", None, attempts=attempts,
+                         data=source.read(0, source.size), headers=headers)
+    return post_json(session, f"{api_url}/create", dict(payload, content=source.text()), attempts=attempts)
+
+
+def paste_content(data, session=requests):
+    """
+    Content of a successful POST /paste response as a string (see write_paste() to stream it).
+
+    Ciphertext from a download comes back as raw bytes and is returned in the same base64 form
+    as inline responses.
+    """
+    if "download" not in data:
+        return data.get("content", "")
+    raw = b"".join(iter_download(data["download"], session))
+    return base64.b64encode(raw).decode("ascii") if data.get("encrypted") else raw.decode("utf-8")
+
+
+class Base64Encoder:
+    """Incremental base64: output of update() calls concatenated equals b64encode(all input)."""
+
+    def __init__(self):
+        self._carry = b""
+
+    def update(self, data):
+        data = self._carry + data
+        cut = len(data) - len(data) % 3
+        self._carry = data[cut:]
+        return base64.b64encode(data[:cut])
+
+    def final(self):
+        return base64.b64encode(self._carry)
+
+
+class Base64Decoder:
+    """Incremental counterpart of Base64Encoder; whitespace (line breaks, a trailing newline) is skipped."""
+
+    def __init__(self):
+        self._carry = b""
+
+    def update(self, data):
+        data = self._carry + b"".join(data.split())
+        cut = len(data) - len(data) % 4
+        self._carry = data[cut:]
+        return base64.b64decode(data[:cut])
+
+    def final(self):
+        return base64.b64decode(self._carry)
+
+
+def write_paste(data, sink, session=requests):
+    """
+    Stream the content of a successful POST /paste response into the binary file object sink.
+
+    Same bytes as paste_content().encode(): UTF-8 plaintext, or ciphertext in base64 form.
+    Downloads are written as they arrive (see iter_download()), never held whole in memory.
+    """
+    if "download" not in data:
+        sink.write(data.get("content", "").encode("utf-8"))
+        return
+    encoder = Base64Encoder() if data.get("encrypted") else None
+    for block in iter_download(data["download"], session):
+        sink.write(encoder.update(block) if encoder else block)
+    if encoder:
+        sink.write(encoder.final())
+
+
+def upload_direct(api_url, payload, source, session=requests):
+    """
+    Two-phase create: register, upload the bytes straight to S3, finalize.
+
+    payload is the usual create body minus "content" (paste_id, expiry_seconds, ...); source is
+    a PasteSource. Chunked registrations (method PUT) upload their parts concurrently, each part
+    read from the source when it is sent. Single POST uploads are at most one part (the API
+    switches to chunked uploads above its part size).
+    session is a requests.Session to reuse pooled connections (default: the requests module).
+    Returns the finalize (or failed registration) response.
+    """
+    r = session.post(f"{api_url}/create",
+                     json=dict(payload, upload="presigned", content_length=source.size), timeout=15)
+    if r.status_code != 201:
+        return r
+    upload = r.json()["upload"]
+
+    if upload["method"] == "POST":
+        s3 = session.post(upload["url"], data=upload["fields"], files={"file": source.read(0, source.size)},
+                          timeout=300)
+        s3.raise_for_status()
+    else:
+        size = upload["part_size"]
+
+        def put_part(part):
+            first = (part["part_number"] - 1) * size
+            session.put(part["url"], data=source.read(first, size), timeout=300).raise_for_status()
+
+        with ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as pool:
+            list(pool.map(put_part, upload["parts"]))
+
+    return session.post(f"{api_url}/create/finalize", json={"paste_id": payload["paste_id"]}, timeout=60)
+
+
+def iter_download(download, session=requests):
+    """
+    Yield the stored bytes of a presigned `download` from the get API, in order.
+
+    Chunked pastes (download["chunks"]) are fetched with concurrent Range requests, at most
+    TRANSFER_WORKERS parts in flight and handed out in order as they complete, so memory stays
+    around TRANSFER_WORKERS parts whatever the paste size. Everything else is a single GET read
+    in STREAM_BLOCK pieces (compressed plaintext is served with Content-Encoding: deflate,
+    which requests decodes).
+    """
+    chunks = download.get("chunks")
+    if not chunks or chunks["count"] < 2 or not download.get("content_length"):
+        with session.get(download["url"], stream=True, timeout=300) as r:
+            r.raise_for_status()
+            yield from r.iter_content(STREAM_BLOCK)
+        return
+
+    total = download["content_length"]
+    size = chunks["size"]
+
+    def get_range(index):
+        first = index * size
+        last = min(first + size, total) - 1
+        r = session.get(download["url"], headers={"Range": f"bytes={first}-{last}"}, timeout=300)
+        r.raise_for_status()
+        if r.status_code != 206 or len(r.content) != last - first + 1:
+            raise IOError(f"Unexpected response for bytes {first}-{last}: HTTP {r.status_code}")
+        return r.content
+
+    with ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as pool:
+        pending = deque()
+        for index in range(chunks["count"]):
+            pending.append(pool.submit(get_range, index))
+            if len(pending) >= TRANSFER_WORKERS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -55,17 +55,21 @@ async function encryptContent(content, password) {
     enc.encode(content)
   );
   return {
-    encryptedContent: arrayBufferToBase64(encrypted),
+    ciphertext: encrypted, // raw ArrayBuffer: sent as a binary body, never base64'd
     salt: arrayBufferToBase64(salt),
     iv: arrayBufferToBase64(iv),
   };
 }
 
-async function decryptContent(encryptedBase64, password, saltBase64, ivBase64) {
+// encryptedData: ArrayBuffer (binary responses) or base64 string (JSON responses)
+async function decryptContent(encryptedData, password, saltBase64, ivBase64) {
   const dec = new TextDecoder();
   const salt = base64ToArrayBuffer(saltBase64);
   const iv = base64ToArrayBuffer(ivBase64);
-  const encrypted = base64ToArrayBuffer(encryptedBase64);
+  const encrypted =
+    typeof encryptedData === "string"
+      ? base64ToArrayBuffer(encryptedData)
+      : encryptedData;
   const key = await deriveKey(password, salt);
   try {
     const decrypted = await window.crypto.subtle.decrypt(
@@ -136,6 +140,7 @@ async function createPaste() {
     expiry_seconds: expiry,
     content_encrypted: encrypt,
   };
+  let request;
 
   // Encrypt if requested
   if (encrypt && password) {
@@ -143,9 +148,15 @@ async function createPaste() {
       document.getElementById("create-response").textContent =
         "🔐 Encrypting...";
       const result = await encryptContent(content, password);
-      payload.content = result.encryptedContent;
-      payload.salt = result.salt;
-      payload.iv = result.iv;
+      // Binary mode: the ciphertext is the request body, metadata goes in headers.
+      const headers = {
+        "Content-Type": "application/octet-stream",
+        "X-Expiry-Seconds": String(expiry),
+        "X-Paste-Salt": result.salt,
+        "X-Paste-Iv": result.iv,
+      };
+      if (pasteId) headers["X-Paste-Id"] = pasteId;
+      request = { method: "POST", headers, body: result.ciphertext };
     } catch (err) {
       document.getElementById(
         "create-response"
@@ -154,16 +165,17 @@ async function createPaste() {
     }
   } else {
     payload.content = content;
+    request = {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+    };
   }
 
   try {
     document.getElementById("create-response").textContent = "📤 Submitting...";
 
-    const res = await fetch(`${API}/create`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    });
+    const res = await fetch(`${API}/create`, request);
 
     const data = await res.json();
 
@@ -264,7 +276,7 @@ async function getPaste() {
       responseBox.textContent = "🔓 Decrypting...";
 
       const decrypted = await decryptContent(
-        cachedPasteData.content,
+        cachedPasteData.ciphertext || cachedPasteData.content,
         password,
         cachedPasteData.salt,
         cachedPasteData.iv
@@ -298,13 +310,31 @@ async function getPaste() {
   }
 
   try {
+    // Binary mode: the content comes back as the raw body (salt/iv in X-Paste-* headers).
+    // Errors and large-paste downloads are still JSON.
     const res = await fetch(`${API}/paste`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "application/octet-stream, application/json",
+      },
       body: JSON.stringify({ paste_id: id }),
     });
 
-    const data = await res.json();
+    const type = res.headers.get("Content-Type") || "";
+    let data;
+    if (res.ok && type.startsWith("application/octet-stream")) {
+      data = {
+        encrypted: true,
+        ciphertext: await res.arrayBuffer(),
+        salt: res.headers.get("X-Paste-Salt"),
+        iv: res.headers.get("X-Paste-Iv"),
+      };
+    } else if (res.ok && type.startsWith("text/plain")) {
+      data = { encrypted: false, content: await res.text() };
+    } else {
+      data = await res.json();
+    }
 
     console.log("Full API response:", data);
 
@@ -323,6 +353,23 @@ async function getPaste() {
       return;
     }
 
+    // Large pastes come back as a short-lived presigned S3 URL instead of inline content.
+    // The paste is already consumed, so fetch it now (before asking for a password).
+    if (data.download) {
+      const dl = await fetch(data.download.url);
+      if (!dl.ok) {
+        responseBox.textContent = `❌ Download failed (${dl.status}). The link may have expired.`;
+        cachedPasteData = null;
+        return;
+      }
+      // Ciphertext is raw bytes, which decryptContent takes as-is.
+      if (data.encrypted) {
+        data.ciphertext = await dl.arrayBuffer();
+      } else {
+        data.content = await dl.text();
+      }
+    }
+
     // Cache the paste data
     cachedPasteData = data;
 
@@ -26,6 +26,7 @@ module "app-lambda_create" {
   table_name         = module.storage.table_name
   dynamodb_table_arn = module.storage.dynamodb_table_arn
   bucket_arn         = module.storage.bucket_arn
+  storage_policy_env = var.storage_policy_env
 }
 
 module "app_lambda_get" {
@@ -43,6 +44,20 @@ module "app_lambda_get" {
 
 }
 
+# Deletes the S3 bodies of expired/consumed pastes from the table's stream, and consumed pastes
+# once their grace period is over (scheduled sweep).
+module "app_lambda_reaper" {
+  source              = "./modules/app-lambda/reaper"
+  project             = var.project
+  reaper_zip_path     = var.reaper_zip_path
+  bucket_name         = module.storage.bucket_name
+  bucket_arn          = module.storage.bucket_arn
+  table_name          = module.storage.table_name
+  dynamodb_table_arn  = module.storage.dynamodb_table_arn
+  dynamodb_stream_arn = module.storage.dynamodb_stream_arn
+  reap_index_name     = module.storage.reap_index_name
+}
+
 module "frontend" {
   source             = "./modules/frontend"
   project            = var.project
@@ -28,11 +28,14 @@ resource "aws_lambda_function" "paste_create" {
 
   # ENV vars are the interface between infra and code.
   # SECURITY NOTE: Do NOT put secrets here; use SSM/Secrets Manager if needed.
+  # storage_policy_env tunes inline-vs-S3 tiering per environment (see storage_policy.py).
   environment {
-    variables = {
+    variables = merge(var.storage_policy_env, {
       BUCKET_NAME = var.bucket_name
       TABLE_NAME  = var.table_name
-    }
+      # Open the DynamoDB/S3 connections during init, not on the first request (aws_clients.py).
+      WARMUP_CONNECTIONS = "true"
+    })
   }
 
   # Ensures Lambda redeploys when the zip changes
@@ -74,6 +77,20 @@ resource "aws_apigatewayv2_route" "create_paste_route" {
   target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
 }
 
+# Batch create (CI pipelines): same Lambda, {"pastes": [...]} body, per-entry results.
+resource "aws_apigatewayv2_route" "create_batch_route" {
+  api_id    = aws_apigatewayv2_api.http_api.id
+  route_key = "POST /create/batch"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Second phase of a presigned (direct-to-S3) create.
+resource "aws_apigatewayv2_route" "create_finalize_route" {
+  api_id    = aws_apigatewayv2_api.http_api.id
+  route_key = "POST /create/finalize"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
 resource "aws_apigatewayv2_stage" "default" {
   api_id      = aws_apigatewayv2_api.http_api.id
   name        = "$default"
@@ -98,3 +115,21 @@ resource "aws_lambda_permission" "allow_apigw_invoke" {
   # This is route-specific. Works, but can be annoying when you add new routes.
   source_arn = "${aws_apigatewayv2_api.http_api.execution_arn}/*/*/create"
 }
+
+resource "aws_lambda_permission" "allow_apigw_invoke_batch" {
+  statement_id  = "AllowAPIGatewayInvokeCreateBatch"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.paste_create.function_name
+  principal     = "apigateway.amazonaws.com"
+
+  source_arn = "${aws_apigatewayv2_api.http_api.execution_arn}/*/*/create/batch"
+}
+
+resource "aws_lambda_permission" "allow_apigw_invoke_finalize" {
+  statement_id  = "AllowAPIGatewayInvokeCreateFinalize"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.paste_create.function_name
+  principal     = "apigateway.amazonaws.com"
+
+  source_arn = "${aws_apigatewayv2_api.http_api.execution_arn}/*/*/create/finalize"
+}
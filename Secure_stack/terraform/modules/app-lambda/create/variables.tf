@@ -26,6 +26,12 @@ variable "bucket_arn" {
   
 }
 
+variable "storage_policy_env" {
+  description = "Storage tiering env vars for the create Lambda, e.g. { STORAGE_POLICY = \"threshold\", INLINE_MAX_BYTES = \"8192\" }"
+  type        = map(string)
+  default     = {}
+}
+
 variable "region" {
   type = string
 }
@@ -14,6 +14,8 @@ resource "aws_lambda_function" "get_paste" {
     variables = {
       BUCKET_NAME = var.bucket_name
       TABLE_NAME  = var.table_name
+      # Open the DynamoDB/S3 connections during init, not on the first request (aws_clients.py).
+      WARMUP_CONNECTIONS = "true"
     }
   }
 
@@ -35,6 +37,13 @@ resource "aws_apigatewayv2_route" "get_paste_route" {
   target    = "integrations/${aws_apigatewayv2_integration.lambda_get_integration.id}"
 }
 
+# Metadata-only lookups (single or batch); never consumes the paste.
+resource "aws_apigatewayv2_route" "paste_status_route" {
+  api_id    = var.api_id
+  route_key = "POST /status"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_get_integration.id}"
+}
+
 # Permission for API Gateway -> Lambda.
 # SECURITY NOTE: you can tighten this to only /paste route like you did for /create.
 resource "aws_lambda_permission" "allow_api_get" {
@@ -0,0 +1,148 @@
+# -----------------------------------------------------------------------------
+# Reaper execution role
+# -----------------------------------------------------------------------------
+# Own role instead of the shared one: the reaper only reads the stream, updates/reads/deletes
+# rows and deletes objects. It never reads or writes paste content.
+resource "aws_iam_role" "reaper_exec" {
+  name = "${var.project}-reaper-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action = "sts:AssumeRole",
+      Effect = "Allow",
+      Principal = { Service = "lambda.amazonaws.com" }
+    }]
+  })
+}
+
+data "aws_iam_policy_document" "reaper" {
+  statement {
+    actions = [
+      "dynamodb:DescribeStream",
+      "dynamodb:GetRecords",
+      "dynamodb:GetShardIterator",
+      "dynamodb:ListStreams"
+    ]
+    resources = [var.dynamodb_stream_arn]
+  }
+
+  # BatchGetItem: skip keys whose paste_id was reused. UpdateItem: schedule consumed pastes.
+  # DeleteItem: the sweep removes consumed pastes past their grace period.
+  statement {
+    actions   = ["dynamodb:BatchGetItem", "dynamodb:UpdateItem", "dynamodb:DeleteItem"]
+    resources = [var.dynamodb_table_arn]
+  }
+
+  statement {
+    actions   = ["dynamodb:Query"]
+    resources = ["${var.dynamodb_table_arn}/index/${var.reap_index_name}"]
+  }
+
+  # DeleteObjects is authorized per key as s3:DeleteObject.
+  statement {
+    actions   = ["s3:DeleteObject"]
+    resources = ["${var.bucket_arn}/*"]
+  }
+
+  statement {
+    actions = [
+      "logs:CreateLogGroup",
+      "logs:CreateLogStream",
+      "logs:PutLogEvents"
+    ]
+    resources = ["arn:aws:logs:*:*:*"]
+  }
+}
+
+resource "aws_iam_role_policy" "reaper" {
+  name   = "${var.project}-reaper-access"
+  role   = aws_iam_role.reaper_exec.id
+  policy = data.aws_iam_policy_document.reaper.json
+}
+
+# -----------------------------------------------------------------------------
+# Reaper Lambda (DynamoDB stream consumer)
+# -----------------------------------------------------------------------------
+resource "aws_lambda_function" "reaper" {
+  function_name = "${var.project}-reaper"
+  filename      = var.reaper_zip_path
+  handler       = "lambda_function.lambda_handler"
+  runtime       = "python3.12"
+  role          = aws_iam_role.reaper_exec.arn
+  # A full batch is up to 10 BatchGetItem calls and one DeleteObjects call, plus retries.
+  # Sweeps stop on their own shortly before this (SWEEP_TIME_MARGIN_MS).
+  timeout = 60
+
+  source_code_hash = filebase64sha256(var.reaper_zip_path)
+
+  environment {
+    variables = {
+      BUCKET_NAME        = var.bucket_name
+      TABLE_NAME         = var.table_name
+      REAP_GRACE_SECONDS = tostring(var.reap_grace_seconds)
+      REAP_INDEX         = var.reap_index_name
+    }
+  }
+
+  depends_on = [aws_iam_role_policy.reaper]
+}
+
+resource "aws_lambda_event_source_mapping" "paste_stream" {
+  event_source_arn  = var.dynamodb_stream_arn
+  function_name     = aws_lambda_function.reaper.arn
+  starting_position = "LATEST"
+
+  # Up to one DeleteObjects call per batch; nothing here is latency sensitive.
+  batch_size                         = 1000
+  maximum_batching_window_in_seconds = 60
+
+  # The handler reports failed records; retries resume from the earliest one.
+  function_response_types        = ["ReportBatchItemFailures"]
+  bisect_batch_on_function_error = true
+  maximum_retry_attempts         = 10
+
+  # Only invoke for S3-backed rows being removed (TTL or delete) and pastes being consumed.
+  filter_criteria {
+    filter {
+      pattern = jsonencode({
+        eventName = ["REMOVE"]
+        dynamodb  = { OldImage = { s3_key = { S = [{ exists = true }] } } }
+      })
+    }
+    filter {
+      pattern = jsonencode({
+        eventName = ["MODIFY"]
+        dynamodb = {
+          NewImage = { used = { BOOL = [true] } }
+          OldImage = { used = { BOOL = [false] } }
+        }
+      })
+    }
+  }
+
+  depends_on = [aws_iam_role_policy.reaper]
+}
+
+# -----------------------------------------------------------------------------
+# Sweep schedule: deletes consumed pastes once their grace period is over
+# -----------------------------------------------------------------------------
+# Their REMOVE stream records then delete the bodies (see the handler's docstring). Without
+# this, consumed pastes only left with TTL, which has no deadline.
+resource "aws_cloudwatch_event_rule" "reap_sweep" {
+  name                = "${var.project}-reap-sweep"
+  schedule_expression = var.reap_sweep_minutes == 1 ? "rate(1 minute)" : "rate(${var.reap_sweep_minutes} minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "reap_sweep" {
+  rule = aws_cloudwatch_event_rule.reap_sweep.name
+  arn  = aws_lambda_function.reaper.arn
+}
+
+resource "aws_lambda_permission" "allow_reap_sweep" {
+  statement_id  = "AllowEventBridgeReapSweep"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.reaper.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.reap_sweep.arn
+}
@@ -0,0 +1,44 @@
+variable "project" {
+  
+}
+
+variable "reaper_zip_path" {
+  
+}
+
+variable "bucket_name" {
+  
+}
+
+variable "bucket_arn" {
+  
+}
+
+variable "table_name" {
+  
+}
+
+variable "dynamodb_table_arn" {
+  
+}
+
+variable "dynamodb_stream_arn" {
+  
+}
+
+variable "reap_index_name" {
+  description = "Sparse GSI of consumed pastes (reap_shard, reap_at) that the sweep queries"
+  type        = string
+}
+
+variable "reap_sweep_minutes" {
+  description = "How often the sweep deletes consumed pastes past their grace period"
+  type        = number
+  default     = 5
+}
+
+variable "reap_grace_seconds" {
+  description = "How long a consumed paste stays around (presigned downloads in flight) before the sweep deletes it"
+  type        = number
+  default     = 300
+}
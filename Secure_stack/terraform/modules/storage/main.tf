@@ -17,12 +17,32 @@ resource "aws_s3_bucket_server_side_encryption_configuration" "default" {
   }
 }
 
+# Browsers upload large pastes straight to the bucket with a presigned POST (two-phase create).
+# The presigned policy pins key, size and SSE; CORS only lets the browser send the form.
+# Chunked uploads PUT their parts to presigned UploadPart URLs.
+# Large pastes are also read back through short-lived presigned GETs (get Lambda).
+# SECURITY NOTE: wide open like the API's CORS; lock allowed_origins to your frontend domain(s).
+resource "aws_s3_bucket_cors_configuration" "secure_paste" {
+  bucket = aws_s3_bucket.secure_paste.id
+
+  cors_rule {
+    allowed_methods = ["POST", "PUT", "GET"]
+    allowed_origins = ["*"]
+    allowed_headers = ["*"]
+    max_age_seconds = 3600
+  }
+}
+
 resource "random_id" "bucket_suffix" {
   byte_length = 4
 }
 
 
 ###DYNAMODB#####################
+locals {
+  reap_index_name = "reap-index"
+}
+
 resource "aws_dynamodb_table" "paste_metadata" {
   name         = "${var.project}-paste-metadata"
   billing_mode = "PAY_PER_REQUEST"
@@ -33,11 +53,35 @@ resource "aws_dynamodb_table" "paste_metadata" {
     type = "S"
   }
 
+  attribute {
+    name = "reap_shard"
+    type = "N"
+  }
+
+  attribute {
+    name = "reap_at"
+    type = "N"
+  }
+
+  # Sparse: only consumed pastes carry reap_shard/reap_at (set by the reaper). Its scheduled
+  # sweep queries this for rows past their grace period and deletes them; TTL alone has no
+  # deadline. Keys only: the sweep needs nothing but paste_id.
+  global_secondary_index {
+    name            = local.reap_index_name
+    hash_key        = "reap_shard"
+    range_key       = "reap_at"
+    projection_type = "KEYS_ONLY"
+  }
+
   ttl {
     attribute_name = "expiry"
     enabled        = true
   }
 
+  # Feeds the reaper Lambda (TTL deletions and consumed pastes); it needs the old image's s3_key.
+  stream_enabled   = true
+  stream_view_type = "NEW_AND_OLD_IMAGES"
+
   tags = {
     Name = "${var.project}-paste-metadata"
   }
@@ -50,7 +94,10 @@ data "aws_iam_policy_document" "secure_paste_policy" {
     actions = [
       "s3:PutObject",
       "s3:GetObject",
-      "s3:DeleteObject"
+      "s3:DeleteObject",
+      # Chunked two-phase creates (multipart upload with presigned parts).
+      "s3:ListMultipartUploadParts",
+      "s3:AbortMultipartUpload"
     ]
     resources = ["${aws_s3_bucket.secure_paste.arn}/*"]
   }
@@ -59,6 +106,9 @@ data "aws_iam_policy_document" "secure_paste_policy" {
     actions = [
       "dynamodb:PutItem",
       "dynamodb:GetItem",
+      "dynamodb:BatchGetItem",
+      "dynamodb:UpdateItem",
+      "dynamodb:BatchWriteItem",
       "dynamodb:DeleteItem",
       "dynamodb:Query"
     ]
@@ -16,4 +16,12 @@ output "bucket_arn" {
 
 output "dynamodb_table_arn" {
   value = aws_dynamodb_table.paste_metadata.arn
+}
+
+output "dynamodb_stream_arn" {
+  value = aws_dynamodb_table.paste_metadata.stream_arn
+}
+
+output "reap_index_name" {
+  value = local.reap_index_name
 }
\ No newline at end of file
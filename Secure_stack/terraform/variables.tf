@@ -34,11 +34,22 @@ variable "create_zip_path" {
   type        = string
 }
 
+variable "storage_policy_env" {
+  description = "Inline-vs-S3 storage policy settings for the create Lambda (STORAGE_POLICY, INLINE_MAX_BYTES, ...)"
+  type        = map(string)
+  default     = {}
+}
+
 variable "get_zip_path" {
   description = "Path to Lambda zip file"
   type        = string
 }
 
+variable "reaper_zip_path" {
+  description = "Path to the reaper Lambda zip file"
+  type        = string
+}
+
 variable "domain_name" {
   type = string
 }
@@ -0,0 +1,211 @@
+"""
+Move existing S3-backed pastes to another S3 key layout (see app/lambda/shared/key_layout.py).
+
+Usage (from Secure_stack/, needs boto3 and credentials for the table and the bucket):
+    python tools/migrate_key_layout.py --table <table> --bucket <bucket> --dry-run
+    python tools/migrate_key_layout.py --table <table> --bucket <bucket> --workers 64
+    python tools/migrate_key_layout.py --table <table> --bucket <bucket> --to-layout 1   # roll back
+
+Deploy the Lambdas with key_layout.py first: readers then accept both layouts.
+bench/bench_migrate_key_layout.py runs this migration against the in-memory fakes.
+
+Per scan page (--segments parallel scan segments):
+1. Rows with an s3_key in another layout are selected; rows still waiting for their direct
+   upload and expired rows are left alone (the reaper removes their objects).
+2. Objects are copied to the new key in parallel (CopyObject, --workers at a time, SSE-S3).
+   CopyObject handles objects up to 5GB; pastes are at most 1GB (MAX_DIRECT_UPLOAD_SIZE).
+3. Rows are updated in batches of up to 100 with TransactWriteItems, each update conditional on
+   the row still holding the old key. A cancelled batch (a row was removed or changed meanwhile)
+   is retried row by row. Copies whose row could not be updated are deleted again.
+4. Once everything is copied, the old objects of updated rows are deleted with DeleteObjects
+   (1000 keys per call) after --source-grace-seconds, so presigned GETs handed out for the old
+   key before the update still work. --keep-source leaves them to the bucket lifecycle rule.
+
+Safe to rerun: migrated rows are skipped and copies are simply overwritten. A reader that
+consumed a row before its update finds the object under either key (get Lambda, read_object()).
+
+PERFORMANCE NOTE:
+- Scan reads (and bills) every item whatever the FilterExpression, so rows are filtered here
+  with a narrow projection instead. Transactional writes cost twice the WCUs of plain updates,
+  in exchange for one round trip per 100 rows.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app", "lambda", "shared"))
+
+import key_layout  # noqa: E402
+
+SCAN_PAGE = 500
+UPDATE_BATCH = 100       # TransactWriteItems limit
+DELETE_BATCH = 1000      # DeleteObjects limit
+PROJECTION = "paste_id, s3_key, key_layout, upload_pending, expiry"
+
+
+class Migration:
+    def __init__(self, dynamodb, s3, table: str, bucket: str, target: int, workers: int = 32,
+                 dry_run: bool = False):
+        self.dynamodb = dynamodb
+        self.s3 = s3
+        self.table = table
+        self.bucket = bucket
+        self.target = target
+        self.dry_run = dry_run
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.stats = {"scanned": 0, "selected": 0, "copied": 0, "updated": 0, "missing": 0,
+                      "conflicts": 0, "failed": 0, "sources_deleted": 0}
+        self.old_keys = []
+        self._lock = threading.Lock()
+
+    def _add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                self.stats[name] += n
+
+    def needs_move(self, item: dict, now: int) -> bool:
+        if "s3_key" not in item or item.get("upload_pending", {}).get("BOOL", False):
+            return False
+        if int(item.get("expiry", {}).get("N", "0")) < now:
+            return False
+        return key_layout.layout_of(item["s3_key"]["S"]) != self.target
+
+    def _copy(self, old: str, new: str) -> str:
+        """RETURNS: "copied", "missing" (object already gone) or "failed"."""
+        try:
+            self.s3.copy_object(Bucket=self.bucket, Key=new, CopySource={"Bucket": self.bucket, "Key": old},
+                                ServerSideEncryption="AES256", MetadataDirective="COPY")
+            return "copied"
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("NoSuchKey", "404"):
+                return "missing"
+            print(f"Copy failed for {old}: {e}", file=sys.stderr)
+            return "failed"
+
+    def _update(self, paste_id: str, old: str, new: str) -> dict:
+        return {
+            "TableName": self.table,
+            "Key": {"paste_id": {"S": paste_id}},
+            "UpdateExpression": "SET s3_key = :new, key_layout = :layout",
+            "ConditionExpression": "s3_key = :old",
+            "ExpressionAttributeValues": {
+                ":new": {"S": new},
+                ":old": {"S": old},
+                ":layout": {"N": str(self.target)},
+            },
+        }
+
+    def _update_rows(self, moves: list) -> list:
+        """Point rows at their new keys. RETURNS: the moves whose row was not updated."""
+        rejected = []
+        for i in range(0, len(moves), UPDATE_BATCH):
+            batch = moves[i:i + UPDATE_BATCH]
+            try:
+                self.dynamodb.transact_write_items(
+                    TransactItems=[{"Update": self._update(*move)} for move in batch])
+                continue
+            except Exception as e:
+                if getattr(e, "response", {}).get("Error", {}).get("Code") != "TransactionCanceledException":
+                    raise
+            # One row changed meanwhile and cancelled the batch: the others are fine one by one.
+            for move in batch:
+                try:
+                    self.dynamodb.update_item(**self._update(*move))
+                except Exception as e:
+                    if getattr(e, "response", {}).get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                        raise
+                    rejected.append(move)
+        return rejected
+
+    def migrate_page(self, items: list, now: int):
+        selected = [item for item in items if self.needs_move(item, now)]
+        self._add(scanned=len(items), selected=len(selected))
+        if self.dry_run or not selected:
+            return
+        moves = []
+        for item in selected:
+            old = item["s3_key"]["S"]
+            moves.append((item["paste_id"]["S"], old, key_layout.relocate(old, self.target)))
+        results = list(self.pool.map(lambda move: self._copy(move[1], move[2]), moves))
+        copied = [move for move, result in zip(moves, results) if result == "copied"]
+        self._add(copied=len(copied), missing=results.count("missing"), failed=results.count("failed"))
+
+        rejected = self._update_rows(copied)
+        updated = [move for move in copied if move not in rejected]
+        self._add(updated=len(updated), conflicts=len(rejected))
+        if rejected:
+            delete_objects(self.s3, self.bucket, [new for _, _, new in rejected])
+        with self._lock:
+            self.old_keys.extend(old for _, old, _ in updated)
+
+    def scan_segment(self, segment: int, total: int, now: int):
+        start = None
+        while True:
+            kwargs = {"ExclusiveStartKey": start} if start else {}
+            page = self.dynamodb.scan(TableName=self.table, Segment=segment, TotalSegments=total,
+                                      Limit=SCAN_PAGE, ProjectionExpression=PROJECTION, **kwargs)
+            self.migrate_page(page.get("Items", []), now)
+            start = page.get("LastEvaluatedKey")
+            if not start:
+                return
+
+    def run(self, segments: int, grace_s: float, keep_source: bool) -> dict:
+        now = int(time.time())
+        with ThreadPoolExecutor(max_workers=segments) as scanners:
+            for future in [scanners.submit(self.scan_segment, s, segments, now) for s in range(segments)]:
+                future.result()
+        if self.old_keys and not keep_source:
+            print(f"Waiting {grace_s:g}s before deleting {len(self.old_keys)} old objects", file=sys.stderr)
+            time.sleep(grace_s)
+            failed = delete_objects(self.s3, self.bucket, self.old_keys)
+            self._add(sources_deleted=len(self.old_keys) - len(failed), failed=len(failed))
+        self.pool.shutdown()
+        return self.stats
+
+
+def delete_objects(s3, bucket: str, keys: list) -> list:
+    """DeleteObjects in batches. RETURNS: keys S3 reported as not deleted."""
+    failed = []
+    for i in range(0, len(keys), DELETE_BATCH):
+        response = s3.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": key} for key in keys[i:i + DELETE_BATCH]], "Quiet": True},
+        )
+        failed.extend(error["Key"] for error in response.get("Errors", []))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", required=True, help="paste metadata table")
+    parser.add_argument("--bucket", required=True, help="paste bucket")
+    parser.add_argument("--to-layout", type=int, choices=key_layout.LAYOUTS, default=key_layout.LAYOUT_HASHED)
+    parser.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent CopyObject calls")
+    parser.add_argument("--source-grace-seconds", type=float, default=120,
+                        help="wait before deleting old objects (>= the get Lambda's PRESIGNED_GET_EXPIRES)")
+    parser.add_argument("--keep-source", action="store_true", help="leave old objects to the lifecycle rule")
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would move")
+    args = parser.parse_args()
+
+    import boto3
+    from botocore.config import Config
+
+    # Enough pooled connections for every copy worker plus the scanners.
+    config = Config(max_pool_connections=args.workers + args.segments,
+                    retries={"mode": "adaptive", "max_attempts": 10})
+    migration = Migration(boto3.client("dynamodb", config=config), boto3.client("s3", config=config),
+                          args.table, args.bucket, args.to_layout, args.workers, args.dry_run)
+    stats = migration.run(args.segments, args.source_grace_seconds, args.keep_source)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())